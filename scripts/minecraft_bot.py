@@ -5,6 +5,29 @@ import subprocess
 import os
 import re
 import threading
+import sqlite3
+import struct
+import collections
+import concurrent.futures
+import multiprocessing
+import shutil
+import zlib
+import hashlib
+import uuid as uuid_lib
+import http.client
+import urllib.parse
+import zipfile
+import tarfile
+import random
+import bisect
+import math
+import contextlib
+import http.server
+import socket
+import array
+import heapq
+import signal
+import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -60,19 +83,137 @@ COMPOSE_FILE = os.getenv("COMPOSE_FILE", "docker-compose.yml")
 BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(os.path.dirname(PROPERTIES_FILE), "backups"))
 BACKUP_SCHEDULE_MINUTES = max(parse_int_env("BACKUP_SCHEDULE_MINUTES", default=0), 0)
 BACKUP_RETENTION_COUNT = max(parse_int_env("BACKUP_RETENTION_COUNT", default=0), 0)
+BACKUP_RETENTION_HOURLY = max(parse_int_env("BACKUP_RETENTION_HOURLY", default=0), 0)
+BACKUP_RETENTION_DAILY = max(parse_int_env("BACKUP_RETENTION_DAILY", default=0), 0)
+BACKUP_RETENTION_WEEKLY = max(parse_int_env("BACKUP_RETENTION_WEEKLY", default=0), 0)
+BACKUP_RETENTION_MONTHLY = max(parse_int_env("BACKUP_RETENTION_MONTHLY", default=0), 0)
+BACKUP_RETENTION_MAX_GB = max(parse_int_env("BACKUP_RETENTION_MAX_GB", default=0), 0)
+BACKUP_ENGINE = os.getenv("BACKUP_ENGINE", "script").strip().lower()
+WORLD_DIR = os.getenv("WORLD_DIR", os.path.join(os.path.dirname(PROPERTIES_FILE), "world"))
+BACKUP_STORE_DIR = os.getenv("BACKUP_STORE_DIR", os.path.join(BACKUP_DIR, "store"))
+BACKUP_CHUNK_SIZE = max(parse_int_env("BACKUP_CHUNK_KB", default=1024), 64) * 1024
+BACKUP_STAGING_DIR = os.getenv("BACKUP_STAGING_DIR", "")
+BACKUP_SAVE_COORDINATION = parse_bool_env("BACKUP_SAVE_COORDINATION", default=True)
+BACKUP_SAVE_TIMEOUT_SECONDS = max(parse_int_env("BACKUP_SAVE_TIMEOUT_SECONDS", default=60), 5)
+BACKUP_SAVE_WINDOW_WARN_SECONDS = max(parse_int_env("BACKUP_SAVE_WINDOW_WARN_SECONDS", default=30), 1)
+BACKUP_COMPRESS_LEVEL = min(max(parse_int_env("BACKUP_COMPRESS_LEVEL", default=6), 0), 9)
+BACKUP_ARCHIVE_WORKERS = max(parse_int_env("BACKUP_ARCHIVE_WORKERS", default=os.cpu_count() or 1), 1)
+BACKUP_ARCHIVE_PIECE_SIZE = max(parse_int_env("BACKUP_ARCHIVE_PIECE_MB", default=8), 1) * 1024 * 1024
+BACKUP_TIMEOUT_SECONDS = max(parse_int_env("BACKUP_TIMEOUT_SECONDS", default=900), 60)
+BACKUP_PROGRESS_SECONDS = max(parse_int_env("BACKUP_PROGRESS_SECONDS", default=5), 2)
+TICK_MONITOR_SECONDS = max(parse_int_env("TICK_MONITOR_SECONDS", default=30), 0)
+TICK_WINDOW_SAMPLES = max(parse_int_env("TICK_WINDOW_SAMPLES", default=120), 10)
+TICK_MSPT_ALERT_MS = max(parse_int_env("TICK_MSPT_ALERT_MS", default=50), 1)
+TICK_ALERT_SAMPLES = max(parse_int_env("TICK_ALERT_SAMPLES", default=4), 1)
+TICK_ALERT_COOLDOWN_SECONDS = max(parse_int_env("TICK_ALERT_COOLDOWN_SECONDS", default=1800), 60)
+LAG_ALERT_SPIKES = max(parse_int_env("LAG_ALERT_SPIKES", default=5), 1)
+LAG_ALERT_WINDOW_SECONDS = max(parse_int_env("LAG_ALERT_WINDOW_SECONDS", default=300), 30)
+LAG_ALERT_COOLDOWN_SECONDS = max(parse_int_env("LAG_ALERT_COOLDOWN_SECONDS", default=1800), 60)
+LAG_DIGEST_ENABLED = parse_bool_env("LAG_DIGEST_ENABLED", default=True)
+LAG_JOIN_WINDOW_SECONDS = 300
+RESOURCE_SAMPLE_SECONDS = max(parse_int_env("RESOURCE_SAMPLE_SECONDS", default=10), 2)
+RESOURCE_HISTORY_HOURS = max(parse_int_env("RESOURCE_HISTORY_HOURS", default=24), 1)
+RESOURCE_ALERT_WINDOW_MINUTES = max(parse_int_env("RESOURCE_ALERT_WINDOW_MINUTES", default=5), 1)
+RESOURCE_MEM_ALERT_PERCENT = max(parse_int_env("RESOURCE_MEM_ALERT_PERCENT", default=90), 0)
+RESOURCE_CPU_ALERT_PERCENT = max(parse_int_env("RESOURCE_CPU_ALERT_PERCENT", default=0), 0)
+RESOURCE_ALERT_COOLDOWN_SECONDS = max(parse_int_env("RESOURCE_ALERT_COOLDOWN_SECONDS", default=1800), 60)
+JVM_MONITOR_SECONDS = max(parse_int_env("JVM_MONITOR_SECONDS", default=0), 0)
+JVM_GC_LOG = os.getenv("JVM_GC_LOG", "")
+JVM_WINDOW_MINUTES = max(parse_int_env("JVM_WINDOW_MINUTES", default=10), 2)
+JVM_GC_TIME_ALERT_PERCENT = max(parse_int_env("JVM_GC_TIME_ALERT_PERCENT", default=15), 1)
+JVM_OLD_GEN_ALERT_PERCENT = max(parse_int_env("JVM_OLD_GEN_ALERT_PERCENT", default=85), 1)
+JVM_ALERT_COOLDOWN_SECONDS = max(parse_int_env("JVM_ALERT_COOLDOWN_SECONDS", default=1800), 60)
+JVM_GC_LOG_TAIL_BYTES = 256 * 1024
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+IDLE_STOP_MINUTES = max(parse_int_env("IDLE_STOP_MINUTES", default=0), 0)
+IDLE_WARNING_MINUTES = max(parse_int_env("IDLE_WARNING_MINUTES", default=5), 0)
+IDLE_CHECK_SECONDS = max(parse_int_env("IDLE_CHECK_SECONDS", default=60), 15)
+IDLE_WARMUP_TIMES = os.getenv("IDLE_WARMUP_TIMES", "")
+IDLE_STATE_FILE = os.getenv("IDLE_STATE_FILE", "idle_state.json")
+GOVERNOR_ENABLED = parse_bool_env("GOVERNOR_ENABLED", default=False)
+# RCON templates with a {value} placeholder; vanilla has no runtime command, so these
+# come from the server platform or a plugin (empty = leave that distance alone)
+GOVERNOR_VIEW_COMMAND = os.getenv("GOVERNOR_VIEW_COMMAND", "").strip()
+GOVERNOR_SIMULATION_COMMAND = os.getenv("GOVERNOR_SIMULATION_COMMAND", "").strip()
+GOVERNOR_VIEW_MIN = max(parse_int_env("GOVERNOR_VIEW_MIN", default=6), 2)
+GOVERNOR_VIEW_MAX = max(parse_int_env("GOVERNOR_VIEW_MAX", default=12), GOVERNOR_VIEW_MIN)
+GOVERNOR_SIMULATION_MIN = max(parse_int_env("GOVERNOR_SIMULATION_MIN", default=4), 2)
+GOVERNOR_SIMULATION_MAX = max(parse_int_env("GOVERNOR_SIMULATION_MAX", default=10), GOVERNOR_SIMULATION_MIN)
+GOVERNOR_STEP = max(parse_int_env("GOVERNOR_STEP", default=2), 1)
+GOVERNOR_MSPT_HIGH = max(parse_int_env("GOVERNOR_MSPT_HIGH", default=45), 1)
+GOVERNOR_MSPT_LOW = min(max(parse_int_env("GOVERNOR_MSPT_LOW", default=30), 1), GOVERNOR_MSPT_HIGH)
+GOVERNOR_SAMPLES = max(parse_int_env("GOVERNOR_SAMPLES", default=5), 1)
+GOVERNOR_COOLDOWN_SECONDS = max(parse_int_env("GOVERNOR_COOLDOWN_SECONDS", default=300), 30)
+CENSUS_CACHE_SECONDS = max(parse_int_env("CENSUS_CACHE_SECONDS", default=60), 0)
+CENSUS_PLAYER_RADIUS = max(parse_int_env("CENSUS_PLAYER_RADIUS", default=64), 8)
+CENSUS_ENTITY_TYPES = [
+    t.strip() for t in os.getenv(
+        "CENSUS_ENTITY_TYPES",
+        "item,experience_orb,arrow,chicken,cow,pig,sheep,rabbit,villager,iron_golem,bee,"
+        "zombie,skeleton,creeper,spider,enderman,slime,piglin,zombified_piglin,"
+        "armor_stand,item_frame,minecart,hopper_minecart,chest_minecart,boat,falling_block,tnt"
+    ).split(",") if t.strip()
+]
+CENSUS_DIMENSIONS = (("overworld", "🌍"), ("the_nether", "🔥"), ("the_end", "🌌"))
+METRICS_PORT = max(parse_int_env("METRICS_PORT", default=0), 0)
+METRICS_BIND = os.getenv("METRICS_BIND", "127.0.0.1")
+BACKUP_VERIFY_ENABLED = parse_bool_env("BACKUP_VERIFY_ENABLED", default=True)
+BACKUP_VERIFY_WORKERS = max(parse_int_env("BACKUP_VERIFY_WORKERS", default=BACKUP_ARCHIVE_WORKERS), 1)
+BACKUP_VERIFY_REGION_SAMPLE = max(parse_int_env("BACKUP_VERIFY_REGION_SAMPLE", default=16), 0)
+BACKUP_VERIFY_CHUNK_SAMPLE = max(parse_int_env("BACKUP_VERIFY_CHUNK_SAMPLE", default=256), 0)
+VERIFY_READ_BLOCK = 1024 * 1024
+BACKUP_UPLOAD_ENABLED = parse_bool_env("BACKUP_UPLOAD_ENABLED", default=False)
+# Telegram rejects bot uploads over 50 MB; keep a margin for the multipart framing
+BACKUP_UPLOAD_PART_BYTES = min(max(parse_int_env("BACKUP_UPLOAD_PART_MB", default=45), 1), 49) * 1024 * 1024
+BACKUP_UPLOAD_RETRIES = max(parse_int_env("BACKUP_UPLOAD_RETRIES", default=3), 0)
+BACKUP_UPLOAD_TIMEOUT_SECONDS = max(parse_int_env("BACKUP_UPLOAD_TIMEOUT_SECONDS", default=300), 30)
+UPLOAD_STREAM_BLOCK = 256 * 1024
 AUTO_RECOVERY_ENABLED = parse_bool_env("AUTO_RECOVERY_ENABLED", default=False)
 AUTO_RECOVERY_CHECK_SECONDS = max(parse_int_env("AUTO_RECOVERY_CHECK_SECONDS", default=60), 10)
 AUTO_RECOVERY_MAX_ATTEMPTS = max(parse_int_env("AUTO_RECOVERY_MAX_ATTEMPTS", default=3), 1)
 AUTO_RECOVERY_BACKOFF_SECONDS = max(parse_int_env("AUTO_RECOVERY_BACKOFF_SECONDS", default=30), 0)
+SCHEDULED_TASKS_FILE = os.getenv("SCHEDULED_TASKS_FILE", "scheduled_tasks.json")
+SCHEDULER_WORKERS = max(parse_int_env("SCHEDULER_WORKERS", default=4), 1)
+SCHEDULER_JITTER_PERCENT = min(max(parse_int_env("SCHEDULER_JITTER_PERCENT", default=10), 0), 50)
+# Below Docker's default 10 s stop grace period, which ends in SIGKILL
+SHUTDOWN_TIMEOUT_SECONDS = max(parse_int_env("SHUTDOWN_TIMEOUT_SECONDS", default=8), 1)
+HEALTH_DEGRADED_SECONDS = max(parse_int_env("HEALTH_DEGRADED_SECONDS", default=10), 5)
+HEALTH_DOWN_CHECKS = max(parse_int_env("HEALTH_DOWN_CHECKS", default=3), 1)
+BREAKER_FAILURE_THRESHOLD = max(parse_int_env("BREAKER_FAILURE_THRESHOLD", default=3), 1)
+BREAKER_RESET_SECONDS = max(parse_int_env("BREAKER_RESET_SECONDS", default=15), 1)
+BREAKER_MAX_RESET_SECONDS = max(parse_int_env("BREAKER_MAX_RESET_SECONDS", default=300), BREAKER_RESET_SECONDS)
+WHITELIST_OFFLINE_WRITE = parse_bool_env("WHITELIST_OFFLINE_WRITE", default=False)
+WHITELIST_UPLOAD_MAX_BYTES = 256 * 1024
+PRESENCE_RECONCILE_SECONDS = max(parse_int_env("PRESENCE_RECONCILE_SECONDS", default=300), 30)
+PLAYTIME_HISTORY_DB = os.getenv("PLAYTIME_HISTORY_DB", "playtime_history.db")
+PLAYTIME_SAMPLE_MINUTES = max(parse_int_env("PLAYTIME_SAMPLE_MINUTES", default=10), 0)
+PLAYTIME_HOURLY_RETENTION_DAYS = max(parse_int_env("PLAYTIME_HOURLY_RETENTION_DAYS", default=8), 2)
 
 BASE_URL = f"https://api.telegram.org/bot{BOT_TOKEN}/"
+FILE_BASE_URL = f"https://api.telegram.org/file/bot{BOT_TOKEN}/"
+MOJANG_BULK_LOOKUP_URL = "https://api.minecraftservices.com/minecraft/profile/lookup/bulk/byname"
 
 # Compiled Regex Patterns
 ANSI_ESCAPE_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
 MARKDOWN_ESCAPE_RE = re.compile(r'([\\`*_\[\]()])')
 JOIN_LINE_RE = re.compile(r": (.*?) joined the game")
+CANT_KEEP_UP_RE = re.compile(r"Can't keep up!.*?Running (\d+)ms or (\d+) ticks behind")
+CENSUS_COUNT_RE = re.compile(r"count:\s*(\d+)")
+LEAVE_LINE_RE = re.compile(r"\]: (\S+) (?:left the game|lost connection: )")
+PLAYER_COUNT_RE = re.compile(r"There are (\d+) (?:of a max of|out of maximum) (\d+) players online")
 DEATH_LINE_RE = re.compile(r"\]: (.*)")
 BLOCKED_WHITELIST_RE = re.compile(r"Disconnecting (.*?) \(")
+# Formatting codes (§a etc.) that Paper leaves in command output
+SECTION_CODE_RE = re.compile(r"§.")
+TICK_AVERAGE_RE = re.compile(r"Average time per tick:\s*([\d.]+)\s*ms", re.IGNORECASE)
+TICK_TARGET_RATE_RE = re.compile(r"Target tick rate:\s*([\d.]+)", re.IGNORECASE)
+PAPER_TPS_RE = re.compile(r"TPS from last[^:]*:\s*\*?([\d.]+)")
+PAPER_MSPT_RE = re.compile(r"([\d.]+)/([\d.]+)/([\d.]+)")
+GC_PAUSE_RE = re.compile(r"GC\(\d+\) (Pause [^(]*).*? (\d+)([KMG])->(\d+)([KMG])\((\d+)([KMG])\) ([\d.]+)ms")
+PLAYER_NAME_RE = re.compile(r"^\.?[A-Za-z0-9_]{2,16}$")
+PLAYER_NAME_SPLIT_RE = re.compile(r"[\s,;]+")
+PLAYER_CALLBACK_PREFIXES = ("quick_add:", "manage:", "gm:", "op:", "deop:", "ban:", "unban:", "kick:")
 DEATH_KEYWORDS = [
     "slain by",
     "shot by",
@@ -90,13 +231,16 @@ DEATH_KEYWORDS = [
 
 # State to track pending broadcasts and chat mode
 pending_broadcast = {}
+pending_search = {}
 chat_mode_enabled = True # Default ON
 
 COMMANDS_HELP = (
     "🛠 *Commands:*\n"
-    "`/add <name>` - Add player\n"
-    "`/remove <name>` - Remove player\n"
+    "`/add <names...>` - Add player(s)\n"
+    "`/remove <names...>` - Remove player(s)\n"
     "`/kick <name>` - Kick player\n"
+    "`/top [day|week]` - Playtime ranks 🏆\n"
+    "`/find <prefix>` - Search players 🔍\n"
     "`/cmd <command>` - Run RCON (Owner) 💻"
 )
 
@@ -120,104 +264,2153 @@ GUIDE_TEXT = (
     "`say <message>` (Broadcast)"
 )
 
+# Metrics: counters and histograms kept in memory and served in the
+# Prometheus text format on METRICS_PORT (disabled when 0).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BACKUP_BUCKETS = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+METRICS = {
+    "minecraft_bot_rcon_seconds": ("histogram", "RCON call latency.", LATENCY_BUCKETS),
+    "minecraft_bot_rcon_timeouts_total": ("counter", "RCON calls that timed out.", None),
+    "minecraft_bot_docker_seconds": ("histogram", "Docker CLI call latency by operation.", LATENCY_BUCKETS),
+    "minecraft_bot_telegram_seconds": ("histogram", "Telegram Bot API latency by method.", LATENCY_BUCKETS),
+    "minecraft_bot_telegram_errors_total": ("counter", "Failed Telegram Bot API calls by method.", None),
+    "minecraft_bot_telegram_rate_limited_total": ("counter", "Telegram 429 responses by method.", None),
+    "minecraft_bot_log_lines_total": ("counter", "Server log lines processed.", None),
+    "minecraft_bot_handler_seconds": ("histogram", "Update handler duration by kind.", LATENCY_BUCKETS),
+    "minecraft_bot_backup_seconds": ("histogram", "Backup job duration by engine and status.", BACKUP_BUCKETS),
+    "minecraft_bot_thread_alive": ("gauge", "1 if a background thread is running.", None),
+    "minecraft_bot_job_seconds": ("histogram", "Scheduled job run time by job.", LATENCY_BUCKETS),
+    "minecraft_bot_job_failures_total": ("counter", "Scheduled job runs that raised, by job.", None),
+    "minecraft_bot_job_skipped_total": ("counter", "Scheduled runs skipped because the job was still running.", None),
+    "minecraft_bot_job_restarts_total": ("counter", "Restarts of supervised long-running jobs.", None),
+    "minecraft_bot_breaker_open": ("gauge", "1 while a circuit breaker is failing fast.", None),
+    "minecraft_bot_breaker_transitions_total": ("counter", "Circuit breaker state changes by target and state.", None),
+}
+
+metrics_lock = threading.Lock()
+metric_values = {}
+monitor_threads = {}
+
+def _metric_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def metric_inc(name, amount=1, **labels):
+    key = _metric_key(name, labels)
+    with metrics_lock:
+        metric_values[key] = metric_values.get(key, 0) + amount
+
+def metric_observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    key = _metric_key(name, labels)
+    with metrics_lock:
+        # [per-bucket counts (last one is +Inf), sum, count]
+        record = metric_values.setdefault(key, [[0] * (len(buckets) + 1), 0.0, 0])
+        record[0][bisect.bisect_left(buckets, value)] += 1
+        record[1] += value
+        record[2] += 1
+
+@contextlib.contextmanager
+def metric_timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric_observe(name, time.perf_counter() - started, **labels)
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + "}"
+
+def render_metrics():
+    """Returns all metrics in the Prometheus text exposition format."""
+    with metrics_lock:
+        snapshot = {key: (value if not isinstance(value, list) else [list(value[0]), value[1], value[2]])
+                    for key, value in metric_values.items()}
+    for name, thread in list(monitor_threads.items()):
+        snapshot[_metric_key("minecraft_bot_thread_alive", {"thread": name})] = 1 if thread.is_alive() else 0
+    for name, breaker in list(breakers.items()):
+        snapshot[_metric_key("minecraft_bot_breaker_open", {"target": name})] = 0 if breaker["state"] == "closed" else 1
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (metric, labels), value in sorted(snapshot.items()):
+            if metric != name:
+                continue
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_metrics_server(port=None, bind=None):
+    """Serves /metrics on a daemon thread. Returns the server, or None when disabled."""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = http.server.ThreadingHTTPServer((bind or METRICS_BIND, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics on http://{bind or METRICS_BIND}:{server.server_port}/metrics")
+    return server
+
+def start_monitor(name, target):
+    """Starts a daemon monitor thread and tracks it for the liveness gauge."""
+    thread = threading.Thread(target=target, daemon=True, name=name)
+    monitor_threads[name] = thread
+    thread.start()
+    return thread
+
+# Scheduler: periodic and one-shot jobs on one timer heap, run on a bounded
+# thread pool. Periodic jobs are fixed-rate with jitter; a job that returns
+# a number picks its own next delay instead. A job still running when it
+# comes due again is skipped rather than run twice. Long-running loops
+# (the log follower) get their own supervised thread instead.
+scheduler_cond = threading.Condition()
+scheduler_heap = []
+scheduled_jobs = {}
+scheduler_state = {"seq": 0, "pool": None, "thread": None}
+shutdown_event = threading.Event()
+
+def _push_job(job, delay, now=None):
+    """Queues the job's next run. Call with scheduler_cond held."""
+    scheduler_state["seq"] += 1
+    job["seq"] = scheduler_state["seq"]
+    job["next_run"] = (now or time.time()) + max(delay, 0)
+    heapq.heappush(scheduler_heap, (job["next_run"], job["seq"], job["name"]))
+    scheduler_cond.notify()
+
+def _jittered(job):
+    spread = job["interval"] * job["jitter"]
+    return job["interval"] + random.uniform(-spread, spread)
+
+def schedule_job(name, func, interval, first_delay=None, jitter=None, now=None, one_shot=False):
+    """Runs func every `interval` seconds (first after `first_delay`, default one interval)."""
+    job = {
+        "name": name, "func": func, "interval": interval, "one_shot": one_shot,
+        "jitter": SCHEDULER_JITTER_PERCENT / 100 if jitter is None else jitter,
+        "running": False, "runs": 0, "failures": 0, "skipped": 0,
+        "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": None,
+        "last_error": None, "next_run": None, "seq": 0,
+    }
+    with scheduler_cond:
+        scheduled_jobs[name] = job
+        _push_job(job, _jittered(job) if first_delay is None else first_delay, now=now)
+    return job
+
+def schedule_once(name, delay, func, now=None):
+    """Runs func once after `delay` seconds. Rescheduling the same name replaces it."""
+    return schedule_job(name, func, 0, first_delay=delay, jitter=0, now=now, one_shot=True)
+
+def cancel_job(name):
+    with scheduler_cond:
+        # Its heap entry goes stale and is dropped when popped
+        return scheduled_jobs.pop(name, None) is not None
+
+def _run_job(job):
+    started = time.perf_counter()
+    result = None
+    try:
+        result = job["func"]()
+    except Exception as e:
+        job["failures"] += 1
+        job["last_error"] = str(e)[:200]
+        metric_inc("minecraft_bot_job_failures_total", job=job["name"])
+        print(f"Job {job['name']} failed: {e}")
+    finally:
+        elapsed = time.perf_counter() - started
+        metric_observe("minecraft_bot_job_seconds", elapsed, job=job["name"])
+        with scheduler_cond:
+            job["running"] = False
+            job["runs"] += 1
+            job["total_seconds"] += elapsed
+            job["max_seconds"] = max(job["max_seconds"], elapsed)
+            job["last_seconds"] = elapsed
+            current = scheduled_jobs.get(job["name"]) is job
+            if current and job["one_shot"]:
+                del scheduled_jobs[job["name"]]
+            elif current and isinstance(result, (int, float)) and not isinstance(result, bool):
+                _push_job(job, result)
+
+def dispatch_due_jobs(now=None):
+    """Starts every job that is due. Returns seconds until the next one (None if idle)."""
+    now = now or time.time()
+    with scheduler_cond:
+        while scheduler_heap and scheduler_heap[0][0] <= now:
+            _due, seq, name = heapq.heappop(scheduler_heap)
+            job = scheduled_jobs.get(name)
+            if job is None or job["seq"] != seq:
+                continue
+            if not job["one_shot"]:
+                # Fixed rate: the next run is queued now, from the due time
+                _push_job(job, _jittered(job), now=max(_due, now - job["interval"]))
+            if job["running"]:
+                job["skipped"] += 1
+                metric_inc("minecraft_bot_job_skipped_total", job=name)
+                continue
+            job["running"] = True
+            scheduler_state["pool"].submit(_run_job, job)
+        return scheduler_heap[0][0] - now if scheduler_heap else None
+
+def _scheduler_loop():
+    while not shutdown_event.is_set():
+        wait = dispatch_due_jobs()
+        with scheduler_cond:
+            if shutdown_event.is_set():
+                break
+            scheduler_cond.wait(timeout=60 if wait is None else min(max(wait, 0.01), 60))
+
+def start_scheduler(workers=None):
+    scheduler_state["pool"] = concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers or SCHEDULER_WORKERS, thread_name_prefix="job")
+    scheduler_state["thread"] = start_monitor("scheduler", _scheduler_loop)
+
+def stop_scheduler(timeout=None):
+    """Stops dispatching and waits up to `timeout` seconds for running jobs."""
+    shutdown_event.set()
+    with scheduler_cond:
+        scheduler_cond.notify_all()
+    pool = scheduler_state["pool"]
+    if pool is None:
+        return True
+    deadline = time.time() + (SHUTDOWN_TIMEOUT_SECONDS if timeout is None else timeout)
+    busy = []
+    while time.time() < deadline:
+        with scheduler_cond:
+            busy = [job["name"] for job in scheduled_jobs.values() if job["running"]]
+        if not busy:
+            break
+        time.sleep(0.1)
+    with scheduler_cond:
+        busy = [job["name"] for job in scheduled_jobs.values() if job["running"]]
+    pool.shutdown(wait=False)
+    if busy:
+        print(f"Shutdown: jobs still running: {', '.join(busy)}")
+    return not busy
+
+def supervise(name, target, restart_delay=5, max_delay=300):
+    """Runs a long-running loop, restarting it with backoff if it crashes or returns."""
+    def runner():
+        delay = restart_delay
+        while not shutdown_event.is_set():
+            started = time.time()
+            try:
+                target()
+                reason = "returned"
+            except Exception as e:
+                reason = f"crashed: {e}"
+            if shutdown_event.is_set():
+                break
+            # A loop that ran a while before failing starts over with the short delay
+            delay = restart_delay if time.time() - started > max_delay else min(delay * 2, max_delay)
+            metric_inc("minecraft_bot_job_restarts_total", job=name)
+            print(f"Supervisor: {name} {reason}; restarting in {delay}s")
+            shutdown_event.wait(delay)
+    return start_monitor(name, runner)
+
+def format_job_stats(now=None):
+    now = now or time.time()
+    with scheduler_cond:
+        jobs = sorted((dict(job) for job in scheduled_jobs.values()), key=lambda job: job["name"])
+    if not jobs:
+        return "⏱️ No scheduled jobs."
+    lines = ["⏱️ *Scheduled Jobs:*"]
+    for job in jobs:
+        avg = job["total_seconds"] / job["runs"] * 1000 if job["runs"] else 0
+        state = "running" if job["running"] else f"in {format_duration(max(0, job['next_run'] - now))}"
+        line = (
+            f"• `{escape_markdown(job['name'])}`: {state}, `{job['runs']}` runs, "
+            f"avg `{avg:.0f}` ms, max `{job['max_seconds'] * 1000:.0f}` ms"
+        )
+        if job["skipped"]:
+            line += f", `{job['skipped']}` skipped"
+        if job["failures"]:
+            line += f"\n   ❌ `{job['failures']}` failed, last: `{escape_markdown(job['last_error'])}`"
+        lines.append(line)
+    restarts = sorted((labels[0][1], value) for (metric, labels), value in list(metric_values.items())
+                      if metric == "minecraft_bot_job_restarts_total")
+    for name, count in restarts:
+        lines.append(f"🔁 `{escape_markdown(name)}` restarted `{count}` time(s)")
+    return "\n".join(lines)
+
+# Circuit breakers: after BREAKER_FAILURE_THRESHOLD consecutive failures a
+# target is "open" and calls fail fast instead of waiting out their timeout.
+# Once the reset delay passes, one caller is let through as a "half_open"
+# probe; success closes the breaker, failure reopens it with a doubled delay.
+class CircuitOpenError(subprocess.SubprocessError):
+    """Raised instead of running a command while its breaker is open."""
+
+breaker_lock = threading.Lock()
+
+def _new_breaker():
+    return {"state": "closed", "failures": 0, "opened_at": 0.0,
+            "reset_after": BREAKER_RESET_SECONDS, "last_error": ""}
+
+breakers = {"rcon": _new_breaker(), "docker": _new_breaker()}
+breaker_transitions = collections.deque(maxlen=50)
+
+def _breaker_transition(name, breaker, state, now):
+    if breaker["state"] == state:
+        return
+    breaker_transitions.append((now, name, breaker["state"], state, breaker["last_error"]))
+    print(f"Circuit {name}: {breaker['state']} -> {state} ({breaker['last_error'] or 'ok'})")
+    breaker["state"] = state
+    metric_inc("minecraft_bot_breaker_transitions_total", target=name, state=state)
+
+def breaker_allow(name, now=None):
+    """True if a call may go ahead; an open breaker admits one probe once its delay is up."""
+    now = now or time.time()
+    with breaker_lock:
+        breaker = breakers[name]
+        if breaker["state"] == "closed":
+            return True
+        if breaker["state"] == "open" and now - breaker["opened_at"] >= breaker["reset_after"]:
+            _breaker_transition(name, breaker, "half_open", now)
+            return True
+        return False
+
+def breaker_success(name, now=None):
+    with breaker_lock:
+        breaker = breakers[name]
+        breaker["failures"] = 0
+        breaker["reset_after"] = BREAKER_RESET_SECONDS
+        breaker["last_error"] = ""
+        _breaker_transition(name, breaker, "closed", now or time.time())
+
+def breaker_failure(name, error, now=None):
+    now = now or time.time()
+    with breaker_lock:
+        breaker = breakers[name]
+        breaker["failures"] += 1
+        breaker["last_error"] = str(error)[:200]
+        if breaker["state"] == "half_open":
+            breaker["reset_after"] = min(breaker["reset_after"] * 2, BREAKER_MAX_RESET_SECONDS)
+        elif breaker["state"] == "open" or breaker["failures"] < BREAKER_FAILURE_THRESHOLD:
+            return
+        breaker["opened_at"] = now
+        _breaker_transition(name, breaker, "open", now)
+
+def breaker_reset(name):
+    """Closes a breaker right away, e.g. after the container was (re)started."""
+    with breaker_lock:
+        breaker = breakers[name]
+        breaker["failures"] = 0
+        breaker["reset_after"] = BREAKER_RESET_SECONDS
+        _breaker_transition(name, breaker, "closed", time.time())
+
+def breaker_open_message(name, now=None):
+    """Cached status for a target that is failing fast, or None while it is usable."""
+    now = now or time.time()
+    with breaker_lock:
+        breaker = breakers[name]
+        if breaker["state"] == "closed":
+            return None
+        retry = max(0, breaker["opened_at"] + breaker["reset_after"] - now)
+    label = "RCON" if name == "rcon" else "Docker"
+    return f"{label} unreachable (retry in {format_duration(retry)})"
+
+def docker_output(args, op, timeout=5):
+    """Runs a docker CLI command and returns its stripped stdout."""
+    if not breaker_allow("docker"):
+        raise CircuitOpenError(breaker_open_message("docker"))
+    try:
+        with metric_timer("minecraft_bot_docker_seconds", op=op):
+            output = subprocess.check_output(["docker"] + args, timeout=timeout)
+    except subprocess.CalledProcessError:
+        # The daemon answered; the command itself failed
+        breaker_success("docker")
+        raise
+    except Exception as e:
+        # Anything else counts too, or a half-open probe would never resolve
+        breaker_failure("docker", e)
+        raise
+    breaker_success("docker")
+    return output.strip().decode(errors="replace")
+
+def docker_run(args, op, timeout):
+    if not breaker_allow("docker"):
+        raise CircuitOpenError(breaker_open_message("docker"))
+    try:
+        with metric_timer("minecraft_bot_docker_seconds", op=op):
+            result = subprocess.run(["docker"] + args, check=True, timeout=timeout)
+    except subprocess.CalledProcessError:
+        breaker_success("docker")
+        raise
+    except Exception as e:
+        breaker_failure("docker", e)
+        raise
+    breaker_success("docker")
+    return result
+
 def rcon_command(cmd_input):
+    return rcon_probe(cmd_input)[1]
+
+def rcon_probe(cmd_input, force=False):
+    """Runs one RCON command. Returns (reached_server, output).
+
+    `force` skips the breaker's fail-fast check; the result still updates it.
+    """
     try:
         if isinstance(cmd_input, list):
             args = cmd_input
         else:
             args = cmd_input.split()
 
+        if not force and not breaker_allow("rcon"):
+            return False, f"⚠️ Error: {breaker_open_message('rcon')}"
         cmd = ["docker", "exec", "-i", CONTAINER_NAME, "rcon-cli"] + args
         # Add timeout to prevent hanging commands
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-        return result.stdout.strip()
-    except subprocess.TimeoutExpired:
-        return "⚠️ Error: RCON Timeout (Server Busy)"
+        with metric_timer("minecraft_bot_rcon_seconds"):
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+        return _record_rcon_result(result), result.stdout.strip()
+    except subprocess.TimeoutExpired as e:
+        metric_inc("minecraft_bot_rcon_timeouts_total")
+        breaker_failure("rcon", e)
+        return False, "⚠️ Error: RCON Timeout (Server Busy)"
     except Exception as e:
-        return f"Error: {e}"
+        breaker_failure("rcon", e)
+        return False, f"Error: {e}"
+
+def _record_rcon_result(result):
+    """rcon-cli exits non-zero without output when it cannot reach the server."""
+    if result.returncode and not (result.stdout or "").strip():
+        breaker_failure("rcon", (result.stderr or "rcon-cli failed").strip())
+        return False
+    breaker_success("rcon")
+    return True
+
+RCON_BATCH_NO_RESPONSE = "⚠️ Error: no response from rcon-cli"
+RCON_BATCH_UNMATCHED = "⚠️ Error: could not match rcon-cli output to commands"
+
+def rcon_batch(commands, timeout=15):
+    """Runs several RCON commands through one rcon-cli process. Returns one output per command.
+
+    rcon-cli reads commands from stdin when given no arguments and prints
+    "> " before each response, so the outputs are split on that prompt.
+    """
+    if not commands:
+        return []
+    if not breaker_allow("rcon"):
+        return [f"⚠️ Error: {breaker_open_message('rcon')}"] * len(commands)
+    try:
+        with metric_timer("minecraft_bot_rcon_seconds"):
+            result = subprocess.run(
+                ["docker", "exec", "-i", CONTAINER_NAME, "rcon-cli"],
+                input="\n".join(commands) + "\n",
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+    except subprocess.TimeoutExpired as e:
+        metric_inc("minecraft_bot_rcon_timeouts_total")
+        breaker_failure("rcon", e)
+        return ["⚠️ Error: RCON Timeout (Server Busy)"] * len(commands)
+    except Exception as e:
+        breaker_failure("rcon", e)
+        return [f"Error: {e}"] * len(commands)
+    _record_rcon_result(result)
+
+    clean = strip_ansi(result.stdout)
+    prompted = clean.startswith("> ") or "\n> " in clean
+    if clean.startswith("> "):
+        clean = clean[2:]
+    outputs = [o.strip() for o in clean.split("\n> ")]
+    if outputs and not outputs[-1]:
+        outputs.pop()
+    if result.returncode != 0 and not outputs:
+        error_output = (result.stderr or "rcon-cli failed").strip()
+        return [f"Error: {error_output}"] * len(commands)
+    if len(commands) > 1 and not prompted:
+        # Without prompts the responses cannot be told apart
+        return [RCON_BATCH_UNMATCHED] * len(commands)
+    # Pad so callers can always zip with their commands; a missing response is not a success
+    outputs.extend([RCON_BATCH_NO_RESPONSE] * (len(commands) - len(outputs)))
+    return outputs[:len(commands)]
 
 def start_server():
     try:
-        subprocess.run(["docker", "start", CONTAINER_NAME], check=True, timeout=10)
+        docker_run(["start", CONTAINER_NAME], "start", 10)
+        breaker_reset("rcon")
         return "✅ Server starting..."
     except Exception as e:
         return f"❌ Error: {e}"
 
 def restart_server():
     try:
-        subprocess.run(["docker", "restart", CONTAINER_NAME], check=True, timeout=60)
+        docker_run(["restart", CONTAINER_NAME], "restart", 60)
+        breaker_reset("rcon")
         return "🔄 Server restarting..."
     except Exception as e:
         return f"❌ Error: {e}"
 
 def stop_server():
     try:
-        subprocess.run(["docker", "stop", CONTAINER_NAME], check=True, timeout=20)
+        docker_run(["stop", CONTAINER_NAME], "stop", 20)
         return "🛑 Server stopped."
     except Exception as e:
         return f"❌ Error: {e}"
 
-def run_backup():
+# Backup job manager: one job at a time. Extra requests attach to the running
+# job, progress is pushed into the requesters' messages, and finished jobs go
+# into a short history.
+class BackupCancelled(Exception):
+    """Raised inside a backup engine when its job has been cancelled."""
+
+backup_jobs_lock = threading.Lock()
+backup_jobs = {"current": None, "next_id": 1}
+backup_job_history = collections.deque(maxlen=20)
+
+def _own_backup_job():
+    """Returns the running job if the caller is its worker thread."""
+    job = backup_jobs["current"]
+    if job is not None and job["thread"] is threading.current_thread():
+        return job
+    return None
+
+def backup_cancel_requested():
+    job = _own_backup_job()
+    return job is not None and job["cancel"].is_set()
+
+def backup_phase(phase, files_total=0, bytes_total=0):
+    job = _own_backup_job()
+    if job is None:
+        return
+    if job["cancel"].is_set():
+        raise BackupCancelled()
+    with backup_jobs_lock:
+        job.update(phase=phase, phase_started=time.time(), files_done=0, bytes_done=0,
+                   files_total=files_total, bytes_total=bytes_total)
+
+def backup_progress(files=0, nbytes=0):
+    job = _own_backup_job()
+    if job is None:
+        return
+    if job["cancel"].is_set():
+        raise BackupCancelled()
+    with backup_jobs_lock:
+        job["files_done"] += files
+        job["bytes_done"] += nbytes
+
+def start_backup_job(trigger, watcher=None, broadcast=False):
+    """Starts a backup job, or attaches to the running one. Returns (job, started)."""
+    with backup_jobs_lock:
+        job = backup_jobs["current"]
+        if job is not None:
+            if watcher and watcher not in job["watchers"]:
+                job["watchers"].append(watcher)
+            job["broadcast"] = job["broadcast"] or broadcast
+            return job, False
+
+        job = {
+            "id": backup_jobs["next_id"],
+            "trigger": trigger,
+            "engine": BACKUP_ENGINE,
+            "started": time.time(),
+            "phase": "starting",
+            "phase_started": time.time(),
+            "files_done": 0,
+            "files_total": 0,
+            "bytes_done": 0,
+            "bytes_total": 0,
+            "watchers": [watcher] if watcher else [],
+            "broadcast": broadcast,
+            "cancel": threading.Event(),
+            "done": threading.Event(),
+            "result": None,
+        }
+        backup_jobs["next_id"] += 1
+        job["thread"] = threading.Thread(target=_run_backup_job, args=(job,), daemon=True)
+        backup_jobs["current"] = job
+    job["thread"].start()
+    return job, True
+
+def cancel_backup_job():
+    with backup_jobs_lock:
+        job = backup_jobs["current"]
+        if job is None:
+            return False
+        job["cancel"].set()
+        return True
+
+def get_backup_cancel_keyboard():
+    return {"inline_keyboard": [[
+        {"text": "🛑 Cancel Backup", "callback_data": "backup_cancel"},
+        {"text": "🔄 Refresh", "callback_data": "backup_status"}
+    ]]}
+
+def format_backup_progress(job, now=None):
+    now = now or time.time()
+    with backup_jobs_lock:
+        snap = dict(job)
+    lines = [
+        f"⏳ *Backup running* (job `#{snap['id']}`, {snap['trigger']}, {snap['engine']})",
+        f"🔧 Phase: `{snap['phase']}`",
+    ]
+    if snap["files_total"]:
+        lines.append(f"📁 Files: `{snap['files_done']}/{snap['files_total']}`")
+    if snap["bytes_total"]:
+        percent = min(snap["bytes_done"] * 100 // snap["bytes_total"], 100)
+        lines.append(f"💾 Data: `{format_bytes(snap['bytes_done'])} / {format_bytes(snap['bytes_total'])}` ({percent}%)")
+    eta_text = ""
+    phase_elapsed = now - snap["phase_started"]
+    if snap["bytes_total"] and snap["bytes_done"] and phase_elapsed > 0:
+        rate = snap["bytes_done"] / phase_elapsed
+        eta_text = f", ETA `{format_duration((snap['bytes_total'] - snap['bytes_done']) / rate)}`"
+    lines.append(f"⏱️ Elapsed `{format_duration(now - snap['started'])}`{eta_text}")
+    if snap["cancel"].is_set():
+        lines.append("🛑 _Cancelling..._")
+    return "\n".join(lines)
+
+def _push_backup_progress(job):
+    while not job["done"].wait(BACKUP_PROGRESS_SECONDS):
+        text = format_backup_progress(job)
+        for chat_id, msg_id in list(job["watchers"]):
+            edit_message(chat_id, msg_id, text, get_backup_cancel_keyboard())
+
+def _run_backup_job(job):
+    threading.Thread(target=_push_backup_progress, args=(job,), daemon=True).start()
+    # Allow a little clock slack so script backups stamped at start still count
+    since = job["started"] - 5
     try:
-        # Run in background to avoid blocking bot
-        if os.path.exists(BACKUP_SCRIPT):
-            subprocess.Popen([BACKUP_SCRIPT])
-            return "📦 Backup started! You will receive files shortly."
-        else:
-            return "❌ Backup script not found."
+        ok, message = run_backup_blocking()
+        if ok and BACKUP_VERIFY_ENABLED:
+            verified, verify_line = verify_latest_backup(since)
+            message = f"{message}\n{verify_line}"
+            # A backup that fails verification must not push out older good ones
+            ok = verified is not False
+    except BackupCancelled:
+        ok, message = False, ""
     except Exception as e:
-        return f"❌ Error starting backup: {e}"
+        ok, message = False, f"❌ Backup error: {escape_markdown(e)}"
+
+    status = "ok" if ok else "failed"
+    if job["cancel"].is_set():
+        # Engines may have reported the interruption as a failure
+        ok, status, message = False, "cancelled", "🛑 *Backup cancelled.*"
+
+    if ok and BACKUP_UPLOAD_ENABLED:
+        with backup_jobs_lock:
+            job.update(phase="uploading", phase_started=time.time(), files_total=0, bytes_total=0)
+        message = f"{message}\n{upload_latest_backup(since=since)}"
+
+    if ok:
+        try:
+            removed_count = apply_backup_retention()
+            policy = get_retention_policy()
+            if retention_enabled(policy):
+                unit = "snapshot(s)" if BACKUP_ENGINE == "builtin" else "file(s)"
+                message = (
+                    f"{message}\n🧹 Retention: {escape_markdown(describe_retention_policy(policy))}, "
+                    f"removed `{removed_count}` old {unit}."
+                )
+        except Exception as e:
+            message = f"{message}\n⚠️ Retention error: {escape_markdown(e)}"
+
+    finished = time.time()
+    metric_observe("minecraft_bot_backup_seconds", finished - job["started"], engine=job["engine"], status=status)
+    with backup_jobs_lock:
+        job["result"] = (ok, message)
+        backup_jobs["current"] = None
+        backup_job_history.appendleft({
+            "id": job["id"],
+            "trigger": job["trigger"],
+            "engine": job["engine"],
+            "started": job["started"],
+            "duration": finished - job["started"],
+            "status": status,
+        })
+    job["done"].set()
+
+    for chat_id, msg_id in job["watchers"]:
+        edit_message(chat_id, msg_id, f"{message}\n\n{COMMANDS_HELP}", get_main_keyboard())
+    if job["broadcast"]:
+        broadcast_message(message)
+
+def format_backup_history():
+    with backup_jobs_lock:
+        history = list(backup_job_history)
+        current = backup_jobs["current"]
+    if not history and current is None:
+        return "📭 *No backup jobs yet.*"
+
+    icons = {"ok": "✅", "failed": "❌", "cancelled": "🛑"}
+    lines = ["📦 *Backup Jobs:*"]
+    if current is not None:
+        lines.append(f"⏳ `#{current['id']}` {current['trigger']} - running ({current['phase']})")
+    for entry in history:
+        stamp = time.strftime("%m-%d %H:%M", time.localtime(entry["started"]))
+        lines.append(
+            f"{icons[entry['status']]} `#{entry['id']}` {stamp} {entry['trigger']}/{entry['engine']} "
+            f"- `{format_duration(entry['duration'])}`"
+        )
+    return "\n".join(lines)
 
 def run_backup_blocking():
-    """Runs backup script synchronously and returns (ok, message)."""
+    """Runs the configured backup engine synchronously and returns (ok, message)."""
+    if BACKUP_ENGINE == "builtin":
+        return run_builtin_backup()
+    if BACKUP_ENGINE == "archive":
+        return run_archive_backup()
+
     if not os.path.exists(BACKUP_SCRIPT):
         return False, "❌ Backup script not found."
 
+    # The script reads the live world, so keep autosave off while it runs
+    coordinate = BACKUP_SAVE_COORDINATION and is_container_running()
+    if coordinate:
+        flush_world_saves()
+    process = None
     try:
-        result = subprocess.run(
+        backup_phase("script")
+        process = subprocess.Popen(
             [BACKUP_SCRIPT],
-            check=False,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=900,
         )
-        if result.returncode != 0:
-            error_output = (result.stderr or result.stdout or "Unknown error").strip()
+        deadline = time.time() + BACKUP_TIMEOUT_SECONDS
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=1)
+                break
+            except subprocess.TimeoutExpired:
+                if backup_cancel_requested():
+                    return False, "🛑 *Backup cancelled.*"
+                if time.time() > deadline:
+                    return False, f"❌ Scheduled backup timed out after {BACKUP_TIMEOUT_SECONDS // 60} minutes."
+
+        if process.returncode != 0:
+            error_output = (stderr or stdout or "Unknown error").strip()
             return False, f"❌ Scheduled backup failed:\n`{escape_markdown(error_output[:350])}`"
         return True, "✅ Scheduled backup completed."
-    except subprocess.TimeoutExpired:
-        return False, "❌ Scheduled backup timed out after 15 minutes."
     except Exception as e:
         return False, f"❌ Scheduled backup error: {escape_markdown(e)}"
+    finally:
+        if process is not None and process.poll() is None:
+            # Never leave the script running unattended
+            process.terminate()
+            try:
+                process.communicate(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+        if coordinate:
+            resume_world_saves()
+
+RETENTION_TIERS = (
+    ("hourly", "%Y%m%d%H"),
+    ("daily", "%Y%m%d"),
+    ("weekly", "%G%V"),
+    ("monthly", "%Y%m"),
+)
 
-def apply_backup_retention():
-    """Deletes old backups based on BACKUP_RETENTION_COUNT."""
-    if BACKUP_RETENTION_COUNT <= 0:
-        return 0
-    if not os.path.isdir(BACKUP_DIR):
-        return 0
+def get_retention_policy():
+    return {
+        "latest": BACKUP_RETENTION_COUNT,
+        "hourly": BACKUP_RETENTION_HOURLY,
+        "daily": BACKUP_RETENTION_DAILY,
+        "weekly": BACKUP_RETENTION_WEEKLY,
+        "monthly": BACKUP_RETENTION_MONTHLY,
+        "max_bytes": BACKUP_RETENTION_MAX_GB * 1024 ** 3,
+    }
 
+def describe_retention_policy(policy):
+    parts = []
+    if policy["latest"]:
+        parts.append(f"newest {policy['latest']}")
+    for tier, _ in RETENTION_TIERS:
+        if policy[tier]:
+            parts.append(f"{policy[tier]} {tier}")
+    if policy["max_bytes"]:
+        parts.append(f"cap {format_bytes(policy['max_bytes'])}")
+    return ", ".join(parts) or "disabled"
+
+def scan_backup_entries(directory, suffix=None):
+    """Lists backups with one os.scandir pass. Returns [(name, path, mtime, size)], newest first."""
+    entries = []
     try:
-        files = []
-        for name in os.listdir(BACKUP_DIR):
-            full_path = os.path.join(BACKUP_DIR, name)
-            if os.path.isfile(full_path):
-                files.append(full_path)
-
-        files.sort(key=os.path.getmtime, reverse=True)
-        old_files = files[BACKUP_RETENTION_COUNT:]
-
+        with os.scandir(directory) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith(".") or name.endswith((".part", ".tmp")):
+                    continue
+                if suffix and not name.endswith(suffix):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    # DirEntry caches this stat result; no further syscalls per file
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((name, entry.path, st.st_mtime, st.st_size))
+    except OSError:
+        return []
+    entries.sort(key=lambda e: e[2], reverse=True)
+    return entries
+
+def plan_backup_retention(entries, policy):
+    """Splits newest-first entries into (keep, delete) with the reason each kept entry survives.
+
+    An entry is kept if it is among the newest `latest`, or is the newest in
+    one of the last N hour/day/ISO-week/month buckets. With no count or tier
+    set, everything is kept. With a size cap, the oldest kept entries are then
+    dropped until the total fits (the newest entry always stays).
+    """
+    if not entries:
+        return [], []
+    reasons = {}
+    if not any(policy[key] for key in ("latest", "hourly", "daily", "weekly", "monthly")):
+        for name, _path, _mtime, _size in entries:
+            reasons[name] = ["all"]
+
+    for name, _path, _mtime, _size in entries[:policy["latest"]]:
+        reasons.setdefault(name, []).append("latest")
+
+    for tier, fmt in RETENTION_TIERS:
+        limit = policy[tier]
+        if not limit:
+            continue
+        seen = set()
+        for name, _path, mtime, _size in entries:
+            bucket = time.strftime(fmt, time.localtime(mtime))
+            if bucket in seen:
+                continue
+            seen.add(bucket)
+            reasons.setdefault(name, []).append(tier)
+            if len(seen) >= limit:
+                break
+
+    reasons.setdefault(entries[0][0], ["newest"])
+    keep = [e for e in entries if e[0] in reasons]
+    if policy["max_bytes"]:
+        total = 0
+        capped = []
+        for i, entry in enumerate(keep):
+            total += entry[3]
+            if i > 0 and total > policy["max_bytes"]:
+                reasons.pop(entry[0], None)
+                continue
+            capped.append(entry)
+        keep = capped
+
+    kept_names = {e[0] for e in keep}
+    delete = [e for e in entries if e[0] not in kept_names]
+    return [(e, reasons[e[0]]) for e in keep], delete
+
+def _retention_targets():
+    """Returns (entries, delete_fn, unit) for the active backup engine."""
+    if BACKUP_ENGINE == "builtin":
+        _, manifests_dir = _store_paths()
+        entries = scan_backup_entries(manifests_dir, suffix=".json")
+        # Manifests are tiny; the size cap applies to archive files only
+        return entries, lambda doomed: delete_snapshots([e[0][:-5] for e in doomed]), "snapshot(s)"
+
+    def delete_files(doomed):
         removed = 0
-        for file_path in old_files:
+        for _name, path, _mtime, _size in doomed:
             try:
-                os.remove(file_path)
+                os.remove(path)
                 removed += 1
             except OSError:
                 continue
+            for sidecar in (_upload_state_path(path), _verify_record_path(path)):
+                try:
+                    os.remove(sidecar)
+                except OSError:
+                    pass
         return removed
-    except OSError:
+
+    return scan_backup_entries(BACKUP_DIR), delete_files, "file(s)"
+
+def retention_enabled(policy):
+    return any(policy[key] for key in ("latest", "hourly", "daily", "weekly", "monthly", "max_bytes"))
+
+def apply_backup_retention():
+    """Deletes backups outside the retention policy. Returns the number removed."""
+    policy = get_retention_policy()
+    if not retention_enabled(policy):
         return 0
 
+    if BACKUP_ENGINE == "builtin":
+        # Manifests are tiny; a size cap alone never removes snapshots
+        policy["max_bytes"] = 0
+        if not retention_enabled(policy):
+            return 0
+
+    entries, delete_fn, _unit = _retention_targets()
+    _keep, doomed = plan_backup_retention(entries, policy)
+    removed = delete_fn(doomed) if doomed else 0
+    if removed and BACKUP_ENGINE == "builtin":
+        gc_chunks()
+    return removed
+
+def get_retention_report():
+    """Dry-run of apply_backup_retention as a Telegram message."""
+    policy = get_retention_policy()
+    if not retention_enabled(policy):
+        return "🧹 *Retention:* disabled.\nSet `BACKUP_RETENTION_COUNT` or `BACKUP_RETENTION_DAILY`/... to enable."
+
+    if BACKUP_ENGINE == "builtin":
+        policy["max_bytes"] = 0
+        if not retention_enabled(policy):
+            return "🧹 *Retention:* only `BACKUP_RETENTION_MAX_GB` is set, which the built-in engine ignores.\nNothing will be deleted."
+
+    entries, _delete_fn, unit = _retention_targets()
+    keep, doomed = plan_backup_retention(entries, policy)
+    kept_bytes = sum(e[3] for e, _ in keep)
+    lines = [
+        f"🧹 *Retention dry run* ({escape_markdown(describe_retention_policy(policy))})",
+        f"✅ Keep `{len(keep)}` {unit} ({format_bytes(kept_bytes)})",
+    ]
+    for (name, _path, mtime, _size), reasons in keep[:15]:
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+        lines.append(f"  `{stamp}` {escape_markdown(name)} - {', '.join(reasons)}")
+    lines.append(f"🗑️ Delete `{len(doomed)}` {unit} ({format_bytes(sum(e[3] for e in doomed))})")
+    for name, _path, mtime, _size in doomed[:15]:
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+        lines.append(f"  `{stamp}` {escape_markdown(name)}")
+    if len(doomed) > 15:
+        lines.append(f"  _...and {len(doomed) - 15} more_")
+    return "\n".join(lines)
+
+# Built-in backup engine (BACKUP_ENGINE=builtin): world files are split into
+# fixed-size chunks, stored once under chunks/<sha256[:2]>/<sha256> (zlib),
+# and each snapshot is a JSON manifest listing the chunks of every file.
+backup_store_lock = threading.RLock()
+
+def _store_paths(store_dir=None):
+    store_dir = store_dir or BACKUP_STORE_DIR
+    return os.path.join(store_dir, "chunks"), os.path.join(store_dir, "manifests")
+
+def _chunk_path(chunks_dir, digest):
+    return os.path.join(chunks_dir, digest[:2], digest)
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def store_chunk(chunks_dir, data):
+    """Stores a chunk if it is new. Returns (digest, stored_bytes)."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(chunks_dir, digest)
+    if os.path.exists(path):
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed = zlib.compress(data, BACKUP_COMPRESS_LEVEL)
+    _write_atomic(path, compressed)
+    return digest, len(compressed)
+
+def read_chunk(chunks_dir, digest):
+    with open(_chunk_path(chunks_dir, digest), "rb") as f:
+        return zlib.decompress(f.read())
+
+def iter_world_files(world_dir):
+    """Yields (relative_path, stat_result) for every regular file under world_dir."""
+    stack = [world_dir]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                # session.lock is held open by the server and never useful in a backup
+                if entry.name == "session.lock":
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                yield os.path.relpath(entry.path, world_dir).replace(os.sep, "/"), st
+
+def list_snapshots(store_dir=None):
+    """Returns snapshot ids, oldest first."""
+    _, manifests_dir = _store_paths(store_dir)
+    try:
+        names = os.listdir(manifests_dir)
+    except OSError:
+        return []
+    return sorted(name[:-5] for name in names if name.endswith(".json"))
+
+def load_manifest(snapshot_id, store_dir=None):
+    _, manifests_dir = _store_paths(store_dir)
+    with open(os.path.join(manifests_dir, f"{snapshot_id}.json"), "r") as f:
+        return json.load(f)
+
+REGION_SECTOR = 4096
+REGION_SLOTS = 1024
+REGION_HEADER_SIZE = 2 * REGION_SECTOR
+DIGEST_SIZE = 32
+
+def _snapshot_region_file(chunks_dir, f, previous, file_size):
+    """Snapshots an Anvil .mca file chunk by chunk using its header timestamp table.
+
+    Only Minecraft chunks whose location or timestamp changed since the
+    previous snapshot are read. Returns (region_info, new_chunks, new_bytes),
+    or None if the header does not look like a valid region file.
+    """
+    header = f.read(REGION_HEADER_SIZE)
+    if len(header) < REGION_HEADER_SIZE:
+        return None
+
+    prev_header = prev_slots = None
+    if previous and "region" in previous:
+        try:
+            prev_header = read_chunk(chunks_dir, previous["region"]["header"])
+            prev_slots = read_chunk(chunks_dir, previous["region"]["slots"])
+        except (OSError, zlib.error):
+            prev_header = prev_slots = None
+
+    slots = bytearray(REGION_SLOTS * DIGEST_SIZE)
+    new_chunks = 0
+    new_bytes = 0
+    for i in range(REGION_SLOTS):
+        loc = header[i * 4:i * 4 + 4]
+        if loc == b"\0\0\0\0":
+            continue
+        offset = int.from_bytes(loc[:3], "big")
+        count = loc[3]
+        if offset < 2 or count == 0 or offset * REGION_SECTOR >= file_size:
+            return None
+
+        ts_at = REGION_SECTOR + i * 4
+        slot = slice(i * DIGEST_SIZE, (i + 1) * DIGEST_SIZE)
+        if (
+            prev_header is not None
+            and prev_header[i * 4:i * 4 + 4] == loc
+            and prev_header[ts_at:ts_at + 4] == header[ts_at:ts_at + 4]
+            and any(prev_slots[slot])
+        ):
+            slots[slot] = prev_slots[slot]
+            continue
+
+        f.seek(offset * REGION_SECTOR)
+        digest, stored = store_chunk(chunks_dir, f.read(count * REGION_SECTOR))
+        slots[slot] = bytes.fromhex(digest)
+        if stored:
+            new_chunks += 1
+            new_bytes += stored
+
+    region = {}
+    for key, data in (("header", header), ("slots", bytes(slots))):
+        digest, stored = store_chunk(chunks_dir, data)
+        region[key] = digest
+        if stored:
+            new_chunks += 1
+            new_bytes += stored
+    return region, new_chunks, new_bytes
+
+def _snapshot_file(chunks_dir, full_path, previous, st):
+    """Chunks one file. Returns (file_entry, new_chunks, new_bytes)."""
+    if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+        # Unchanged since the last snapshot: reuse its entry without reading
+        return dict(previous), 0, 0
+
+    entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    with open(full_path, "rb") as f:
+        if full_path.endswith(".mca"):
+            result = _snapshot_region_file(chunks_dir, f, previous, st.st_size)
+            if result is not None:
+                entry["region"] = result[0]
+                return entry, result[1], result[2]
+            # Not a usable region header: fall back to whole-file chunking
+            f.seek(0)
+
+        chunks = []
+        new_chunks = 0
+        new_bytes = 0
+        while True:
+            data = f.read(BACKUP_CHUNK_SIZE)
+            if not data:
+                break
+            digest, stored = store_chunk(chunks_dir, data)
+            chunks.append(digest)
+            if stored:
+                new_chunks += 1
+                new_bytes += stored
+    entry["chunks"] = chunks
+    return entry, new_chunks, new_bytes
+
+def iter_region_slots(slot_table):
+    """Yields (slot_index, digest) for present chunks in a region slot table."""
+    for i in range(REGION_SLOTS):
+        raw = slot_table[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]
+        if any(raw):
+            yield i, raw.hex()
+
+def manifest_entry_digests(chunks_dir, entry, slot_cache=None):
+    """Returns every chunk digest a manifest file entry depends on."""
+    if "region" not in entry:
+        return list(entry["chunks"])
+    region = entry["region"]
+    slots_digest = region["slots"]
+    if slot_cache is not None and slots_digest in slot_cache:
+        inner = slot_cache[slots_digest]
+    else:
+        inner = [d for _, d in iter_region_slots(read_chunk(chunks_dir, slots_digest))]
+        if slot_cache is not None:
+            slot_cache[slots_digest] = inner
+    return [region["header"], slots_digest] + inner
+
+def _restore_file(chunks_dir, entry, f):
+    if "region" not in entry:
+        for digest in entry["chunks"]:
+            f.write(read_chunk(chunks_dir, digest))
+        return
+
+    header = read_chunk(chunks_dir, entry["region"]["header"])
+    f.write(header)
+    for i, digest in iter_region_slots(read_chunk(chunks_dir, entry["region"]["slots"])):
+        offset = int.from_bytes(header[i * 4:i * 4 + 3], "big")
+        f.seek(offset * REGION_SECTOR)
+        f.write(read_chunk(chunks_dir, digest))
+    f.truncate(entry["size"])
+
+def create_snapshot(world_dir=None, store_dir=None, carry_over=None, source=None):
+    """Takes an incremental, deduplicated snapshot of the world. Returns the manifest.
+
+    `carry_over` lists relative paths known to be unchanged since the last
+    snapshot; their entries are copied from the previous manifest as-is.
+    """
+    world_dir = world_dir or WORLD_DIR
+    if not os.path.isdir(world_dir):
+        raise FileNotFoundError(f"World directory not found: {world_dir}")
+
+    chunks_dir, manifests_dir = _store_paths(store_dir)
+    with backup_store_lock:
+        os.makedirs(chunks_dir, exist_ok=True)
+        os.makedirs(manifests_dir, exist_ok=True)
+
+        existing = list_snapshots(store_dir)
+        previous_files = load_manifest(existing[-1], store_dir)["files"] if existing else {}
+
+        started = time.time()
+        snapshot_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+        suffix = 1
+        while snapshot_id in existing:
+            suffix += 1
+            snapshot_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}-{suffix}"
+
+        files = {}
+        total_bytes = 0
+        new_chunks = 0
+        new_bytes = 0
+        for rel_path in carry_over or ():
+            if rel_path in previous_files:
+                files[rel_path] = previous_files[rel_path]
+                total_bytes += files[rel_path]["size"]
+
+        world_files = list(iter_world_files(world_dir))
+        backup_phase("hashing", len(world_files), sum(st.st_size for _, st in world_files))
+        for rel_path, st in world_files:
+            backup_progress(1, st.st_size)
+            try:
+                entry, added, added_bytes = _snapshot_file(
+                    chunks_dir, os.path.join(world_dir, rel_path), previous_files.get(rel_path), st
+                )
+            except OSError:
+                # File vanished or is unreadable mid-save; skip it this round
+                continue
+            files[rel_path] = entry
+            total_bytes += entry["size"]
+            new_chunks += added
+            new_bytes += added_bytes
+
+        manifest = {
+            "id": snapshot_id,
+            "created": started,
+            "duration": time.time() - started,
+            "source": os.path.abspath(source or world_dir),
+            "file_count": len(files),
+            "total_bytes": total_bytes,
+            "new_chunks": new_chunks,
+            "new_bytes": new_bytes,
+            "files": files,
+        }
+        _write_atomic(
+            os.path.join(manifests_dir, f"{snapshot_id}.json"),
+            json.dumps(manifest, separators=(",", ":")).encode(),
+        )
+        return manifest
+
+def restore_snapshot(snapshot_id, target_dir, store_dir=None):
+    """Rebuilds a snapshot into target_dir. Returns the number of files written."""
+    chunks_dir, _ = _store_paths(store_dir)
+    manifest = load_manifest(snapshot_id, store_dir)
+    restored = 0
+    for rel_path, entry in manifest["files"].items():
+        dest = os.path.join(target_dir, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "wb") as f:
+            _restore_file(chunks_dir, entry, f)
+        mtime = entry["mtime_ns"]
+        os.utime(dest, ns=(mtime, mtime))
+        restored += 1
+    return restored
+
+def delete_snapshots(snapshot_ids, store_dir=None):
+    _, manifests_dir = _store_paths(store_dir)
+    removed = 0
+    for snapshot_id in snapshot_ids:
+        try:
+            os.remove(os.path.join(manifests_dir, f"{snapshot_id}.json"))
+            removed += 1
+        except OSError:
+            continue
+        try:
+            os.remove(os.path.join(manifests_dir, f".{snapshot_id}.verify.json"))
+        except OSError:
+            pass
+    return removed
+
+def gc_chunks(store_dir=None):
+    """Deletes chunks no manifest references. Returns (removed_chunks, freed_bytes)."""
+    chunks_dir, _ = _store_paths(store_dir)
+    with backup_store_lock:
+        referenced = set()
+        slot_cache = {}
+        try:
+            for snapshot_id in list_snapshots(store_dir):
+                for entry in load_manifest(snapshot_id, store_dir)["files"].values():
+                    referenced.update(manifest_entry_digests(chunks_dir, entry, slot_cache))
+        except (OSError, ValueError, zlib.error) as e:
+            # Never delete chunks when the reference set may be incomplete
+            print(f"Chunk GC skipped: {e}")
+            return 0, 0
+
+        removed = 0
+        freed = 0
+        try:
+            prefixes = list(os.scandir(chunks_dir))
+        except OSError:
+            return 0, 0
+        for prefix in prefixes:
+            if not prefix.is_dir():
+                continue
+            for chunk in os.scandir(prefix.path):
+                if chunk.name in referenced:
+                    continue
+                try:
+                    size = chunk.stat().st_size
+                    os.remove(chunk.path)
+                except OSError:
+                    continue
+                removed += 1
+                freed += size
+        return removed, freed
+
+def format_bytes(num_bytes):
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+# Log waiters let backup code block until the log monitor sees a given line
+log_waiters_lock = threading.Lock()
+log_waiters = []
+
+def register_log_waiter(substring):
+    waiter = (substring, threading.Event())
+    with log_waiters_lock:
+        log_waiters.append(waiter)
+    return waiter
+
+def unregister_log_waiter(waiter):
+    with log_waiters_lock:
+        if waiter in log_waiters:
+            log_waiters.remove(waiter)
+
+def notify_log_waiters(line):
+    with log_waiters_lock:
+        for substring, event in log_waiters:
+            if substring in line:
+                event.set()
+
+def flush_world_saves(timeout=None):
+    """Disables autosave and flushes the world to disk. Returns True once the save is confirmed."""
+    waiter = register_log_waiter("Saved the game")
+    try:
+        outputs = rcon_batch(["save-off", "save-all flush"])
+        # save-all flush is synchronous on modern servers and echoes the message itself
+        if any("Saved the game" in out for out in outputs):
+            return True
+        return waiter[1].wait(timeout if timeout is not None else BACKUP_SAVE_TIMEOUT_SECONDS)
+    finally:
+        unregister_log_waiter(waiter)
+
+def resume_world_saves():
+    rcon_command("save-on")
+
+class CloneUnavailableError(Exception):
+    """Raised by clone_file when only a full copy would work and copies are not allowed."""
+
+def clone_file(src, dst, allow_copy=True):
+    """Copies src to dst as cheaply as the filesystem allows. Returns the method used."""
+    try:
+        import fcntl
+        FICLONE = 0x40049409
+        with open(src, "rb") as s_f, open(dst, "wb") as d_f:
+            fcntl.ioctl(d_f.fileno(), FICLONE, s_f.fileno())
+        shutil.copystat(src, dst)
+        return "reflink"
+    except (ImportError, OSError):
+        pass
+
+    # The server replaces .dat files atomically (write + rename), so a hard link
+    # stays a consistent copy. Region files are rewritten in place and must be copied.
+    if src.endswith(".dat"):
+        try:
+            if os.path.exists(dst):
+                os.remove(dst)
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+
+    if not allow_copy:
+        raise CloneUnavailableError(f"cannot reflink {src}")
+    shutil.copy2(src, dst)
+    return "copy"
+
+def check_stage_dir(stage_dir, world_dir):
+    """Raises ValueError if the staging dir is or contains the world or backup folders.
+
+    The stage is wiped before every snapshot, so a misconfigured
+    BACKUP_STAGING_DIR must never point at data the bot does not own. It
+    may not sit inside the world or the chunk store either.
+    """
+    stage = os.path.realpath(stage_dir)
+    stage_prefix = stage.rstrip(os.sep) + os.sep
+    guarded = (
+        (world_dir, True), (WORLD_DIR, True), (BACKUP_STORE_DIR, True), (BACKUP_DIR, False),
+    )
+    for path, no_nesting in guarded:
+        target = os.path.realpath(path)
+        if stage == target or target.startswith(stage_prefix) or (no_nesting and stage.startswith(target + os.sep)):
+            raise ValueError(f"Refusing to use staging dir {stage_dir}: it overlaps {path}")
+
+def stage_world(world_dir, stage_dir, previous_files, allow_copy=True):
+    """Clones files changed since the last snapshot into stage_dir.
+
+    Returns (unchanged_paths, method_counts). Unchanged files are not
+    cloned at all; the snapshot reuses their previous manifest entries.
+    """
+    check_stage_dir(stage_dir, world_dir)
+    if os.path.exists(stage_dir):
+        shutil.rmtree(stage_dir)
+    os.makedirs(stage_dir)
+
+    files = list(iter_world_files(world_dir))
+    backup_phase("staging", len(files), sum(st.st_size for _, st in files))
+    unchanged = []
+    methods = {}
+    for rel_path, st in files:
+        backup_progress(1, st.st_size)
+        previous = previous_files.get(rel_path)
+        if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+            unchanged.append(rel_path)
+            continue
+        dest = os.path.join(stage_dir, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            method = clone_file(os.path.join(world_dir, rel_path), dest, allow_copy=allow_copy)
+        except FileNotFoundError:
+            # Deleted since the scan; anything else (ENOSPC, EACCES) must fail the backup
+            continue
+        methods[method] = methods.get(method, 0) + 1
+    return unchanged, methods
+
+def _default_stage_dir(world_dir):
+    # Next to the world so reflinks and hard links stay on one filesystem
+    return BACKUP_STAGING_DIR or os.path.join(os.path.dirname(world_dir), ".backup-staging")
+
+@contextlib.contextmanager
+def paused_world_saves():
+    """Keeps autosave off and the world flushed for the duration of the block. Yields the info dict."""
+    coordinate = BACKUP_SAVE_COORDINATION and is_container_running()
+    info = {"coordinated": coordinate, "save_confirmed": None, "window": 0.0, "methods": {}}
+    window_start = time.time()
+    try:
+        if coordinate:
+            info["save_confirmed"] = flush_world_saves()
+        yield info
+    finally:
+        if coordinate:
+            resume_world_saves()
+        info["window"] = time.time() - window_start
+        if coordinate and info["window"] > BACKUP_SAVE_WINDOW_WARN_SECONDS:
+            print(f"Save-off window took {info['window']:.1f}s (over {BACKUP_SAVE_WINDOW_WARN_SECONDS}s)")
+
+def stage_world_consistently(world_dir, stage_dir, previous_files, allow_copy=True):
+    """Stages the world with autosave paused. Returns (unchanged_paths, info)."""
+    with paused_world_saves() as info:
+        unchanged, info["methods"] = stage_world(world_dir, stage_dir, previous_files, allow_copy=allow_copy)
+    return unchanged, info
+
+def format_save_window(info):
+    if not info["coordinated"]:
+        return []
+    lines = [f"⏸️ Save-off window: `{info['window']:.1f}s`"]
+    if info["window"] > BACKUP_SAVE_WINDOW_WARN_SECONDS:
+        lines.append(f"⚠️ Saving was paused longer than `{BACKUP_SAVE_WINDOW_WARN_SECONDS}s`; players may notice.")
+    if not info["save_confirmed"]:
+        lines.append("⚠️ `save-all flush` was not confirmed; backup may include unsaved chunks.")
+    return lines
+
+def run_consistent_snapshot(world_dir=None, store_dir=None, stage_dir=None):
+    """save-off → save-all flush → stage changed files → save-on → snapshot from the stage.
+
+    Returns (manifest, info) where info holds the save-off window and staging details.
+    """
+    world_dir = world_dir or WORLD_DIR
+    stage_dir = stage_dir or _default_stage_dir(world_dir)
+    if not os.path.isdir(world_dir):
+        raise FileNotFoundError(f"World directory not found: {world_dir}")
+
+    with backup_store_lock:
+        existing = list_snapshots(store_dir)
+        previous_files = load_manifest(existing[-1], store_dir)["files"] if existing else {}
+        unchanged, info = stage_world_consistently(world_dir, stage_dir, previous_files)
+
+        # Hashing and compression run from the stage after saving is back on
+        try:
+            manifest = create_snapshot(stage_dir, store_dir, carry_over=unchanged, source=world_dir)
+        finally:
+            shutil.rmtree(stage_dir, ignore_errors=True)
+    return manifest, info
+
+def run_builtin_backup():
+    """Runs the built-in snapshot engine and returns (ok, message)."""
+    try:
+        manifest, info = run_consistent_snapshot()
+    except Exception as e:
+        return False, f"❌ Snapshot failed: {escape_markdown(e)}"
+
+    lines = [
+        f"✅ Snapshot `{manifest['id']}` completed in `{manifest['duration'] + info['window']:.1f}s`.",
+        f"📁 Files: `{manifest['file_count']}` ({format_bytes(manifest['total_bytes'])})",
+        f"🧩 New data: `{manifest['new_chunks']}` chunk(s), {format_bytes(manifest['new_bytes'])}",
+    ]
+    lines.extend(format_save_window(info))
+    return True, "\n".join(lines)
+
+# Parallel zip archiver (BACKUP_ENGINE=archive). Files are split into pieces
+# that worker processes deflate independently; non-final pieces end with a
+# sync flush so the pieces concatenate into one valid deflate stream.
+ZIP64_LIMIT = 0xFFFFFFFF
+
+def _gf2_matrix_times(mat, vec):
+    total = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            total ^= mat[i]
+        vec >>= 1
+        i += 1
+    return total
+
+def _gf2_matrix_square(mat):
+    return [_gf2_matrix_times(mat, mat[n]) for n in range(32)]
+
+def crc32_combine(crc1, crc2, len2):
+    """CRC-32 of A+B from crc(A), crc(B) and len(B) (port of zlib's crc32_combine)."""
+    if len2 <= 0:
+        return crc1
+    odd = [0xEDB88320] + [1 << (n - 1) for n in range(1, 32)]
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+    while True:
+        even = _gf2_matrix_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = _gf2_matrix_square(even)
+        if len2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+def _compress_piece(path, offset, length, level, final):
+    """Worker: raw-deflates one piece of a file. Returns (data, crc32, raw_length)."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    out = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+    return out, zlib.crc32(data), len(data)
+
+def _dos_datetime(mtime):
+    t = time.localtime(max(mtime, 315532800))
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+def _zip64_extra(*values):
+    return struct.pack("<HH", 0x0001, 8 * len(values)) + b"".join(struct.pack("<Q", v) for v in values)
+
+def write_parallel_zip(src_dir, out_path, workers=None, level=None, piece_size=None):
+    """Writes src_dir into a zip, deflating pieces across a process pool.
+
+    Compressed pieces are written in order as they complete, with at most a
+    few pieces per worker in flight. Returns a stats dict.
+    """
+    workers = workers or BACKUP_ARCHIVE_WORKERS
+    level = BACKUP_COMPRESS_LEVEL if level is None else level
+    piece_size = piece_size or BACKUP_ARCHIVE_PIECE_SIZE
+    files = sorted(iter_world_files(src_dir))
+
+    tasks = []
+    for rel_path, st in files:
+        full_path = os.path.join(src_dir, rel_path)
+        pieces = max(1, -(-st.st_size // piece_size))
+        for i in range(pieces):
+            tasks.append((rel_path, full_path, i * piece_size, piece_size, i == pieces - 1))
+
+    started = time.time()
+    central = []
+    tmp_path = out_path + ".part"
+    backup_phase("compressing", len(files), sum(st.st_size for _, st in files))
+    try:
+        archive_size = _write_zip_members(tmp_path, files, tasks, workers, level, piece_size, central)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    raw_total = sum(member[3] for member in central)
+
+    os.replace(tmp_path, out_path)
+    return {
+        "files": len(central),
+        "raw_bytes": raw_total,
+        "archive_bytes": archive_size,
+        "duration": time.time() - started,
+        "workers": workers,
+    }
+
+# The bot runs scheduler, log and metrics threads; forking while one of them
+# holds a lock can deadlock the child, so pool workers start from a clean process.
+PROCESS_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def process_pool(workers):
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(PROCESS_POOL_START_METHOD))
+
+def _write_zip_members(tmp_path, files, tasks, workers, level, piece_size, central):
+    with open(tmp_path, "wb") as out, process_pool(workers) as pool:
+        pending = collections.deque()
+        task_iter = iter(tasks)
+        stats_by_path = dict(files)
+        current = None  # [rel_path, header_offset, crc, raw_size, comp_size, zip64]
+
+        def submit_next():
+            task = next(task_iter, None)
+            if task is not None:
+                pending.append((task, pool.submit(_compress_piece, task[1], task[2], task[3], level, task[4])))
+
+        for _ in range(workers * 4):
+            submit_next()
+
+        while pending:
+            (rel_path, _full, _off, _len, final), future = pending.popleft()
+            data, crc, raw_len = future.result()
+            backup_progress(1 if final else 0, raw_len)
+            submit_next()
+
+            if current is None:
+                st = stats_by_path[rel_path]
+                name = rel_path.encode("utf-8")
+                zip64 = st.st_size >= ZIP64_LIMIT - piece_size
+                dos_time, dos_date = _dos_datetime(st.st_mtime)
+                extra = _zip64_extra(0, 0) if zip64 else b""
+                current = [rel_path, out.tell(), 0, 0, 0, zip64, dos_time, dos_date, st.st_mode]
+                # Bit 3: sizes and CRC follow the data; bit 11: UTF-8 names
+                out.write(struct.pack(
+                    "<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, 0x0808, 8, dos_time, dos_date,
+                    0, ZIP64_LIMIT if zip64 else 0, ZIP64_LIMIT if zip64 else 0, len(name), len(extra),
+                ) + name + extra)
+
+            out.write(data)
+            current[2] = crc32_combine(current[2], crc, raw_len) if current[3] else crc
+            current[3] += raw_len
+            current[4] += len(data)
+
+            if final:
+                if current[5]:
+                    out.write(struct.pack("<IIQQ", 0x08074B50, current[2], current[4], current[3]))
+                else:
+                    out.write(struct.pack("<IIII", 0x08074B50, current[2], current[4], current[3]))
+                central.append(current)
+                current = None
+
+        cd_offset = out.tell()
+        for rel_path, offset, crc, raw_size, comp_size, zip64, dos_time, dos_date, mode in central:
+            name = rel_path.encode("utf-8")
+            needs64 = zip64 or raw_size >= ZIP64_LIMIT or comp_size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+            extra = _zip64_extra(raw_size, comp_size, offset) if needs64 else b""
+            out.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, 0x031E, 45 if needs64 else 20, 0x0808, 8,
+                dos_time, dos_date, crc,
+                ZIP64_LIMIT if needs64 else comp_size, ZIP64_LIMIT if needs64 else raw_size,
+                len(name), len(extra), 0, 0, 0, (mode & 0xFFFF) << 16, ZIP64_LIMIT if needs64 else offset,
+            ) + name + extra)
+        cd_size = out.tell() - cd_offset
+
+        count = len(central)
+        if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            eocd64_offset = out.tell()
+            out.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset))
+            out.write(struct.pack("<IIQI", 0x07064B50, 0, eocd64_offset, 1))
+        out.write(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(cd_size, ZIP64_LIMIT), min(cd_offset, ZIP64_LIMIT), 0,
+        ))
+        return out.tell()
+
+def stage_archive_by_cloning(world_dir, stage_dir):
+    """Stages the world with reflinks/hard links only. Returns the save-off info, or None if it cannot."""
+    try:
+        check_stage_dir(stage_dir, world_dir)
+    except ValueError as e:
+        print(f"Archive staging skipped: {e}")
+        return None
+    try:
+        _, info = stage_world_consistently(world_dir, stage_dir, {}, allow_copy=False)
+    except CloneUnavailableError as e:
+        # A full copy under save-off would be slower than compressing the world itself
+        print(f"Archive staging skipped: {e}")
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        return None
+    return info
+
+def run_archive_backup(world_dir=None, out_dir=None):
+    """Writes a parallel-compressed zip of the world into BACKUP_DIR.
+
+    The world is cloned into the stage during a short save-off window and
+    compressed from there. Only when the filesystem cannot reflink is the zip
+    written from the live world, with saving paused for the whole write.
+    """
+    world_dir = world_dir or WORLD_DIR
+    out_dir = out_dir or BACKUP_DIR
+    if not os.path.isdir(world_dir):
+        return False, f"❌ World directory not found: `{escape_markdown(world_dir)}`"
+
+    stage_dir = _default_stage_dir(world_dir)
+    out_path = os.path.join(out_dir, f"world-{time.strftime('%Y%m%d-%H%M%S')}.zip")
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        with backup_store_lock:
+            info = stage_archive_by_cloning(world_dir, stage_dir)
+            if info is not None:
+                try:
+                    stats = write_parallel_zip(stage_dir, out_path)
+                finally:
+                    shutil.rmtree(stage_dir, ignore_errors=True)
+            else:
+                with paused_world_saves() as info:
+                    stats = write_parallel_zip(world_dir, out_path)
+                info["live"] = True
+    except Exception as e:
+        return False, f"❌ Archive backup failed: {escape_markdown(e)}"
+
+    rate = stats["raw_bytes"] / stats["duration"] if stats["duration"] > 0 else 0
+    lines = [
+        f"✅ Archive `{os.path.basename(out_path)}` written in `{stats['duration']:.1f}s`.",
+        f"📁 Files: `{stats['files']}` ({format_bytes(stats['raw_bytes'])} → {format_bytes(stats['archive_bytes'])})",
+        f"⚙️ Workers: `{stats['workers']}`, {format_bytes(rate)}/s",
+    ]
+    if info.get("live"):
+        lines.append("⚠️ Staging needs reflink support; compressed the live world with saving paused.")
+    lines.extend(format_save_window(info))
+    return True, "\n".join(lines)
+
+# Backup verification: after a backup is written it is read back. Zip members
+# are streamed so zipfile checks every CRC, snapshot chunks new since the
+# previous snapshot (plus a sample of older ones) are re-hashed, and a sample
+# of region headers is sanity-checked. The result is stored
+# in a hidden `.<name>.verify.json` next to the backup.
+def check_region_header(header, file_size):
+    """Sanity-checks an Anvil region header. Returns a problem or None."""
+    if file_size == 0:
+        return None
+    if len(header) < REGION_HEADER_SIZE:
+        return "truncated region header"
+    sectors = -(-file_size // REGION_SECTOR)
+    used = []
+    for i in range(REGION_SLOTS):
+        offset = int.from_bytes(header[i * 4:i * 4 + 3], "big")
+        count = header[i * 4 + 3]
+        if offset == 0 and count == 0:
+            continue
+        if offset < 2 or count == 0:
+            return f"slot {i} has an invalid location"
+        if offset + count > sectors:
+            return f"slot {i} points past the end of the file"
+        used.append((offset, count))
+    used.sort()
+    for (offset, count), (next_offset, _) in zip(used, used[1:]):
+        if offset + count > next_offset:
+            return f"chunks overlap at sector {next_offset}"
+    return None
+
+def _verify_zip_members(zip_path, region_names, names):
+    """Worker: reads zip members to the end so zipfile checks their CRCs. Returns [(name, problem)]."""
+    problems = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for name in names:
+            try:
+                with zf.open(name) as member:
+                    head = member.read(REGION_HEADER_SIZE)
+                    while member.read(VERIFY_READ_BLOCK):
+                        pass
+            except (zipfile.BadZipFile, zlib.error, OSError, EOFError) as e:
+                problems.append((name, str(e)))
+                continue
+            if name in region_names:
+                problem = check_region_header(head, zf.getinfo(name).file_size)
+                if problem:
+                    problems.append((name, problem))
+    return problems
+
+def _verify_chunk_batch(chunks_dir, digests):
+    """Worker: re-hashes stored chunks. Returns [(digest, problem)]."""
+    problems = []
+    for digest in digests:
+        try:
+            data = read_chunk(chunks_dir, digest)
+        except (OSError, zlib.error) as e:
+            problems.append((digest, str(e)))
+            continue
+        if hashlib.sha256(data).hexdigest() != digest:
+            problems.append((digest, "content hash mismatch"))
+    return problems
+
+def _split_batches(items, sizes, count):
+    """Spreads items over `count` batches, largest first, balancing total size."""
+    batches = [[] for _ in range(max(count, 1))]
+    loads = [0] * len(batches)
+    for item, size in sorted(zip(items, sizes), key=lambda pair: pair[1], reverse=True):
+        i = loads.index(min(loads))
+        batches[i].append(item)
+        loads[i] += size
+    return [batch for batch in batches if batch]
+
+def _run_verify_batches(worker, fixed_args, batches, batch_sizes, workers):
+    """Runs worker(*fixed_args, batch) over a process pool, reporting progress."""
+    problems = []
+    if workers <= 1 or len(batches) <= 1:
+        for batch, size in zip(batches, batch_sizes):
+            problems.extend(worker(*fixed_args, batch))
+            backup_progress(len(batch), size)
+        return problems
+    with process_pool(workers) as pool:
+        futures = {pool.submit(worker, *fixed_args, batch): (batch, size) for batch, size in zip(batches, batch_sizes)}
+        for future in concurrent.futures.as_completed(futures):
+            batch, size = futures[future]
+            problems.extend(future.result())
+            backup_progress(len(batch), size)
+    return problems
+
+def verify_zip_archive(path, workers=None, region_sample=None):
+    workers = workers or BACKUP_VERIFY_WORKERS
+    region_sample = BACKUP_VERIFY_REGION_SAMPLE if region_sample is None else region_sample
+    try:
+        with zipfile.ZipFile(path) as zf:
+            infos = [info for info in zf.infolist() if not info.is_dir()]
+    except (zipfile.BadZipFile, OSError) as e:
+        return {"kind": "zip", "checked": 0, "bytes": 0, "regions": 0, "problems": [(os.path.basename(path), str(e))]}
+
+    regions = [info.filename for info in infos if info.filename.endswith(".mca") and info.file_size]
+    sampled = set(random.sample(regions, min(region_sample, len(regions))))
+    names = [info.filename for info in infos]
+    sizes = [info.file_size for info in infos]
+    total = sum(sizes)
+    backup_phase("verifying", len(names), total)
+
+    # More batches than workers keeps cores busy when member sizes are uneven
+    size_by_name = dict(zip(names, sizes))
+    batches = _split_batches(names, sizes, workers * 4)
+    batch_sizes = [sum(size_by_name[name] for name in batch) for batch in batches]
+    problems = _run_verify_batches(_verify_zip_members, (path, sampled), batches, batch_sizes, workers)
+    return {"kind": "zip", "checked": len(names), "bytes": total, "regions": len(sampled), "problems": problems}
+
+def verify_tar_archive(path):
+    """Streams every member of a (compressed) tar; the codec checks its own CRC."""
+    checked = 0
+    total = 0
+    problems = []
+    backup_phase("verifying")
+    try:
+        with tarfile.open(path, "r:*") as tf:
+            for member in tf:
+                if not member.isfile():
+                    continue
+                stream = tf.extractfile(member)
+                while stream.read(VERIFY_READ_BLOCK):
+                    pass
+                checked += 1
+                total += member.size
+                backup_progress(1, member.size)
+    except (tarfile.TarError, zlib.error, OSError, EOFError) as e:
+        problems.append((os.path.basename(path), str(e)))
+    return {"kind": "tar", "checked": checked, "bytes": total, "regions": 0, "problems": problems}
+
+def _previous_snapshot_digests(snapshot_id, store_dir, chunks_dir, slot_cache):
+    """Returns the chunk digests of the snapshot before snapshot_id, or an empty set."""
+    older = [s for s in list_snapshots(store_dir) if s < snapshot_id]
+    if not older:
+        return set()
+    digests = set()
+    try:
+        for entry in load_manifest(older[-1], store_dir)["files"].values():
+            digests.update(manifest_entry_digests(chunks_dir, entry, slot_cache))
+    except (OSError, ValueError, zlib.error):
+        # Without a usable baseline every chunk counts as new
+        return set()
+    return digests
+
+def verify_snapshot(snapshot_id, store_dir=None, workers=None, region_sample=None, chunk_sample=None):
+    """Re-hashes the chunks this snapshot wrote plus a sample of older chunks it reuses."""
+    workers = workers or BACKUP_VERIFY_WORKERS
+    region_sample = BACKUP_VERIFY_REGION_SAMPLE if region_sample is None else region_sample
+    chunk_sample = BACKUP_VERIFY_CHUNK_SAMPLE if chunk_sample is None else chunk_sample
+    chunks_dir, _ = _store_paths(store_dir)
+    manifest = load_manifest(snapshot_id, store_dir)
+    problems = []
+    digests = set()
+    slot_cache = {}
+    region_entries = []
+    for rel_path, entry in manifest["files"].items():
+        try:
+            digests.update(manifest_entry_digests(chunks_dir, entry, slot_cache))
+        except (OSError, zlib.error) as e:
+            problems.append((rel_path, f"slot table unreadable: {e}"))
+        if "region" in entry and entry["size"]:
+            region_entries.append((rel_path, entry))
+
+    for rel_path, entry in random.sample(region_entries, min(region_sample, len(region_entries))):
+        try:
+            problem = check_region_header(read_chunk(chunks_dir, entry["region"]["header"]), entry["size"])
+        except (OSError, zlib.error) as e:
+            problem = str(e)
+        if problem:
+            problems.append((rel_path, problem))
+
+    # Chunks already in the previous snapshot were verified when it was taken
+    per_chunk = manifest["total_bytes"] // max(len(digests), 1)
+    reused = sorted(digests & _previous_snapshot_digests(snapshot_id, store_dir, chunks_dir, slot_cache))
+    sampled = random.sample(reused, min(chunk_sample, len(reused)))
+    digests = sorted(digests.difference(reused)) + sampled
+    total = len(digests) * per_chunk
+    backup_phase("verifying", len(digests), total)
+    # Chunks are similar in size, so plain slicing balances well enough
+    batches = [digests[i::workers * 4] for i in range(workers * 4) if digests[i::workers * 4]]
+    batch_sizes = [len(batch) * per_chunk for batch in batches]
+    problems.extend(_run_verify_batches(_verify_chunk_batch, (chunks_dir,), batches, batch_sizes, workers))
+    return {
+        "kind": "snapshot",
+        "checked": len(digests),
+        "sampled": len(sampled),
+        "bytes": total,
+        "regions": min(region_sample, len(region_entries)),
+        "problems": problems,
+    }
+
+def _verify_record_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.verify.json")
+
+def record_verification(record_path, result):
+    record = dict(result)
+    record["ok"] = not result["problems"]
+    record["problems"] = [list(problem) for problem in result["problems"][:100]]
+    record["verified_at"] = int(time.time())
+    _write_atomic(record_path, json.dumps(record, indent=2).encode("utf-8"))
+    return record
+
+def format_verification(result, duration):
+    units = {"zip": "member(s)", "tar": "member(s)", "snapshot": "chunk(s)"}
+    sample_note = f", `{result['regions']}` region header(s) sampled" if result["regions"] else ""
+    if result.get("sampled"):
+        sample_note = f" (`{result['sampled']}` older sampled){sample_note}"
+    summary = (
+        f"`{result['checked']}` {units[result['kind']]}, {format_bytes(result['bytes'])} "
+        f"in `{duration:.1f}s`{sample_note}"
+    )
+    if not result["problems"]:
+        return f"🔎 Verified {summary}."
+    lines = [f"🚨 *Verification FAILED* ({summary}): `{len(result['problems'])}` problem(s)"]
+    for name, problem in result["problems"][:5]:
+        lines.append(f"• `{escape_markdown(name)}`: {escape_markdown(problem[:100])}")
+    return "\n".join(lines)
+
+def verify_latest_backup(since=0):
+    """Verifies the newest backup. Returns (True/False, or None when skipped, message)."""
+    started = time.time()
+    if BACKUP_ENGINE == "builtin":
+        snapshots = list_snapshots()
+        if not snapshots:
+            return None, "⚠️ Verification skipped: no snapshot found."
+        _, manifests_dir = _store_paths()
+        record_path = os.path.join(manifests_dir, f".{snapshots[-1]}.verify.json")
+        try:
+            result = verify_snapshot(snapshots[-1])
+        except (OSError, ValueError) as e:
+            result = {"kind": "snapshot", "checked": 0, "bytes": 0, "regions": 0, "problems": [(snapshots[-1], str(e))]}
+    else:
+        path = find_latest_backup_file(since)
+        if path is None:
+            return None, "⚠️ Verification skipped: no new backup file found in `BACKUP_DIR`."
+        record_path = _verify_record_path(path)
+        if path.endswith(".zip"):
+            result = verify_zip_archive(path)
+        elif path.endswith((".tar", ".tar.gz", ".tgz", ".tar.xz", ".tar.bz2")):
+            result = verify_tar_archive(path)
+        else:
+            return None, f"ℹ️ Verification skipped: unknown format `{escape_markdown(os.path.basename(path))}`."
+
+    record_verification(record_path, result)
+    return not result["problems"], format_verification(result, time.time() - started)
+
+# Backup upload: archives are streamed to Telegram straight from disk and
+# split into numbered byte ranges (`name.001`, `name.002`, ...) when they
+# exceed the bot upload limit. Rejoin with `cat name.0* > name`.
+upload_state_lock = threading.Lock()
+
+def plan_upload_parts(size, part_bytes=None):
+    """Returns [(offset, length)] covering a file of `size` bytes."""
+    part_bytes = part_bytes or BACKUP_UPLOAD_PART_BYTES
+    if size <= part_bytes:
+        return [(0, size)]
+    return [(offset, min(part_bytes, size - offset)) for offset in range(0, size, part_bytes)]
+
+def upload_part_name(filename, index, count):
+    return filename if count == 1 else f"{filename}.{index + 1:03d}"
+
+def _upload_state_path(path):
+    directory, name = os.path.split(path)
+    # Hidden, so backup listings and retention never count it as a backup
+    return os.path.join(directory, f".{name}.upload.json")
+
+def _load_upload_state(path, st, part_bytes):
+    """Returns the delivered-parts record for `path`, reset if the file changed."""
+    fresh = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "part_bytes": part_bytes, "delivered": {}}
+    try:
+        with open(_upload_state_path(path), "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return fresh
+    if any(state.get(key) != fresh[key] for key in ("size", "mtime_ns", "part_bytes")):
+        return fresh
+    return state
+
+def post_multipart(method, fields, file_field, filename, length, write_file,
+                   content_type="application/octet-stream", timeout=None):
+    """POSTs a multipart form whose file part (`length` bytes) is written by write_file(conn).
+
+    The body is sent piece by piece with an exact Content-Length, so large
+    files are never held in memory. Returns the decoded Bot API reply.
+    """
+    boundary = uuid_lib.uuid4().hex
+    safe_name = filename.replace('"', "_").replace("\r", "_").replace("\n", "_")
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        for key, value in fields
+    )
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{safe_name}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+
+    url = urllib.parse.urlsplit(BASE_URL + method)
+    connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    conn = connection_class(url.netloc, timeout=timeout or BACKUP_UPLOAD_TIMEOUT_SECONDS)
+    try:
+        conn.putrequest("POST", url.path)
+        conn.putheader("Content-Type", f"multipart/form-data; boundary={boundary}")
+        conn.putheader("Content-Length", str(len(head) + length + len(tail)))
+        conn.endheaders()
+        conn.send(head)
+        write_file(conn)
+        conn.send(tail)
+        body = conn.getresponse().read()
+    finally:
+        conn.close()
+    return json.loads(body.decode("utf-8"))
+
+def post_document_stream(chat_id, path, offset, length, filename, caption="", timeout=None):
+    """Sends a byte range of `path` with sendDocument, streamed from disk."""
+    def write_range(conn):
+        with open(path, "rb") as f:
+            f.seek(offset)
+            remaining = length
+            while remaining:
+                block = f.read(min(UPLOAD_STREAM_BLOCK, remaining))
+                if not block:
+                    raise OSError("file shrank during upload")
+                conn.send(block)
+                remaining -= len(block)
+
+    fields = (("chat_id", chat_id), ("caption", caption))
+    return post_multipart("sendDocument", fields, "document", filename, length, write_range, timeout=timeout)
+
+def send_photo(chat_id, png, caption=""):
+    """Sends PNG bytes with sendPhoto. Returns the reply or None on errors."""
+    fields = (("chat_id", chat_id), ("caption", caption), ("parse_mode", "Markdown"))
+    try:
+        with metric_timer("minecraft_bot_telegram_seconds", method="sendPhoto"):
+            return post_multipart("sendPhoto", fields, "photo", "chart.png", len(png), lambda conn: conn.send(png),
+                                  content_type="image/png", timeout=30)
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        metric_inc("minecraft_bot_telegram_errors_total", method="sendPhoto")
+        print(f"Request error sendPhoto: {e}")
+        return None
+
+def _send_part_with_retry(chat_id, path, offset, length, filename, caption):
+    """Returns None on success or the last error text."""
+    error = "unknown error"
+    for attempt in range(BACKUP_UPLOAD_RETRIES + 1):
+        if attempt:
+            time.sleep(min(2 ** attempt, 30))
+        try:
+            with metric_timer("minecraft_bot_telegram_seconds", method="sendDocument"):
+                reply = post_document_stream(chat_id, path, offset, length, filename, caption)
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            metric_inc("minecraft_bot_telegram_errors_total", method="sendDocument")
+            error = str(e) or e.__class__.__name__
+            continue
+        if reply.get("ok"):
+            return None
+        if reply.get("error_code") == 429:
+            metric_inc("minecraft_bot_telegram_rate_limited_total", method="sendDocument")
+        error = reply.get("description") or f"error {reply.get('error_code')}"
+        retry_after = (reply.get("parameters") or {}).get("retry_after")
+        if retry_after:
+            time.sleep(min(retry_after, 60))
+        elif reply.get("error_code") in (400, 403):
+            # Bad chat or blocked bot: retrying will not help
+            break
+    return error
+
+def _upload_to_chat(chat_id, path, parts, state, filename):
+    key = str(chat_id)
+    for index, (offset, length) in enumerate(parts):
+        with upload_state_lock:
+            if index in state["delivered"].get(key, []):
+                continue
+        part_name = upload_part_name(filename, index, len(parts))
+        caption = f"📦 {filename}" if len(parts) == 1 else f"📦 {filename} part {index + 1}/{len(parts)}"
+        error = _send_part_with_retry(chat_id, path, offset, length, part_name, caption)
+        if error:
+            return error
+        with upload_state_lock:
+            state["delivered"].setdefault(key, []).append(index)
+            _write_atomic(_upload_state_path(path), json.dumps(state).encode("utf-8"))
+    return None
+
+def upload_backup_file(path, chat_ids=None):
+    """Uploads a backup to each chat concurrently, resuming from delivered parts.
+
+    Returns (parts, {chat_id: (delivered_count, error_or_None)}).
+    """
+    chat_ids = list(chat_ids or ALLOWED_CHAT_IDS)
+    st = os.stat(path)
+    parts = plan_upload_parts(st.st_size)
+    state = _load_upload_state(path, st, BACKUP_UPLOAD_PART_BYTES)
+    filename = os.path.basename(path)
+    # Chats that still get nothing stay listed, so their pending upload is remembered
+    for chat_id in chat_ids:
+        state["delivered"].setdefault(str(chat_id), [])
+
+    results = {}
+    if chat_ids:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(chat_ids), 8)) as pool:
+            futures = {pool.submit(_upload_to_chat, chat_id, path, parts, state, filename): chat_id for chat_id in chat_ids}
+            for future, chat_id in futures.items():
+                try:
+                    error = future.result()
+                except Exception as e:
+                    error = str(e)
+                results[chat_id] = (len(state["delivered"].get(str(chat_id), [])), error)
+
+    # Another chat (e.g. one /upload did not target) may still be mid-upload
+    if all(len(set(done)) >= len(parts) for done in state["delivered"].values()):
+        try:
+            os.remove(_upload_state_path(path))
+        except OSError:
+            pass
+    return parts, results
+
+def format_upload_summary(filename, parts, results):
+    if not results:
+        return "⚠️ Upload skipped: no chats to send to."
+    failed = {chat_id: result for chat_id, result in results.items() if result[1]}
+    split_note = f" in `{len(parts)}` parts" if len(parts) > 1 else ""
+    if not failed:
+        return f"📤 Uploaded `{escape_markdown(filename)}`{split_note} to `{len(results)}` chat(s)."
+    lines = [f"⚠️ Upload of `{escape_markdown(filename)}`{split_note} incomplete:"]
+    for chat_id, (sent, error) in failed.items():
+        lines.append(f"• `{chat_id}`: {sent}/{len(parts)} part(s) sent - {escape_markdown(error[:100])}")
+    lines.append("_Use /upload to resume._")
+    return "\n".join(lines)
+
+def find_latest_backup_file(since=0):
+    """Newest backup file in BACKUP_DIR written at or after `since`, or None."""
+    for _name, path, mtime, _size in scan_backup_entries(BACKUP_DIR):
+        if mtime >= since:
+            return path
+        break
+    return None
+
+def upload_latest_backup(chat_ids=None, since=0):
+    """Returns a Markdown summary line for the upload of the newest backup file."""
+    if BACKUP_ENGINE == "builtin":
+        return "ℹ️ Upload skipped: the builtin engine keeps snapshots, not files."
+    path = find_latest_backup_file(since)
+    if path is None:
+        return "⚠️ Upload skipped: no new backup file found in `BACKUP_DIR`."
+    try:
+        parts, results = upload_backup_file(path, chat_ids)
+    except OSError as e:
+        return f"❌ Upload failed: {escape_markdown(e)}"
+    return format_upload_summary(os.path.basename(path), parts, results)
+
 def get_whitelist_state():
     try:
         with open(PROPERTIES_FILE, "r") as f:
@@ -229,24 +2422,184 @@ def get_whitelist_state():
         return None
     return False
 
-def get_server_stats():
+# Resource sampling: read the container's cgroup v2 files directly (the path
+# is resolved once via inspect) and derive CPU% from our own previous sample.
+# `docker stats --no-stream` blocks ~2s collecting two samples per call.
+resource_lock = threading.Lock()
+cgroup_state = {"path": None, "checked": 0}
+resource_last = {"ts": None, "cpu_usec": None, "source": None}
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over the Docker Engine unix socket."""
+
+    def __init__(self, socket_path, timeout=5):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def find_container_cgroup(container_id, pid, root=None):
+    """Returns the container's cgroup v2 directory, or None."""
+    root = root or CGROUP_ROOT
+    candidates = []
     try:
-        # Get RAM/CPU usage
-        stats = subprocess.check_output(
-            ["docker", "stats", CONTAINER_NAME, "--no-stream", "--format", "{{.MemUsage}} / {{.CPUPerc}}"],
-            timeout=5
-        ).strip().decode()
-        return stats
-    except (subprocess.SubprocessError, OSError):
+        with open(f"/proc/{pid}/cgroup", "r") as f:
+            for line in f:
+                hierarchy, _, path = line.strip().partition("::")
+                # "0::/path" is the unified (v2) hierarchy
+                if hierarchy == "0" and path:
+                    candidates.append(os.path.join(root, path.lstrip("/")))
+    except OSError:
+        pass
+    # Usual layouts for the systemd and cgroupfs drivers
+    candidates.append(os.path.join(root, "system.slice", f"docker-{container_id}.scope"))
+    candidates.append(os.path.join(root, "docker", container_id))
+    for candidate in candidates:
+        if os.path.exists(os.path.join(candidate, "memory.current")):
+            return candidate
+    return None
+
+def resolve_container_cgroup(now):
+    # Not every call: an unreadable cgroup would otherwise cost an inspect per sample
+    if now - cgroup_state["checked"] < 60:
+        return cgroup_state["path"]
+    cgroup_state["checked"] = now
+    try:
+        container_id, pid = docker_output(["inspect", "-f", "{{.Id}} {{.State.Pid}}", CONTAINER_NAME], "inspect").split()
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return None
+    cgroup_state["path"] = find_container_cgroup(container_id, pid) if pid != "0" else None
+    return cgroup_state["path"]
+
+def _read_host_memory():
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+def read_cgroup_sample(path):
+    """Reads memory, CPU and IO counters from a cgroup v2 directory."""
+    def read_text(name):
+        with open(os.path.join(path, name), "r") as f:
+            return f.read()
+
+    def read_keyed(name):
+        values = {}
+        for line in read_text(name).splitlines():
+            key, _, value = line.partition(" ")
+            if value.strip().isdigit():
+                values[key] = int(value)
+        return values
+
+    memory = int(read_text("memory.current"))
+    raw_limit = read_text("memory.max").strip()
+    limit = _read_host_memory() if raw_limit == "max" else int(raw_limit)
+    # Match docker stats: page cache that can be reclaimed is not "used"
+    memory -= read_keyed("memory.stat").get("inactive_file", 0)
+
+    io_read = io_write = 0
+    try:
+        for line in read_text("io.stat").splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                if key == "rbytes":
+                    io_read += int(value)
+                elif key == "wbytes":
+                    io_write += int(value)
+    except OSError:
+        pass
+    return {
+        "mem_bytes": max(memory, 0),
+        "mem_limit": limit,
+        "cpu_usec": read_keyed("cpu.stat")["usage_usec"],
+        "io_read": io_read,
+        "io_write": io_write,
+    }
+
+def read_docker_api_sample():
+    """Fallback: one-shot stats from the Docker Engine API (no 2-sample wait)."""
+    conn = UnixHTTPConnection(DOCKER_SOCKET)
+    try:
+        conn.request("GET", f"/containers/{urllib.parse.quote(CONTAINER_NAME)}/stats?stream=false&one-shot=true")
+        resp = conn.getresponse()
+        body = resp.read()
+    finally:
+        conn.close()
+    if resp.status != 200:
+        raise OSError(f"Docker API returned {resp.status}")
+    stats = json.loads(body)
+    memory = stats.get("memory_stats") or {}
+    if not memory.get("usage"):
+        raise ValueError("container not running")
+    io = {"read": 0, "write": 0}
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = entry.get("op", "").lower()
+        if op in io:
+            io[op] += entry.get("value", 0)
+    return {
+        "mem_bytes": memory["usage"] - memory.get("stats", {}).get("inactive_file", 0),
+        "mem_limit": memory.get("limit"),
+        "cpu_usec": stats["cpu_stats"]["cpu_usage"]["total_usage"] // 1000,
+        "io_read": io["read"],
+        "io_write": io["write"],
+    }
+
+def sample_container_resources(now=None):
+    """Returns current container usage, or None if it can't be read.
+
+    cpu_percent is relative to one core (like docker stats) and is None on
+    the first sample, since it needs a previous one to diff against.
+    """
+    now = now or time.monotonic()
+    with resource_lock:
+        sample = None
+        source = "cgroup"
+        path = cgroup_state["path"] or resolve_container_cgroup(now)
+        if path:
+            try:
+                sample = read_cgroup_sample(path)
+            except (OSError, ValueError, KeyError):
+                # Container recreated or stopped: resolve again next time
+                cgroup_state.update(path=None, checked=0)
+        if sample is None:
+            source = "docker-api"
+            try:
+                sample = read_docker_api_sample()
+            except (OSError, ValueError, KeyError, http.client.HTTPException):
+                resource_last.update(ts=None, cpu_usec=None, source=None)
+                return None
+
+        cpu_percent = None
+        if (resource_last["source"] == source and resource_last["cpu_usec"] is not None
+                and sample["cpu_usec"] >= resource_last["cpu_usec"] and now > resource_last["ts"]):
+            cpu_percent = (sample["cpu_usec"] - resource_last["cpu_usec"]) / ((now - resource_last["ts"]) * 1e6) * 100
+        resource_last.update(ts=now, cpu_usec=sample["cpu_usec"], source=source)
+
+    sample["cpu_percent"] = cpu_percent
+    sample["mem_percent"] = sample["mem_bytes"] / sample["mem_limit"] * 100 if sample["mem_limit"] else None
+    sample["source"] = source
+    return sample
+
+def get_server_stats():
+    sample = sample_container_resources()
+    if sample is None:
         return "OFFLINE"
+    if sample["cpu_percent"] is None:
+        # First reading: take a second one shortly after to get a CPU delta
+        time.sleep(0.25)
+        sample = sample_container_resources() or sample
+    cpu = f"{sample['cpu_percent']:.1f}%" if sample["cpu_percent"] is not None else "?"
+    limit = format_bytes(sample["mem_limit"]) if sample["mem_limit"] else "?"
+    return f"{format_bytes(sample['mem_bytes'])} / {limit} / {cpu}"
 
 def get_server_status():
     try:
         # Check container status
-        box_status = subprocess.check_output(
-            ["docker", "inspect", "-f", "{{.State.Status}}", CONTAINER_NAME],
-            timeout=5
-        ).strip().decode()
+        box_status = docker_output(["inspect", "-f", "{{.State.Status}}", CONTAINER_NAME], "inspect")
     except (subprocess.SubprocessError, OSError):
         return "🔴 *Server is DOWN* (Container not found)"
 
@@ -261,14 +2614,12 @@ def get_server_status():
     # Stats
     res_usage = get_server_stats()
 
-    # Check player count via RCON
-    list_out = rcon_command("list")
+    # Player count from the presence index (one `list` query if not synced yet)
+    players = get_online_players_list()
     player_text = "Checking..."
-    match = re.search(r"There are (\d+) of a max of (\d+) players online", list_out)
-    if match:
-        count = match.group(1)
-        max_p = match.group(2)
-        player_text = f"`{count}/{max_p}`"
+    max_p = presence_state["max_players"] or read_property("max-players")
+    if presence_state["synced"]:
+        player_text = f"`{len(players)}/{max_p}`"
 
     status_msg = (
         f"🌍 *Server Status:*\n"
@@ -278,6 +2629,9 @@ def get_server_status():
         f"👥 Players: {player_text}\n"
         f"📊 Usage: `{res_usage}`\n"
     )
+    for extra in (format_tick_status(), format_jvm_status(), format_health_status()):
+        if extra:
+            status_msg += f"{extra}\n"
     return status_msg
 
 def strip_ansi(text):
@@ -337,87 +2691,571 @@ def parse_blocked_whitelist_line(line):
 
     return match.group(1)
 
-def get_online_players_list():
-    raw = rcon_command("list")
-    # Clean raw output first
+def parse_leave_line(line):
+    """Extracts player name from a leave/kick/disconnect log line."""
+    if "left the game" not in line and "lost connection: " not in line:
+        return None
+
+    match = LEAVE_LINE_RE.search(line)
+    if not match:
+        return None
+
+    return match.group(1)
+
+def parse_player_list_output(raw):
+    """Parses `list` output into player names, or None if it is not a player list."""
     clean_raw = strip_ansi(raw)
-    
-    if ":" in clean_raw:
-        parts = clean_raw.split(":", 1)
-        names = parts[1].strip()
-        if not names:
-            return []
-        # Filter out empty strings and clean whitespace
-        return [n.strip() for n in names.split(",") if n.strip()]
-    return []
-
-def get_online_players_msg():
-    players = get_online_players_list()
-    if not players:
-        return "👥 *Online Players:*\n_No players online._", None
-    
-    msg = f"👥 *Online Players ({len(players)}):*\nSelect a player to manage:"
-    
-    # Build keyboard
-    keyboard = {"inline_keyboard": []}
+    if "players online" not in clean_raw or ":" not in clean_raw:
+        return None
+
+    names = clean_raw.split(":", 1)[1].strip()
+    # Filter out empty strings and clean whitespace
+    return [n.strip() for n in names.split(",") if n.strip()]
+
+# Live presence index: player name -> session start (epoch seconds), fed by
+# join/leave log events and reconciled against `list` every PRESENCE_RECONCILE_SECONDS.
+presence_lock = threading.Lock()
+presence_sessions = {}
+presence_state = {"synced": False, "max_players": None}
+
+def record_player_join(player, now=None):
+    with presence_lock:
+        presence_sessions.setdefault(player, now if now is not None else time.time())
+
+def record_player_leave(player, now=None):
+    """Removes a player from the presence index. Returns the session length in seconds, or None."""
+    with presence_lock:
+        started = presence_sessions.pop(player, None)
+    if started is None:
+        return None
+    return max((now if now is not None else time.time()) - started, 0)
+
+def reconcile_presence(players, max_players=None, now=None):
+    """Replaces the presence index with an authoritative player list, keeping known session starts."""
+    now = now if now is not None else time.time()
+    with presence_lock:
+        current = {p: presence_sessions.get(p, now) for p in players}
+        presence_sessions.clear()
+        presence_sessions.update(current)
+        presence_state["synced"] = True
+        if max_players is not None:
+            presence_state["max_players"] = max_players
+
+def clear_presence():
+    """Marks the index as stale so the next read goes back to RCON."""
+    with presence_lock:
+        presence_sessions.clear()
+        presence_state["synced"] = False
+
+def get_player_session_seconds(player, now=None):
+    with presence_lock:
+        started = presence_sessions.get(player)
+    if started is None:
+        return None
+    return max((now if now is not None else time.time()) - started, 0)
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m"
+    return f"{secs}s"
+
+def sync_presence_from_rcon():
+    """Runs a single `list` query and reconciles the presence index. Returns the names or None."""
+    raw = rcon_command("list")
+    players = parse_player_list_output(raw)
+    if players is None:
+        return None
+
+    match = PLAYER_COUNT_RE.search(strip_ansi(raw))
+    max_players = int(match.group(2)) if match else None
+    reconcile_presence(players, max_players)
+    return players
+
+def get_online_players_list():
+    with presence_lock:
+        if presence_state["synced"]:
+            # Longest sessions first
+            return sorted(presence_sessions, key=presence_sessions.get)
+
+    players = sync_presence_from_rcon()
+    return players if players is not None else []
+
+def check_presence():
+    try:
+        state = docker_output(["inspect", "-f", "{{.State.Running}}", CONTAINER_NAME], "inspect")
+        if state == "true":
+            sync_presence_from_rcon()
+        else:
+            clear_presence()
+    except (subprocess.SubprocessError, OSError):
+        clear_presence()
+
+# Short callback tokens for player buttons. Telegram limits callback_data to
+# 64 bytes, so buttons carry "~<base36 id>" and the name stays server-side.
+PLAYER_TOKEN_LIMIT = 5000
+PLAYERS_PER_PAGE = 20
+player_token_lock = threading.Lock()
+player_tokens = {}
+token_players = {}
+# The random epoch makes buttons left in chat by an earlier bot process miss
+# the table (and report as expired) instead of hitting a reused id.
+player_token_state = {"next": 0, "epoch": format(random.getrandbits(24), "x")}
+
+def get_player_token(player):
+    with player_token_lock:
+        token = player_tokens.get(player)
+        if token is None:
+            while len(player_tokens) >= PLAYER_TOKEN_LIMIT:
+                # Drop the oldest; ids are never reused, so its buttons report as expired
+                oldest = next(iter(player_tokens))
+                token_players.pop(player_tokens.pop(oldest), None)
+            token = f"~{player_token_state['epoch']}.{to_base36(player_token_state['next'])}"
+            player_token_state["next"] += 1
+            player_tokens[player] = token
+            token_players[token] = player
+        return token
+
+def resolve_player_token(token):
+    """Maps a callback token back to a player name. Bare names from older buttons pass through."""
+    if not token.startswith("~"):
+        return token
+    with player_token_lock:
+        return token_players.get(token)
+
+def to_base36(number):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        number, rem = divmod(number, 36)
+        out = digits[rem] + out
+        if number == 0:
+            return out
+
+def build_player_buttons(players):
+    rows = []
     row = []
     for p in players:
-        row.append({"text": f"👤 {escape_markdown(p)}", "callback_data": f"manage:{p}"})
+        row.append({"text": f"👤 {escape_markdown(p)}", "callback_data": f"manage:{get_player_token(p)}"})
         if len(row) == 2:
-           keyboard["inline_keyboard"].append(row)
-           row = []
+            rows.append(row)
+            row = []
     if row:
-        keyboard["inline_keyboard"].append(row)
-        
-    keyboard["inline_keyboard"].append([{"text": "🔄 Refresh", "callback_data": "online"}])
+        rows.append(row)
+    return rows
+
+def get_online_players_msg(page=0):
+    players = get_online_players_list()
+    if not players:
+        return "👥 *Online Players:*\n_No players online._", None
+
+    pages = (len(players) + PLAYERS_PER_PAGE - 1) // PLAYERS_PER_PAGE
+    page = min(max(page, 0), pages - 1)
+    page_players = players[page * PLAYERS_PER_PAGE:(page + 1) * PLAYERS_PER_PAGE]
+
+    msg = f"👥 *Online Players ({len(players)}):*\nSelect a player to manage:"
+
+    # Build keyboard for the current page only
+    keyboard = {"inline_keyboard": build_player_buttons(page_players)}
+    if pages > 1:
+        keyboard["inline_keyboard"].append([
+            {"text": "◀️ Prev", "callback_data": f"online:{(page - 1) % pages}"},
+            {"text": f"{page + 1}/{pages}", "callback_data": "ignore"},
+            {"text": "Next ▶️", "callback_data": f"online:{(page + 1) % pages}"}
+        ])
+
+    keyboard["inline_keyboard"].append([
+        {"text": "🔍 Search", "callback_data": "player_search"},
+        {"text": "🔄 Refresh", "callback_data": f"online:{page}"}
+    ])
     return msg, keyboard
 
+def get_player_search_msg(prefix):
+    """Finds known and online players whose name starts with `prefix`."""
+    lowered = prefix.lower()
+    online = [p for p in get_online_players_list() if p.lower().startswith(lowered)]
+    online_set = set(online)
+    known = [p for p in search_player_names(prefix, limit=PLAYERS_PER_PAGE) if p not in online_set]
+    matches = (online + known)[:PLAYERS_PER_PAGE]
+
+    safe_prefix = escape_markdown(prefix)
+    if not matches:
+        return f"🔍 No players matching `{safe_prefix}`.", None
+
+    msg = f"🔍 *Players matching* `{safe_prefix}` ({len(matches)}):\n🟢 = online"
+    rows = build_player_buttons(matches)
+    for row in rows:
+        for button in row:
+            if resolve_player_token(button["callback_data"].split(":", 1)[1]) in online_set:
+                button["text"] = "🟢 " + button["text"]
+    rows.append([{"text": "🔙 Back to Players", "callback_data": "online"}])
+    return msg, {"inline_keyboard": rows}
+
 def get_player_action_keyboard(player, viewer_id):
+    flags = get_player_flags(player)
+    token = get_player_token(player)
     keyboard = {
         "inline_keyboard": [
             [
-                {"text": "🎮 Survival", "callback_data": f"gm:survival:{player}"},
-                {"text": "🎮 Creative", "callback_data": f"gm:creative:{player}"},
-                {"text": "👻 Spectator", "callback_data": f"gm:spectator:{player}"}
+                {"text": f"👑 OP: {'🟢' if flags['ops'] else '🔴'}", "callback_data": "ignore"},
+                {"text": f"🔨 Banned: {'🟢' if flags['banned'] else '🔴'}", "callback_data": "ignore"},
+                {"text": f"📜 WL: {'🟢' if flags['whitelist'] else '🔴'}", "callback_data": "ignore"}
+            ],
+            [
+                {"text": "🎮 Survival", "callback_data": f"gm:survival:{token}"},
+                {"text": "🎮 Creative", "callback_data": f"gm:creative:{token}"},
+                {"text": "👻 Spectator", "callback_data": f"gm:spectator:{token}"}
             ]
         ]
     }
     
     # Owner Only buttons are visible to all but restricted in callback
     keyboard["inline_keyboard"].append([
-        {"text": "⚡ Give OP", "callback_data": f"op:{player}"},
-        {"text": "🔻 Remove OP", "callback_data": f"deop:{player}"}
+        {"text": "⚡ Give OP", "callback_data": f"op:{token}"},
+        {"text": "🔻 Remove OP", "callback_data": f"deop:{token}"}
     ])
         
     keyboard["inline_keyboard"].append([
-        {"text": "🔨 Ban", "callback_data": f"ban:{player}"},
-        {"text": "🔓 Unban", "callback_data": f"unban:{player}"}
+        {"text": "🔨 Ban", "callback_data": f"ban:{token}"},
+        {"text": "🔓 Unban", "callback_data": f"unban:{token}"}
     ])
     keyboard["inline_keyboard"].append([
-         {"text": "🥾 Kick", "callback_data": f"kick:{player}"}
+         {"text": "🥾 Kick", "callback_data": f"kick:{token}"}
     ])
     keyboard["inline_keyboard"].append([
         {"text": "🔙 Back to Players", "callback_data": "online"}
     ])
     return keyboard
 
+# Player identity index built from the server's JSON files. Each file is
+# re-read only when its mtime changes; lookups are plain dict hits.
+PLAYER_INDEX_FILES = {
+    "usercache": "usercache.json",
+    "whitelist": "whitelist.json",
+    "ops": "ops.json",
+    "banned": "banned-players.json",
+}
+player_index_lock = threading.Lock()
+player_index = {
+    "mtimes": {},
+    "entries": {key: [] for key in PLAYER_INDEX_FILES},
+    "by_uuid": {},
+    "by_name": {},
+    "by_prefix": {},
+    "uuids": {key: set() for key in PLAYER_INDEX_FILES},
+}
+
+def _load_player_entries(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if not isinstance(data, list):
+        return []
+    return [e for e in data if isinstance(e, dict) and e.get("name") and e.get("uuid")]
+
+def _rebuild_player_maps():
+    by_uuid = {}
+    by_name = {}
+    uuids = {}
+    # usercache first so the curated lists win on name changes
+    for key in PLAYER_INDEX_FILES:
+        uuids[key] = set()
+        for entry in player_index["entries"][key]:
+            by_uuid[entry["uuid"]] = entry["name"]
+            uuids[key].add(entry["uuid"])
+
+    for uuid, name in by_uuid.items():
+        by_name[name.lower()] = (name, uuid)
+
+    by_prefix = {}
+    for lowered, (name, _uuid) in sorted(by_name.items()):
+        for i in range(1, len(lowered) + 1):
+            by_prefix.setdefault(lowered[:i], []).append(name)
+
+    player_index["by_uuid"] = by_uuid
+    player_index["by_name"] = by_name
+    player_index["by_prefix"] = by_prefix
+    player_index["uuids"] = uuids
+
+def refresh_player_index():
+    """Reloads changed JSON files from the data dir. Returns True if anything changed."""
+    data_dir = os.path.dirname(PROPERTIES_FILE)
+    with player_index_lock:
+        changed = False
+        for key, filename in PLAYER_INDEX_FILES.items():
+            path = os.path.join(data_dir, filename)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if key in player_index["mtimes"] and player_index["mtimes"][key] == (path, mtime):
+                continue
+            player_index["mtimes"][key] = (path, mtime)
+            player_index["entries"][key] = _load_player_entries(path) if mtime is not None else []
+            changed = True
+
+        if changed:
+            _rebuild_player_maps()
+        return changed
+
+def lookup_player_name(uuid):
+    refresh_player_index()
+    return player_index["by_uuid"].get(uuid)
+
+def lookup_player_uuid(name):
+    refresh_player_index()
+    found = player_index["by_name"].get(name.lower())
+    return found[1] if found else None
+
+def search_player_names(prefix, limit=20):
+    """Returns known player names starting with `prefix` (case-insensitive)."""
+    refresh_player_index()
+    return player_index["by_prefix"].get(prefix.lower(), [])[:limit]
+
+def get_player_flags(name):
+    """Returns {"ops", "banned", "whitelist"} booleans for a player name."""
+    refresh_player_index()
+    found = player_index["by_name"].get(name.lower())
+    uuid = found[1] if found else None
+    uuids = player_index["uuids"]
+    return {key: uuid is not None and uuid in uuids[key] for key in ("ops", "banned", "whitelist")}
+
+def get_whitelisted_names():
+    """Returns whitelisted names from whitelist.json, or None if the file is unavailable."""
+    refresh_player_index()
+    if player_index["mtimes"]["whitelist"][1] is None:
+        return None
+    return sorted((e["name"] for e in player_index["entries"]["whitelist"]), key=str.lower)
+
 def get_whitelist():
-    raw = rcon_command("whitelist list")
-    clean_raw = strip_ansi(raw)
-    if ":" in clean_raw:
-        names = clean_raw.split(":", 1)[1].strip()
-        if not names:
-             return "📭 *Whitelist is empty.*\nUse `/add <name>` to add players."
-        formatted_names = ", ".join([f"`{escape_markdown(n.strip())}`" for n in names.split(",") if n.strip()])
-        return f"📜 *Whitelisted Players:*\n{formatted_names}"
-    return raw
+    names = get_whitelisted_names()
+    if names is None:
+        # No data mount: fall back to asking the server
+        raw = rcon_command("whitelist list")
+        clean_raw = strip_ansi(raw)
+        if ":" not in clean_raw:
+            return raw
+        names = [n.strip() for n in clean_raw.split(":", 1)[1].split(",") if n.strip()]
+
+    if not names:
+        return "📭 *Whitelist is empty.*\nUse `/add <name>` to add players."
+    formatted_names = ", ".join([f"`{escape_markdown(n)}`" for n in names])
+    return f"📜 *Whitelisted Players ({len(names)}):*\n{formatted_names}"
+
+def parse_player_names(text, csv_mode=False):
+    """Splits names from a command or an uploaded file. CSV mode keeps the first column per line."""
+    if csv_mode:
+        candidates = [line.split(",", 1)[0].split(";", 1)[0] for line in text.splitlines()]
+    else:
+        candidates = PLAYER_NAME_SPLIT_RE.split(text)
+
+    names = []
+    seen = set()
+    for candidate in candidates:
+        name = candidate.strip().strip('"\'')
+        if not name or name.lower() in ("name", "names", "username", "player") or name.lower() in seen:
+            continue
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
+def is_container_running():
+    try:
+        state = docker_output(["inspect", "-f", "{{.State.Running}}", CONTAINER_NAME], "inspect")
+    except (subprocess.SubprocessError, OSError):
+        return False
+    return state == "true"
+
+def offline_player_uuid(name):
+    """UUID the server assigns in offline mode (Java's nameUUIDFromBytes)."""
+    digest = bytearray(hashlib.md5(f"OfflinePlayer:{name}".encode()).digest())
+    digest[6] = (digest[6] & 0x0F) | 0x30
+    digest[8] = (digest[8] & 0x3F) | 0x80
+    return str(uuid_lib.UUID(bytes=bytes(digest)))
+
+def resolve_player_uuids(names):
+    """Returns {lowercase name: (name, uuid)} using the local index, then Mojang for the rest."""
+    resolved = {}
+    missing = []
+    for name in names:
+        uuid = lookup_player_uuid(name)
+        if uuid:
+            resolved[name.lower()] = (name, uuid)
+        else:
+            missing.append(name)
+
+    if read_property("online-mode") == "false":
+        for name in missing:
+            resolved[name.lower()] = (name, offline_player_uuid(name))
+        return resolved
+
+    # Mojang's bulk endpoint takes up to 10 names per request
+    for i in range(0, len(missing), 10):
+        try:
+            resp = requests.post(MOJANG_BULK_LOOKUP_URL, json=missing[i:i + 10], timeout=10)
+            profiles = resp.json() if resp.status_code == 200 else []
+        except Exception as e:
+            print(f"Mojang lookup error: {e}")
+            continue
+        for profile in profiles:
+            raw_id = profile.get("id", "")
+            if len(raw_id) == 32:
+                resolved[profile["name"].lower()] = (profile["name"], str(uuid_lib.UUID(raw_id)))
+    return resolved
+
+def write_whitelist_file(action, names):
+    """Edits whitelist.json directly (server offline). Returns {name: (status, detail)}."""
+    path = os.path.join(os.path.dirname(PROPERTIES_FILE), "whitelist.json")
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        entries = []
+    except (OSError, ValueError) as e:
+        return {name: ("error", f"cannot read whitelist.json: {e}") for name in names}
+
+    by_name = {e.get("name", "").lower(): e for e in entries if isinstance(e, dict)}
+    results = {}
+    if action == "add":
+        lookups = resolve_player_uuids([n for n in names if n.lower() not in by_name])
+        for name in names:
+            if name.lower() in by_name:
+                results[name] = ("skipped", "already whitelisted")
+            elif name.lower() in lookups:
+                real_name, uuid = lookups[name.lower()]
+                entry = {"uuid": uuid, "name": real_name}
+                entries.append(entry)
+                by_name[name.lower()] = entry
+                results[name] = ("ok", "added")
+            else:
+                results[name] = ("error", "player not found")
+    else:
+        for name in names:
+            if name.lower() in by_name:
+                entries.remove(by_name.pop(name.lower()))
+                results[name] = ("ok", "removed")
+            else:
+                results[name] = ("skipped", "not whitelisted")
+
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        return {name: ("error", f"cannot write whitelist.json: {e}") for name in names}
+    return results
+
+def classify_whitelist_output(output):
+    if not output.strip():
+        # Vanilla always answers whitelist commands; silence is not a confirmation
+        return "error", "no response"
+    lowered = output.lower()
+    if "error" in lowered or "timeout" in lowered:
+        return "error", output
+    if "already" in lowered or "not whitelisted" in lowered or "isn't whitelisted" in lowered:
+        return "skipped", output
+    if "does not exist" in lowered or "unknown" in lowered or "not found" in lowered:
+        return "error", output
+    return "ok", output
+
+def apply_whitelist_batch(action, names):
+    """Adds or removes many names with one RCON spawn and a single reload.
+
+    Falls back to editing whitelist.json when the server is offline and
+    WHITELIST_OFFLINE_WRITE is enabled. Returns [(name, status, detail)].
+    """
+    results = {}
+    valid = []
+    for name in names:
+        if PLAYER_NAME_RE.match(name):
+            valid.append(name)
+        else:
+            results[name] = ("error", "invalid name")
+
+    if valid:
+        if is_container_running():
+            commands = [f"whitelist {action} {name}" for name in valid] + ["whitelist reload"]
+            outputs = rcon_batch(commands)
+            for name, output in zip(valid, outputs):
+                results[name] = classify_whitelist_output(output)
+        elif WHITELIST_OFFLINE_WRITE:
+            results.update(write_whitelist_file(action, valid))
+        else:
+            for name in valid:
+                results[name] = ("error", "server offline")
+
+    return [(name,) + results[name] for name in names]
+
+def format_whitelist_batch_summary(action, results):
+    icons = {"ok": "✅", "skipped": "⚠️", "error": "❌"}
+    ok_count = sum(1 for _, status, _ in results if status == "ok")
+    title = "Whitelist Add" if action == "add" else "Whitelist Remove"
+    lines = [f"📜 *{title}:* `{ok_count}/{len(results)}` applied"]
+    for name, status, detail in results[:50]:
+        lines.append(f"{icons[status]} `{escape_markdown(name)}` - {escape_markdown(detail)}")
+    if len(results) > 50:
+        lines.append(f"_...and {len(results) - 50} more_")
+    return "\n".join(lines)
+
+def download_telegram_file(file_id, max_bytes=WHITELIST_UPLOAD_MAX_BYTES):
+    """Downloads a small document sent to the bot. Returns text or None."""
+    info = send_request("getFile", {"file_id": file_id})
+    if not info or not info.get("ok"):
+        return None
+    file_info = info["result"]
+    if file_info.get("file_size", 0) > max_bytes:
+        return None
+    try:
+        resp = requests.get(FILE_BASE_URL + file_info["file_path"], timeout=20)
+        return resp.content[:max_bytes].decode("utf-8", errors="replace")
+    except Exception as e:
+        print(f"Download error: {e}")
+        return None
+
+def handle_document(msg):
+    """Applies a whitelist batch from an uploaded .txt/.csv file. Caption `/remove` removes."""
+    chat_id = msg["chat"]["id"]
+    doc = msg["document"]
+    filename = doc.get("file_name", "").lower()
+    if not filename.endswith((".txt", ".csv")):
+        send_message(chat_id, "⚠️ Send a `.txt` or `.csv` file with one player name per line.")
+        return
+    if doc.get("file_size", 0) > WHITELIST_UPLOAD_MAX_BYTES:
+        send_message(chat_id, "⚠️ File too large (max 256 KB).")
+        return
+
+    content = download_telegram_file(doc["file_id"])
+    if content is None:
+        send_message(chat_id, "❌ Could not download the file.")
+        return
+
+    action = "remove" if msg.get("caption", "").strip().lower().startswith("/remove") else "add"
+    names = parse_player_names(content, csv_mode=filename.endswith(".csv"))
+    if not names:
+        send_message(chat_id, "📭 No player names found in the file.")
+        return
+
+    send_message(chat_id, f"⏳ *Processing {len(names)} name(s)...*")
+    results = apply_whitelist_batch(action, names)
+    send_message(chat_id, format_whitelist_batch_summary(action, results))
 
 def send_request(method, payload, timeout=10):
     url = BASE_URL + method
     try:
-        resp = requests.post(url, json=payload, timeout=timeout)
+        with metric_timer("minecraft_bot_telegram_seconds", method=method):
+            resp = requests.post(url, json=payload, timeout=timeout)
+        if resp.status_code == 429:
+            metric_inc("minecraft_bot_telegram_rate_limited_total", method=method)
         return resp.json()
     except Exception as e:
+        metric_inc("minecraft_bot_telegram_errors_total", method=method)
         print(f"Request error {method}: {e}")
         return None
 
@@ -594,18 +3432,22 @@ def get_properties_keyboard():
         ]
     }
 
+log_stream = {"process": None}
+
 def monitor_logs():
     print("Log monitor started...")
-    while True:
+    while not shutdown_event.is_set():
         try:
             # Check if container is running first
             try:
-                state = subprocess.check_output(["docker", "inspect", "-f", "{{.State.Running}}", CONTAINER_NAME], timeout=5).strip().decode()
+                state = docker_output(["inspect", "-f", "{{.State.Running}}", CONTAINER_NAME], "inspect")
                 if state != "true":
-                    time.sleep(10) # Sleep if stopped
+                    clear_presence()
+                    shutdown_event.wait(10) # Sleep if stopped
                     continue
             except (subprocess.SubprocessError, OSError):
-                time.sleep(10)
+                clear_presence()
+                shutdown_event.wait(10)
                 continue
 
             process = subprocess.Popen(
@@ -615,6 +3457,9 @@ def monitor_logs():
                 text=True,
                 bufsize=1
             )
+            log_stream["process"] = process
+            # Events may have been missed while the stream was down
+            sync_presence_from_rcon()
             
             while True:
                 line = process.stdout.readline()
@@ -622,13 +3467,35 @@ def monitor_logs():
                     break
                     
                 line = line.strip()
+                metric_inc("minecraft_bot_log_lines_total")
+                notify_log_waiters(line)
+
+                spike = parse_lag_spike_line(line)
+                if spike:
+                    record_lag_spike(*spike)
+                    alert = check_lag_spike_alert()
+                    if alert:
+                        broadcast_message(alert)
+                    continue
+
                 # Detect JOIN
                 player = parse_join_line(line)
                 if player:
+                    record_player_join(player)
+                    record_join_event(player)
                     safe_player = escape_markdown(player)
                     msg = f"🟢 *Player Joined!*\n👤 `{safe_player}`"
                     broadcast_message(msg)
 
+                # Detect LEAVE / KICK / DISCONNECT
+                player = parse_leave_line(line)
+                if player:
+                    session = record_player_leave(player)
+                    if session is not None:
+                        safe_player = escape_markdown(player)
+                        msg = f"🔴 *Player Left*\n👤 `{safe_player}` (session `{format_duration(session)}`)"
+                        broadcast_message(msg)
+
                 # Detect CHAT (Relay to Telegram)
                 chat_data = parse_chat_line(line)
                 if chat_mode_enabled and chat_data:
@@ -653,70 +3520,201 @@ def monitor_logs():
                     safe_player = escape_markdown(player)
                     kb = {
                         "inline_keyboard": [[
-                            {"text": f"✅ Add {safe_player}", "callback_data": f"quick_add:{player}"}
+                            {"text": f"✅ Add {safe_player}", "callback_data": f"quick_add:{get_player_token(player)}"}
                         ]]
                     }
                     msg = f"🚨 *Blocked Connection!*\n👤 `{safe_player}` tried to join."
                     broadcast_message(msg, kb)
+
+            # Leaves are no longer seen, so serve the player list from RCON again
+            clear_presence()
         except Exception as e:
             print(f"Monitor error: {e}")
+            clear_presence()
             time.sleep(5)
 
 def get_playtime_top():
     try:
-        stats_dir = "/data/world/stats/" # Updated relative to container path/mount usually
-        # But script runs on host. So it needs FULL HOST PATHS.
-        # User should configure this in ENV if path differs.
-        # For now, defaulting to standard path or env
+        # Script runs on the host, so stats live next to server.properties.
         stats_dir = os.path.dirname(PROPERTIES_FILE) + "/world/stats/"
-        usercache_file = os.path.dirname(PROPERTIES_FILE) + "/usercache.json"
-        
-        # Load usercache for UUID -> Name
-        uuid_map = {}
-        if os.path.exists(usercache_file):
-            with open(usercache_file, "r") as f:
-                data = json.load(f)
-                for entry in data:
-                    uuid_map[entry["uuid"]] = entry["name"]
-        
-        # Parse stats
+
         players = []
-        if os.path.exists(stats_dir):
-            for filename in os.listdir(stats_dir):
-                if filename.endswith(".json"):
-                    try:
-                        uuid = filename.replace(".json", "")
-                        with open(os.path.join(stats_dir, filename), "r") as f:
-                            stat_data = json.load(f)
-                            # Playtime is in ticks (20 ticks = 1 sec)
-                            ticks = stat_data.get("stats", {}).get("minecraft:custom", {}).get("minecraft:play_time", 0)
-                            if ticks > 0:
-                                name = uuid_map.get(uuid, uuid[:8])
-                                hours = ticks / 20 / 3600
-                                players.append((name, hours))
-                    except Exception:
-                        pass
-        
+        for uuid, ticks in read_stats_play_ticks(stats_dir).items():
+            # Playtime is in ticks (20 ticks = 1 sec)
+            if ticks > 0:
+                name = lookup_player_name(uuid) or uuid[:8]
+                players.append((name, ticks / 20 / 3600))
+
         # Sort and format
         return format_playtime_message(players)
     except Exception as e:
         return f"Error calculating stats: {e}"
 
-def format_playtime_message(players):
-    """Formats a list of (name, hours) tuples into a top 5 leaderboard string."""
-    # Sort by hours descending
-    players.sort(key=lambda x: x[1], reverse=True)
-    top_list = players[:5]
+def format_playtime_message(players, title="🏆 *Top Playtime:*"):
+    """Formats a list of (name, hours) tuples into a top 5 leaderboard string."""
+    # Sort by hours descending
+    players.sort(key=lambda x: x[1], reverse=True)
+    top_list = players[:5]
+
+    if not top_list:
+        return "No stats available."
+
+    msg_parts = [f"{title}\n"]
+    for i, (name, hours) in enumerate(top_list, 1):
+        safe_name = escape_markdown(name)
+        msg_parts.append(f"{i}. 👤 *{safe_name}:* `{hours:.1f} hours`\n")
+
+    return "".join(msg_parts)
+
+# Playtime history: hourly buckets of play_time deltas, compacted to daily buckets
+# once they are older than PLAYTIME_HOURLY_RETENTION_DAYS.
+HOUR_SECONDS = 3600
+DAY_SECONDS = 86400
+playtime_history_lock = threading.Lock()
+playtime_file_cache = {} # stats file path -> (mtime_ns, ticks)
+
+def _open_playtime_db(db_path=None):
+    conn = sqlite3.connect(db_path or PLAYTIME_HISTORY_DB, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS playtime_totals (uuid TEXT PRIMARY KEY, ticks INTEGER NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS playtime_deltas ("
+        "bucket INTEGER NOT NULL, uuid TEXT NOT NULL, ticks INTEGER NOT NULL, "
+        "PRIMARY KEY (bucket, uuid)) WITHOUT ROWID"
+    )
+    return conn
+
+def read_stats_play_ticks(stats_dir):
+    """Returns {uuid: play_time ticks}, re-parsing only stats files whose mtime changed."""
+    totals = {}
+    try:
+        entries = list(os.scandir(stats_dir))
+    except OSError:
+        return totals
+
+    for entry in entries:
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            mtime_ns = entry.stat().st_mtime_ns
+        except OSError:
+            continue
+
+        cached = playtime_file_cache.get(entry.path)
+        if cached and cached[0] == mtime_ns:
+            ticks = cached[1]
+        else:
+            try:
+                with open(entry.path, "r") as f:
+                    stat_data = json.load(f)
+                ticks = stat_data.get("stats", {}).get("minecraft:custom", {}).get("minecraft:play_time", 0)
+            except (OSError, ValueError, AttributeError):
+                continue
+            playtime_file_cache[entry.path] = (mtime_ns, ticks)
+
+        totals[entry.name[:-5]] = ticks
+    return totals
 
-    if not top_list:
-        return "No stats available."
+def record_playtime_sample(totals, now=None, db_path=None):
+    """Stores per-player deltas against the previous sample. Returns number of players with new playtime."""
+    now = int(now if now is not None else time.time())
+    bucket = now - now % HOUR_SECONDS
 
-    msg_parts = ["🏆 *Top Playtime:*\n"]
-    for i, (name, hours) in enumerate(top_list, 1):
-        safe_name = escape_markdown(name)
-        msg_parts.append(f"{i}. 👤 *{safe_name}:* `{hours:.1f} hours`\n")
+    with playtime_history_lock:
+        conn = _open_playtime_db(db_path)
+        try:
+            with conn:
+                previous = dict(conn.execute("SELECT uuid, ticks FROM playtime_totals"))
+                changed = 0
+                for uuid, ticks in totals.items():
+                    last = previous.get(uuid)
+                    if last == ticks:
+                        continue
+                    conn.execute(
+                        "INSERT OR REPLACE INTO playtime_totals (uuid, ticks) VALUES (?, ?)",
+                        (uuid, ticks),
+                    )
+                    # First sighting only sets the baseline; lifetime totals are not "this week".
+                    if last is None:
+                        continue
+                    # A counter that went backwards was reset, count it from zero.
+                    delta = ticks - last if ticks >= last else ticks
+                    if delta <= 0:
+                        continue
+                    conn.execute(
+                        "INSERT INTO playtime_deltas (bucket, uuid, ticks) VALUES (?, ?, ?) "
+                        "ON CONFLICT (bucket, uuid) DO UPDATE SET ticks = ticks + excluded.ticks",
+                        (bucket, uuid, delta),
+                    )
+                    changed += 1
+            return changed
+        finally:
+            conn.close()
+
+def compact_playtime_history(now=None, db_path=None):
+    """Folds hourly buckets older than the retention window into daily buckets."""
+    now = int(now if now is not None else time.time())
+    cutoff = now - PLAYTIME_HOURLY_RETENTION_DAYS * DAY_SECONDS
+    cutoff -= cutoff % DAY_SECONDS
+
+    with playtime_history_lock:
+        conn = _open_playtime_db(db_path)
+        try:
+            with conn:
+                rows = conn.execute(
+                    "SELECT bucket - bucket % ?, uuid, SUM(ticks) FROM playtime_deltas "
+                    "WHERE bucket < ? AND bucket % ? != 0 GROUP BY 1, 2",
+                    (DAY_SECONDS, cutoff, DAY_SECONDS),
+                ).fetchall()
+                if not rows:
+                    return 0
+                conn.execute(
+                    "DELETE FROM playtime_deltas WHERE bucket < ? AND bucket % ? != 0",
+                    (cutoff, DAY_SECONDS),
+                )
+                conn.executemany(
+                    "INSERT INTO playtime_deltas (bucket, uuid, ticks) VALUES (?, ?, ?) "
+                    "ON CONFLICT (bucket, uuid) DO UPDATE SET ticks = ticks + excluded.ticks",
+                    rows,
+                )
+            return len(rows)
+        finally:
+            conn.close()
+
+def query_playtime_since(since, limit=5, db_path=None):
+    """Returns [(uuid, ticks)] of the top players by playtime recorded since `since`."""
+    # Buckets are keyed by their start, so include the hour `since` falls in
+    since = int(since)
+    since -= since % HOUR_SECONDS
+    with playtime_history_lock:
+        conn = _open_playtime_db(db_path)
+        try:
+            return conn.execute(
+                "SELECT uuid, SUM(ticks) FROM playtime_deltas WHERE bucket >= ? "
+                "GROUP BY uuid ORDER BY 2 DESC LIMIT ?",
+                (since, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+
+def get_playtime_period_top(period):
+    """Formats the leaderboard for `day` (last 24h) or `week` (last 7 days)."""
+    window = DAY_SECONDS if period == "day" else 7 * DAY_SECONDS
+    label = "Today" if period == "day" else "This Week"
+    try:
+        rows = query_playtime_since(time.time() - window)
+    except sqlite3.Error as e:
+        return f"Error reading playtime history: {e}"
 
-    return "".join(msg_parts)
+    players = [(lookup_player_name(uuid) or uuid[:8], ticks / 20 / 3600) for uuid, ticks in rows]
+    return format_playtime_message(players, title=f"🏆 *Top Playtime ({label}):*")
+
+def sample_playtime_history():
+    totals = read_stats_play_ticks(os.path.dirname(PROPERTIES_FILE) + "/world/stats/")
+    if totals:
+        record_playtime_sample(totals)
+    compact_playtime_history()
 
 def handle_callback(cb):
     global chat_mode_enabled
@@ -845,13 +3843,24 @@ def handle_callback(cb):
         answer_callback(cb_id, "KeepInventory OFF 🔻")
         return
 
+    if data.startswith(PLAYER_CALLBACK_PREFIXES):
+        player = resolve_player_token(data.rsplit(":", 1)[1])
+        if player is None:
+            answer_callback(cb_id, "⌛ Button expired, refresh the list.")
+            return
+
     if data.startswith("quick_add:"):
-        player_name = data.split(":")[1]
-        safe_player_name = escape_markdown(player_name)
-        rcon_command(f"whitelist add {player_name}")
-        rcon_command("whitelist reload")
-        edit_message(chat_id, msg_id, f"✅ *Added {safe_player_name} to whitelist!*\nThey can join now.")
-        answer_callback(cb_id, f"Added {player_name}")
+        safe_player = escape_markdown(player)
+        _, status, detail = apply_whitelist_batch("add", [player])[0]
+        if status == "error":
+            edit_message(chat_id, msg_id, f"❌ *Could not add {safe_player}:* {escape_markdown(detail)}")
+            answer_callback(cb_id, f"❌ Could not add {player}: {detail}"[:200])
+        elif status == "skipped":
+            edit_message(chat_id, msg_id, f"⚠️ *{safe_player}:* {escape_markdown(detail)}")
+            answer_callback(cb_id, f"⚠️ {detail}"[:200])
+        else:
+            edit_message(chat_id, msg_id, f"✅ *Added {safe_player} to whitelist!*\nThey can join now.")
+            answer_callback(cb_id, f"Added {player}")
         return
 
     if data == "refresh":
@@ -903,6 +3912,20 @@ def handle_callback(cb):
         edit_message(chat_id, msg_id, status + "\n" + COMMANDS_HELP, get_main_keyboard())
         return
 
+    elif data == "idle_wake":
+        answer_callback(cb_id, "Waking server...")
+        msg = wake_server()
+        time.sleep(2)
+        edit_message(chat_id, msg_id, f"{msg}\n\n{get_server_status()}\n{COMMANDS_HELP}", get_main_keyboard())
+        return
+
+    elif data == "idle_keep":
+        with idle_lock:
+            idle_state.update(empty_since=time.time(), warned=False)
+        answer_callback(cb_id, "Idle timer reset")
+        edit_message(chat_id, msg_id, f"⏳ *Idle timer reset.* Next check in `{IDLE_STOP_MINUTES}` min.")
+        return
+
     elif data == "cancel_stop":
         status = get_server_status()
         edit_message(chat_id, msg_id, status + "\n" + COMMANDS_HELP, get_main_keyboard())
@@ -910,15 +3933,51 @@ def handle_callback(cb):
         return
 
     elif data == "trigger_backup":
-        edit_message(chat_id, msg_id, "⏳ *Starting Backup...*", get_main_keyboard())
-        answer_callback(cb_id, "Backup started!")
+        if BACKUP_ENGINE == "script" and not os.path.exists(BACKUP_SCRIPT):
+            answer_callback(cb_id, "Backup script not found")
+            edit_message(chat_id, msg_id, f"❌ Backup script not found.\n\n{get_server_status()}\n\n{COMMANDS_HELP}", get_main_keyboard())
+            return
+        job, started = start_backup_job("manual", watcher=(chat_id, msg_id))
+        answer_callback(cb_id, "Backup started!" if started else "Backup already running, following it")
+        edit_message(chat_id, msg_id, format_backup_progress(job), get_backup_cancel_keyboard())
+        return
+
+    elif data == "backup_status":
+        job = backup_jobs["current"]
+        if job is None:
+            answer_callback(cb_id, "No backup running")
+            edit_message(chat_id, msg_id, format_backup_history(), get_main_keyboard())
+            return
+        answer_callback(cb_id, "Refreshed")
+        edit_message(chat_id, msg_id, format_backup_progress(job), get_backup_cancel_keyboard())
+        return
+
+    elif data == "backup_cancel":
+        answer_callback(cb_id, "Cancelling backup..." if cancel_backup_job() else "No backup running")
+        return
+
+    elif data.startswith("graph:"):
+        name = data.split(":", 1)[1]
+        if name not in RESOURCE_SERIES_ALIASES:
+            answer_callback(cb_id, "Unknown chart")
+            return
+        answer_callback(cb_id, "Drawing chart...")
+        png, caption = get_resource_chart(RESOURCE_SERIES_ALIASES[name], 6)
+        if png is None:
+            send_message(chat_id, caption)
+        else:
+            send_photo(chat_id, png, caption)
+        return
 
-        msg = run_backup()
-        edit_message(chat_id, msg_id, f"{msg}\n\n{get_server_status()}\n\n{COMMANDS_HELP}", get_main_keyboard())
+    elif data.startswith("census:"):
+        answer_callback(cb_id, "Counting entities...")
+        census, previous = get_entity_census(by_player=data == "census:players", force=data == "census:refresh")
+        edit_message(chat_id, msg_id, format_entity_census(census, previous), get_census_keyboard())
         return
         
-    elif data == "online":
-        msg, kb = get_online_players_msg()
+    elif data == "online" or data.startswith("online:"):
+        page = data.split(":")[1] if ":" in data else "0"
+        msg, kb = get_online_players_msg(int(page) if page.isdigit() else 0)
         if kb:
             try:
                 edit_message(chat_id, msg_id, msg, kb)
@@ -930,13 +3989,14 @@ def handle_callback(cb):
 
     # Player Management Handlers
     if data.startswith("manage:"):
-        player = data.split(":")[1]
         safe_player = escape_markdown(player)
-        edit_message(chat_id, msg_id, f"👤 Managing *{safe_player}*:", get_player_action_keyboard(player, chat_id))
+        session = get_player_session_seconds(player)
+        session_text = f"\n🕒 Session: `{format_duration(session)}`" if session is not None else ""
+        edit_message(chat_id, msg_id, f"👤 Managing *{safe_player}*:{session_text}", get_player_action_keyboard(player, chat_id))
         return
         
     if data.startswith("gm:"):
-        _, mode, player = data.split(":")
+        mode = data.split(":")[1]
         rcon_command(f"gamemode {mode} {player}")
         answer_callback(cb_id, f"Set {player} to {mode} 🎮")
         return
@@ -945,7 +4005,6 @@ def handle_callback(cb):
         if chat_id != OWNER_ID:
             answer_callback(cb_id, "⛔ Only Owner can give OP!")
             return
-        player = data.split(":")[1]
         rcon_command(f"op {player}")
         answer_callback(cb_id, f"{player} is now OP ⚡")
         return
@@ -954,13 +4013,11 @@ def handle_callback(cb):
         if chat_id != OWNER_ID:
             answer_callback(cb_id, "⛔ Only Owner can remove OP!")
             return
-        player = data.split(":")[1]
         rcon_command(f"deop {player}")
         answer_callback(cb_id, f"{player} is no longer OP 🔻")
         return
         
     if data.startswith("ban:"):
-        player = data.split(":")[1]
         safe_player = escape_markdown(player)
         rcon_command(f"ban {player}")
         answer_callback(cb_id, f"{player} BANNED 🔨")
@@ -968,7 +4025,6 @@ def handle_callback(cb):
         return
 
     if data.startswith("unban:"):
-        player = data.split(":")[1]
         safe_player = escape_markdown(player)
         rcon_command(f"pardon {player}")
         answer_callback(cb_id, f"{player} UNBANNED 🔓")
@@ -976,7 +4032,6 @@ def handle_callback(cb):
         return
         
     if data.startswith("kick:"):
-        player = data.split(":")[1]
         rcon_command(f"kick {player}")
         answer_callback(cb_id, f"{player} Kicked 🥾")
         return
@@ -1002,6 +4057,12 @@ def handle_callback(cb):
         answer_callback(cb_id, "Unlocked")
         return
         
+    elif data == "player_search":
+        pending_search[chat_id] = True
+        send_message(chat_id, "🔍 *Player Search*\nType the first letters of a player name.")
+        answer_callback(cb_id, "Waiting for input...")
+        return
+
     elif data == "broadcast_mode":
         pending_broadcast[chat_id] = True
         send_message(chat_id, "📢 *Broadcast Mode ON*\nType your message now to send it as a screen title to all players.")
@@ -1017,6 +4078,10 @@ def handle_text(msg):
     
     if chat_id not in ALLOWED_CHAT_IDS:
         return
+
+    if "document" in msg:
+        handle_document(msg)
+        return
         
     # Check for pending broadcast
     if pending_broadcast.get(chat_id):
@@ -1036,6 +4101,13 @@ def handle_text(msg):
         pending_broadcast[chat_id] = False
         return
 
+    # Check for pending player search
+    if pending_search.get(chat_id) and not text.startswith("/"):
+        pending_search[chat_id] = False
+        msg_text, kb = get_player_search_msg(text.split()[0] if text else "")
+        send_message(chat_id, msg_text, kb)
+        return
+
     # Commands
     if text.startswith("/"):
         if text.startswith("/start") or text.startswith("/help") or text.startswith("/panel"):
@@ -1064,21 +4136,123 @@ def handle_text(msg):
         parts = text.split()
         cmd = parts[0].lower()
         
-        if cmd == "/add" and len(parts) > 1:
-            player = parts[1]
-            out = rcon_command(f"whitelist add {player}")
-            rcon_command("whitelist reload")
-            safe_player = escape_markdown(player)
-            safe_out = escape_markdown(out)
-            send_message(chat_id, f"✅ *Added:* {safe_player}\n`{safe_out}`")
-            
-        elif cmd == "/remove" and len(parts) > 1:
-            player = parts[1]
-            out = rcon_command(f"whitelist remove {player}")
-            rcon_command("whitelist reload")
-            safe_player = escape_markdown(player)
-            safe_out = escape_markdown(out)
-            send_message(chat_id, f"❌ *Removed:* {safe_player}\n`{safe_out}`")
+        if cmd == "/top":
+            period = parts[1].lower() if len(parts) > 1 else ""
+            if period in ("day", "week"):
+                send_message(chat_id, get_playtime_period_top(period))
+            else:
+                send_message(chat_id, get_playtime_top())
+            return
+
+        if cmd == "/census":
+            by_player = len(parts) > 1 and parts[1].lower() == "players"
+            census, previous = get_entity_census(by_player=by_player)
+            send_message(chat_id, format_entity_census(census, previous), get_census_keyboard())
+            return
+
+        if cmd == "/graph":
+            name = RESOURCE_SERIES_ALIASES.get(parts[1].lower()) if len(parts) > 1 else None
+            if name is None:
+                send_message(chat_id, format_resource_sparklines(), get_graph_keyboard())
+                return
+            hours = 6
+            if len(parts) > 2 and parts[2].isdigit():
+                hours = min(max(int(parts[2]), 1), RESOURCE_HISTORY_HOURS)
+            png, caption = get_resource_chart(name, hours)
+            if png is None:
+                send_message(chat_id, caption)
+            else:
+                send_photo(chat_id, png, caption)
+            return
+
+        if cmd == "/wake":
+            send_message(chat_id, wake_server())
+            return
+
+        if cmd == "/governor":
+            send_message(chat_id, format_governor_status())
+            return
+
+        if cmd == "/lag":
+            send_message(chat_id, format_lag_digest(time.time() - 3600) or "✅ *No lag spikes in the last hour.*")
+            return
+
+        if cmd == "/backups":
+            send_message(chat_id, format_backup_history())
+            return
+
+        if cmd == "/tasks":
+            send_message(chat_id, format_tasks())
+            return
+
+        if cmd == "/task":
+            if chat_id != OWNER_ID:
+                send_message(chat_id, "⛔ Only Owner can edit scheduled tasks!")
+                return
+            handle_task_command(chat_id, text)
+            return
+
+        if cmd == "/jobs":
+            send_message(chat_id, format_job_stats())
+            return
+
+        if cmd == "/upload":
+            # Sends the newest backup file to this chat, skipping parts it already received
+            send_message(chat_id, "📤 *Uploading latest backup...*")
+            threading.Thread(
+                target=lambda: send_message(chat_id, upload_latest_backup([chat_id])),
+                daemon=True
+            ).start()
+            return
+
+        if cmd == "/retention":
+            send_message(chat_id, get_retention_report())
+            return
+
+        if cmd == "/snapshots":
+            snapshots = list_snapshots()
+            if not snapshots:
+                send_message(chat_id, "📭 *No snapshots yet.*\nSet `BACKUP_ENGINE=builtin` and press 📦 Backup.")
+                return
+            lines = [f"💾 *Snapshots ({len(snapshots)}):*"]
+            for snapshot_id in snapshots[-10:][::-1]:
+                lines.append(f"`{snapshot_id}`")
+            lines.append("Restore with `/restore <id>` (Owner).")
+            send_message(chat_id, "\n".join(lines))
+            return
+
+        if cmd == "/restore" and len(parts) > 1:
+            if chat_id != OWNER_ID:
+                send_message(chat_id, "⛔ Only Owner can restore snapshots!")
+                return
+            snapshot_id = parts[1]
+            if snapshot_id not in list_snapshots():
+                send_message(chat_id, f"❌ Unknown snapshot `{escape_markdown(snapshot_id)}`.")
+                return
+            # Restores go to a staging folder; swapping it in is left to the admin
+            target_dir = os.path.join(BACKUP_DIR, "restore", snapshot_id)
+            send_message(chat_id, f"⏳ *Restoring* `{snapshot_id}`...")
+
+            def do_restore():
+                try:
+                    count = restore_snapshot(snapshot_id, target_dir)
+                    send_message(chat_id, f"✅ Restored `{count}` file(s) to:\n`{escape_markdown(target_dir)}`")
+                except Exception as e:
+                    send_message(chat_id, f"❌ Restore failed: {escape_markdown(e)}")
+
+            threading.Thread(target=do_restore, daemon=True).start()
+            return
+
+        if cmd == "/find" and len(parts) > 1:
+            msg_text, kb = get_player_search_msg(parts[1])
+            send_message(chat_id, msg_text, kb)
+            return
+
+        if cmd in ("/add", "/remove") and len(parts) > 1:
+            action = cmd[1:]
+            names = parse_player_names(text.split(None, 1)[1])
+            results = apply_whitelist_batch(action, names)
+            send_message(chat_id, format_whitelist_batch_summary(action, results))
             
         elif cmd == "/kick" and len(parts) > 1:
             player = parts[1]
@@ -1097,93 +4271,1087 @@ def handle_text(msg):
             ]
             rcon_command(["tellraw", "@a", json.dumps(tellraw_payload)])
 
-def monitor_resources():
-    print("Resource monitor started...")
-    last_alert_time = 0
-    ALERT_COOLDOWN = 1800 # 30 minutes
+# Tick health: TPS/MSPT sampled over RCON into a rolling window. Vanilla
+# 1.20.3+ answers `tick query`; Paper-family servers answer `tps`/`mspt`.
+tick_lock = threading.Lock()
+tick_samples = collections.deque(maxlen=TICK_WINDOW_SAMPLES)
+tick_state = {"source": None, "last_alert": 0, "alerting": False}
 
-    while True:
+def parse_vanilla_tick_query(output):
+    """Returns (tps, mspt) from `tick query` output, or None."""
+    avg = TICK_AVERAGE_RE.search(output or "")
+    if not avg:
+        return None
+    mspt = float(avg.group(1))
+    rate = TICK_TARGET_RATE_RE.search(output)
+    target = float(rate.group(1)) if rate else 20.0
+    tps = min(target, 1000.0 / mspt) if mspt > 0 else target
+    return round(tps, 2), mspt
+
+def parse_paper_tick_output(tps_output, mspt_output):
+    """Returns (tps, mspt) from Paper `tps` and `mspt` output, or None."""
+    tps_match = PAPER_TPS_RE.search(SECTION_CODE_RE.sub("", tps_output or ""))
+    # The first avg/min/max triple is the 5 second window
+    mspt_match = PAPER_MSPT_RE.search(SECTION_CODE_RE.sub("", mspt_output or ""))
+    if not tps_match or not mspt_match:
+        return None
+    return float(tps_match.group(1)), float(mspt_match.group(1))
+
+def query_tick_health():
+    """Samples (tps, mspt) with the detected command set, detecting it if needed."""
+    source = tick_state["source"]
+    if source in (None, "vanilla"):
+        sample = parse_vanilla_tick_query(strip_ansi(rcon_command(["tick", "query"])))
+        if sample:
+            tick_state["source"] = "vanilla"
+            return sample
+    if source in (None, "paper"):
+        tps_output, mspt_output = rcon_batch(["tps", "mspt"])
+        sample = parse_paper_tick_output(strip_ansi(tps_output), strip_ansi(mspt_output))
+        if sample:
+            tick_state["source"] = "paper"
+            return sample
+    # Unknown or changed server software: detect again next time
+    tick_state["source"] = None
+    return None
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = math.ceil(fraction * len(ordered))
+    return ordered[min(len(ordered) - 1, max(rank - 1, 0))]
+
+def record_tick_sample(tps, mspt, now=None):
+    with tick_lock:
+        tick_samples.append((now or time.time(), tps, mspt))
+
+def get_tick_summary(max_age=None):
+    """Returns recent tick stats, or None when there is no fresh sample."""
+    max_age = max_age or max(TICK_MONITOR_SECONDS, 1) * 3
+    with tick_lock:
+        samples = list(tick_samples)
+    if not samples or time.time() - samples[-1][0] > max_age:
+        return None
+    mspts = [sample[2] for sample in samples]
+    return {
+        "tps": samples[-1][1],
+        "mspt": samples[-1][2],
+        "p50": percentile(mspts, 0.50),
+        "p95": percentile(mspts, 0.95),
+        "p99": percentile(mspts, 0.99),
+        "samples": len(samples),
+        "source": tick_state["source"],
+    }
+
+def format_tick_status():
+    summary = get_tick_summary()
+    if summary is None:
+        return None
+    icon = "🟢" if summary["mspt"] < TICK_MSPT_ALERT_MS * 0.8 else ("🟡" if summary["mspt"] < TICK_MSPT_ALERT_MS else "🔴")
+    return (
+        f"{icon} Tick: `{summary['tps']:.1f} TPS` / `{summary['mspt']:.1f} ms` "
+        f"(p95 `{summary['p95']:.1f}` ms)"
+    )
+
+def check_tick_alert(now=None):
+    """Returns an alert or recovery message when the lag state changes, else None."""
+    now = now or time.time()
+    with tick_lock:
+        recent = list(tick_samples)[-TICK_ALERT_SAMPLES:]
+    if len(recent) < TICK_ALERT_SAMPLES:
+        return None
+
+    lagging = all(sample[2] > TICK_MSPT_ALERT_MS for sample in recent)
+    if lagging and not tick_state["alerting"]:
+        if now - tick_state["last_alert"] < TICK_ALERT_COOLDOWN_SECONDS:
+            return None
+        tick_state["alerting"] = True
+        tick_state["last_alert"] = now
+        summary = get_tick_summary(max_age=float("inf"))
+        return (
+            f"🐢 *Server is lagging!*\n"
+            f"MSPT `{recent[-1][2]:.1f}` ms over `{TICK_MSPT_ALERT_MS}` ms for `{format_duration(now - recent[0][0])}`\n"
+            f"TPS `{recent[-1][1]:.1f}`, p95 `{summary['p95']:.1f}` ms"
+        )
+    if tick_state["alerting"] and all(sample[2] <= TICK_MSPT_ALERT_MS for sample in recent):
+        tick_state["alerting"] = False
+        return f"✅ *Tick rate recovered:* `{recent[-1][1]:.1f} TPS` / `{recent[-1][2]:.1f} ms`"
+    return None
+
+def sample_tick_health():
+    if not is_container_running():
+        tick_state["source"] = None
+        return
+    sample = query_tick_health()
+    if sample:
+        record_tick_sample(*sample)
+        alert = check_tick_alert()
+        if alert:
+            broadcast_message(alert)
+
+# Entity census: `execute if entity` counts per type and dimension, sent as
+# one rcon-cli batch. `distance=0..` limits a selector to the dimension the
+# command runs in. Results are cached briefly and the previous census is
+# kept for deltas.
+census_lock = threading.Lock()
+census_state = {"last": None, "previous": None}
+
+def parse_census_count(output):
+    """Returns the entity count from `execute if entity` output, or None on errors."""
+    clean = strip_ansi(output or "")
+    match = CENSUS_COUNT_RE.search(clean)
+    if match:
+        return int(match.group(1))
+    if "Test failed" in clean:
+        return 0
+    return None
+
+def build_census_commands(entity_types):
+    commands = []
+    keys = []
+    for entity_type in entity_types:
+        for dimension, _icon in CENSUS_DIMENSIONS:
+            commands.append(
+                f"execute in minecraft:{dimension} if entity @e[type=minecraft:{entity_type},distance=0..]"
+            )
+            keys.append((entity_type, dimension))
+    return commands, keys
+
+def build_player_census_commands(players, entity_types):
+    commands = []
+    keys = []
+    for player in players:
+        for entity_type in entity_types:
+            commands.append(
+                f"execute as {player} at @s if entity "
+                f"@e[type=minecraft:{entity_type},distance=..{CENSUS_PLAYER_RADIUS}]"
+            )
+            keys.append((player, entity_type))
+    return commands, keys
+
+def census_totals(census):
+    return {entity_type: sum(by_dim.values()) for entity_type, by_dim in census["types"].items()}
+
+def run_entity_census(by_player=False, now=None):
+    """Counts entities by type and dimension (and near players). Returns the census dict."""
+    commands, keys = build_census_commands(CENSUS_ENTITY_TYPES)
+    types = {}
+    errors = 0
+    for (entity_type, dimension), output in zip(keys, rcon_batch(commands, timeout=30)):
+        count = parse_census_count(output)
+        if count is None:
+            errors += 1
+            continue
+        types.setdefault(entity_type, {})[dimension] = count
+    census = {"ts": now or time.time(), "types": types, "players": {}, "errors": errors}
+
+    if by_player:
+        # Only the worst offenders, to keep the batch small
+        top_types = [t for t, total in sorted(census_totals(census).items(), key=lambda kv: -kv[1])[:5] if total]
+        players = get_online_players_list()
+        commands, keys = build_player_census_commands(players, top_types)
+        for (player, entity_type), output in zip(keys, rcon_batch(commands, timeout=30)):
+            count = parse_census_count(output)
+            if count:
+                census["players"].setdefault(player, {})[entity_type] = count
+    return census
+
+def get_entity_census(by_player=False, force=False):
+    """Returns (census, previous), reusing a census younger than CENSUS_CACHE_SECONDS."""
+    with census_lock:
+        last = census_state["last"]
+        if (last and not force and time.time() - last["ts"] < CENSUS_CACHE_SECONDS
+                and (last["players"] or not by_player)):
+            return last, census_state["previous"]
+
+        census = run_entity_census(by_player)
+        if last:
+            census_state["previous"] = last
+        census_state["last"] = census
+        return census, census_state["previous"]
+
+def format_entity_census(census, previous=None, limit=10, now=None):
+    now = now or time.time()
+    totals = census_totals(census)
+    if not totals:
+        return "❌ *Census failed:* no counts returned (is the server running?)"
+    before = census_totals(previous) if previous else {}
+    age = now - census["ts"]
+    lines = [f"🐔 *Entity Census* (`{sum(totals.values())}` entities, {'fresh' if age < 5 else f'{format_duration(age)} ago'})"]
+
+    ranked = sorted(totals.items(), key=lambda kv: -kv[1])
+    for rank, (entity_type, total) in enumerate(ranked[:limit], start=1):
+        if not total:
+            break
+        delta = ""
+        if entity_type in before and total != before[entity_type]:
+            delta = f" ({total - before[entity_type]:+d})"
+        dims = " ".join(
+            f"{icon}{census['types'][entity_type].get(dimension, 0)}"
+            for dimension, icon in CENSUS_DIMENSIONS if census["types"][entity_type].get(dimension)
+        )
+        lines.append(f"{rank}. `{entity_type}` *{total}*{delta}  {dims}")
+
+    if previous:
+        lines.append(f"_Deltas vs census {format_duration(census['ts'] - previous['ts'])} earlier._")
+    if census["players"]:
+        lines.append(f"\n👤 *Near players ({CENSUS_PLAYER_RADIUS} blocks):*")
+        for player, counts in sorted(census["players"].items(), key=lambda kv: -sum(kv[1].values()))[:10]:
+            detail = ", ".join(f"{t} {c}" for t, c in sorted(counts.items(), key=lambda kv: -kv[1]))
+            lines.append(f"• `{escape_markdown(player)}`: {detail}")
+    if census["errors"]:
+        lines.append(f"⚠️ `{census['errors']}` query(s) failed (unknown entity type?)")
+    return "\n".join(lines)
+
+def get_census_keyboard():
+    return {"inline_keyboard": [[
+        {"text": "🔄 Recount", "callback_data": "census:refresh"},
+        {"text": "👤 By Player", "callback_data": "census:players"}
+    ]]}
+
+# Performance governor: steps view/simulation distance down while MSPT stays
+# above GOVERNOR_MSPT_HIGH and back up once it is below GOVERNOR_MSPT_LOW.
+# The gap between the two thresholds plus the cooldown keeps it from flapping.
+governor_lock = threading.Lock()
+governor_state = {"view": None, "simulation": None, "last_change": 0}
+governor_history = collections.deque(maxlen=20)
+
+def _governor_current(key, prop, low, high):
+    value = governor_state[key]
+    if value is None:
         try:
-            # Check RAM Usage
-            try:
-                # Get percentage directly: "50.29%"
-                stats = subprocess.check_output(
-                    ["docker", "stats", CONTAINER_NAME, "--no-stream", "--format", "{{.MemPerc}}"],
-                    timeout=5
-                ).strip().decode()
-                
-                # Parse percentage
-                mem_perc = float(stats.replace("%", ""))
-                
-                if mem_perc > 90.0:
-                    current_time = time.time()
-                    if current_time - last_alert_time > ALERT_COOLDOWN:
-                        msg = (
-                            f"⚠️ *High RAM Usage Alert!* 📊\n"
-                            f"Usage: `{mem_perc}%`\n"
-                            f"The server might lag. Consider restarting soon."
-                        )
-                        broadcast_message(msg)
-                        last_alert_time = current_time
-                        
-            except Exception as e:
-                # Container might be stopped or starting
-                pass
-                
-        except Exception as e:
-            print(f"Resource Monitor error: {e}")
-        
-        time.sleep(3600) # Check every hour
+            value = int(read_property(prop))
+        except ValueError:
+            value = high
+    return min(max(value, low), high)
+
+def plan_governor_step(mspt, players, view, simulation):
+    """Returns (new_view, new_simulation, reason), or None to hold.
+
+    Simulation distance drives tick cost the most, so it is cut first and
+    restored last; view distance follows.
+    """
+    has_view = bool(GOVERNOR_VIEW_COMMAND)
+    has_sim = bool(GOVERNOR_SIMULATION_COMMAND)
+    if mspt > GOVERNOR_MSPT_HIGH and players > 0:
+        if has_sim and simulation > GOVERNOR_SIMULATION_MIN:
+            return view, max(simulation - GOVERNOR_STEP, GOVERNOR_SIMULATION_MIN), "MSPT high"
+        if has_view and view > GOVERNOR_VIEW_MIN:
+            return max(view - GOVERNOR_STEP, GOVERNOR_VIEW_MIN), simulation, "MSPT high"
+        return None
+    if mspt < GOVERNOR_MSPT_LOW:
+        reason = "server empty" if players == 0 else "MSPT recovered"
+        if has_view and view < GOVERNOR_VIEW_MAX:
+            return min(view + GOVERNOR_STEP, GOVERNOR_VIEW_MAX), simulation, reason
+        if has_sim and simulation < GOVERNOR_SIMULATION_MAX:
+            return view, min(simulation + GOVERNOR_STEP, GOVERNOR_SIMULATION_MAX), reason
+    return None
+
+def apply_governor_value(template, value):
+    """Sends one distance command. Returns None on success or the error output."""
+    output = strip_ansi(rcon_command(template.format(value=value))).strip()
+    lowered = output.lower()
+    if any(marker in lowered for marker in ("unknown", "error", "incorrect", "timeout")):
+        return output
+    return None
+
+def run_governor_step(now=None):
+    """Evaluates the governor once. Returns a notification message or None."""
+    now = now or time.time()
+    with tick_lock:
+        samples = list(tick_samples)[-GOVERNOR_SAMPLES:]
+    # Only act on a full window of fresh samples
+    if len(samples) < GOVERNOR_SAMPLES or now - samples[-1][0] > max(TICK_MONITOR_SECONDS, 5) * 3:
+        return None
+    recent = [sample[2] for sample in samples]
+    with governor_lock:
+        if now - governor_state["last_change"] < GOVERNOR_COOLDOWN_SECONDS:
+            return None
+        view = _governor_current("view", "view-distance", GOVERNOR_VIEW_MIN, GOVERNOR_VIEW_MAX)
+        simulation = _governor_current(
+            "simulation", "simulation-distance", GOVERNOR_SIMULATION_MIN, GOVERNOR_SIMULATION_MAX
+        )
+        mspt = percentile(recent, 0.5)
+        players = len(get_online_players_list())
+        plan = plan_governor_step(mspt, players, view, simulation)
+        if plan is None:
+            governor_state.update(view=view, simulation=simulation)
+            return None
+
+        new_view, new_simulation, reason = plan
+        changes = []
+        for label, template, old, new in (
+            ("view-distance", GOVERNOR_VIEW_COMMAND, view, new_view),
+            ("simulation-distance", GOVERNOR_SIMULATION_COMMAND, simulation, new_simulation),
+        ):
+            if old == new:
+                continue
+            error = apply_governor_value(template, new)
+            if error:
+                governor_state["last_change"] = now
+                return f"⚠️ *Governor:* setting {label} failed:\n`{escape_markdown(error[:200])}`"
+            changes.append(f"{label} `{old}` → `{new}`")
+
+        governor_state.update(view=new_view, simulation=new_simulation, last_change=now)
+        governor_history.appendleft((now, ", ".join(changes), reason))
+        return (
+            f"🎛️ *Governor:* {', '.join(changes)}\n"
+            f"📈 {reason}: MSPT `{mspt:.1f}` ms, players `{players}`"
+        )
 
-def monitor_scheduled_backups():
-    if BACKUP_SCHEDULE_MINUTES <= 0:
-        print("Scheduled backups disabled (BACKUP_SCHEDULE_MINUTES <= 0).")
+def format_governor_status():
+    if not GOVERNOR_ENABLED:
+        return "🎛️ *Governor is disabled* (`GOVERNOR_ENABLED=false`)."
+    with governor_lock:
+        view, simulation = governor_state["view"], governor_state["simulation"]
+        history = list(governor_history)
+    lines = [
+        "🎛️ *Performance Governor*",
+        f"👁️ View: `{view if view is not None else '?'}` ({GOVERNOR_VIEW_MIN}-{GOVERNOR_VIEW_MAX})"
+        + ("" if GOVERNOR_VIEW_COMMAND else " _not managed_"),
+        f"⚙️ Simulation: `{simulation if simulation is not None else '?'}` "
+        f"({GOVERNOR_SIMULATION_MIN}-{GOVERNOR_SIMULATION_MAX})"
+        + ("" if GOVERNOR_SIMULATION_COMMAND else " _not managed_"),
+        f"📏 Lower above `{GOVERNOR_MSPT_HIGH}` ms, raise below `{GOVERNOR_MSPT_LOW}` ms",
+    ]
+    for ts, changes, reason in history[:5]:
+        lines.append(f"• `{time.strftime('%H:%M', time.localtime(ts))}` {changes} ({reason})")
+    return "\n".join(lines)
+
+def run_governor_check():
+    if not is_container_running():
+        # A restart reloads server.properties, so start from there again
+        with governor_lock:
+            governor_state.update(view=None, simulation=None)
         return
+    message = run_governor_step()
+    if message:
+        broadcast_message(message)
+
+# Lag spikes: "Can't keep up!" warnings from the log stream, each stored with
+# the player count and the players who joined shortly before it.
+lag_lock = threading.Lock()
+lag_spikes = collections.deque(maxlen=2000)
+lag_state = {"last_alert": 0}
+# Join lines seen in the log, (ts, name). Presence session starts are not
+# used: a bot restart or reconcile resets them, and leavers drop out.
+join_events = collections.deque(maxlen=500)
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def parse_lag_spike_line(line):
+    """Returns (ms_behind, ticks_behind) from a "Can't keep up!" line, or None."""
+    if "Can't keep up!" not in line:
+        return None
+    match = CANT_KEEP_UP_RE.search(line)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def record_join_event(player, now=None):
+    with lag_lock:
+        join_events.append((now or time.time(), player))
+
+def record_lag_spike(ms, ticks, now=None):
+    now = now or time.time()
+    with presence_lock:
+        players = len(presence_sessions) if presence_state["synced"] else None
+    with lag_lock:
+        # Anyone who joined in the last few minutes, even if they already left
+        joins = sorted({name for ts, name in join_events if 0 <= now - ts <= LAG_JOIN_WINDOW_SECONDS})
+        lag_spikes.append({"ts": now, "ms": ms, "ticks": ticks, "players": players, "joins": joins})
+
+def get_lag_spikes_since(since):
+    with lag_lock:
+        return [spike for spike in lag_spikes if spike["ts"] >= since]
+
+def check_lag_spike_alert(now=None):
+    """Returns an alert message when spikes are sustained, else None."""
+    now = now or time.time()
+    recent = get_lag_spikes_since(now - LAG_ALERT_WINDOW_SECONDS)
+    if len(recent) < LAG_ALERT_SPIKES or now - lag_state["last_alert"] < LAG_ALERT_COOLDOWN_SECONDS:
+        return None
+    lag_state["last_alert"] = now
+    total_ms = sum(spike["ms"] for spike in recent)
+    lines = [
+        "🐌 *Repeated lag spikes!*",
+        f"`{len(recent)}` \"Can't keep up\" warnings in `{format_duration(LAG_ALERT_WINDOW_SECONDS)}`, "
+        f"`{total_ms / 1000:.1f}s` behind in total",
+    ]
+    if recent[-1]["players"] is not None:
+        lines.append(f"👥 Online: `{recent[-1]['players']}`")
+    joins = sorted({name for spike in recent for name in spike["joins"]})
+    if joins:
+        lines.append(f"🆕 Recent joins: {', '.join(f'`{escape_markdown(name)}`' for name in joins[:10])}")
+    return "\n".join(lines)
+
+def sparkline(values):
+    if not values:
+        return ""
+    top = max(values)
+    if top <= 0:
+        return SPARK_CHARS[0] * len(values)
+    return "".join(SPARK_CHARS[min(int(v / top * (len(SPARK_CHARS) - 1) + 0.5), len(SPARK_CHARS) - 1)] for v in values)
+
+def format_lag_digest(since, until=None, buckets=6):
+    """Summarises lag spikes between since and until. Returns None when there were none."""
+    until = until or time.time()
+    spikes = [spike for spike in get_lag_spikes_since(since) if spike["ts"] <= until]
+    if not spikes:
+        return None
 
-    interval_seconds = BACKUP_SCHEDULE_MINUTES * 60
-    print(f"Scheduled backups enabled every {BACKUP_SCHEDULE_MINUTES} minute(s).")
+    width = (until - since) / buckets
+    counts = [0] * buckets
+    for spike in spikes:
+        counts[min(int((spike["ts"] - since) / width), buckets - 1)] += 1
+
+    total_ms = sum(spike["ms"] for spike in spikes)
+    worst = max(spikes, key=lambda spike: spike["ms"])
+    lines = [
+        f"🐌 *Lag Spikes* (last `{format_duration(until - since)}`)",
+        f"📈 `{sparkline(counts)}` ({format_duration(width)} per bar)",
+        f"⚠️ Spikes: `{len(spikes)}`, `{total_ms / 1000:.1f}s` behind in total",
+        f"💥 Worst: `{worst['ms']}ms` ({worst['ticks']} ticks) at `{time.strftime('%H:%M', time.localtime(worst['ts']))}`",
+    ]
+    counted = [spike["players"] for spike in spikes if spike["players"] is not None]
+    if counted:
+        lines.append(f"👥 Players online during spikes: avg `{sum(counted) / len(counted):.1f}`, max `{max(counted)}`")
+
+    # Players whose arrival most often preceded a spike
+    join_counts = collections.Counter(name for spike in spikes for name in spike["joins"])
+    if join_counts:
+        lines.append("🆕 *Joined shortly before spikes:*")
+        for name, count in join_counts.most_common(5):
+            lines.append(f"• `{escape_markdown(name)}` - {count} spike(s)")
+    return "\n".join(lines)
+
+def seconds_to_next_hour(now=None):
+    now = now or time.time()
+    return 3600 - now % 3600
+
+def send_lag_digest():
+    """Sends the digest for the hour that just ended. Returns the delay to the next hour."""
+    end = time.time()
+    digest = format_lag_digest(end - 3600, end)
+    if digest:
+        broadcast_message(digest)
+    return seconds_to_next_hour()
+
+# Idle auto-pause: stop the container after IDLE_STOP_MINUTES with nobody
+# online (warning first), wake it from Telegram or at IDLE_WARMUP_TIMES.
+idle_lock = threading.Lock()
+idle_state = {"empty_since": None, "warned": False, "paused": False, "last_warmup": None}
+
+def parse_warmup_times(raw):
+    """Parses "HH:MM,HH:MM" into sorted (hour, minute) tuples, skipping invalid entries."""
+    times = set()
+    for item in raw.split(","):
+        hour, _, minute = item.strip().partition(":")
+        try:
+            hour, minute = int(hour), int(minute)
+        except ValueError:
+            continue
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            times.add((hour, minute))
+    return sorted(times)
+
+def due_warmup(now, times, last_key, window=None):
+    """Returns the key of a warm-up time that started within `window` seconds, if not yet handled."""
+    window = window or IDLE_CHECK_SECONDS * 2
+    local = time.localtime(now)
+    for hour, minute in times:
+        scheduled = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, hour, minute, 0, 0, 0, -1))
+        key = time.strftime("%Y-%m-%d ", local) + f"{hour:02d}:{minute:02d}"
+        if 0 <= now - scheduled < window and key != last_key:
+            return key
+    return None
+
+def get_idle_wake_keyboard():
+    return {"inline_keyboard": [[{"text": "☀️ Wake Server", "callback_data": "idle_wake"}]]}
+
+def get_idle_keep_keyboard():
+    return {"inline_keyboard": [[{"text": "⏳ Keep Running", "callback_data": "idle_keep"}]]}
+
+def load_idle_state(path=None):
+    """Restores the paused flag so a restarted bot still treats the stop as a pause."""
+    path = path or IDLE_STATE_FILE
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {path}: {e}")
+        return
+    with idle_lock:
+        idle_state.update(paused=bool(data.get("paused")), last_warmup=data.get("last_warmup"))
 
-    # Delay first run to avoid immediate trigger on startup.
-    time.sleep(interval_seconds)
+def save_idle_state(path=None):
+    """Writes the paused flag. Call with idle_lock held."""
+    path = path or IDLE_STATE_FILE
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"paused": idle_state["paused"], "last_warmup": idle_state["last_warmup"]}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Cannot write {path}: {e}")
+
+def wake_server():
+    """Starts a paused server and restarts the idle clock. Returns the start_server message."""
+    with idle_lock:
+        msg = start_server()
+        if msg.startswith("✅"):
+            idle_state.update(paused=False, empty_since=time.time(), warned=False)
+            save_idle_state()
+    return msg
 
-    while True:
-        ok, backup_message = run_backup_blocking()
-        if ok:
-            removed_count = apply_backup_retention()
-            if BACKUP_RETENTION_COUNT > 0:
-                backup_message = (
-                    f"{backup_message}\n🧹 Retention: keep `{BACKUP_RETENTION_COUNT}` file(s), "
-                    f"removed `{removed_count}` old file(s)."
-                )
+def pause_idle_server():
+    """Saves and stops the server. Returns the stop_server message."""
+    # Flush chunks before the container goes down even if the stop is cut short
+    rcon_command(["save-all", "flush"])
+    msg = stop_server()
+    if msg.startswith("🛑"):
+        idle_state.update(paused=True, empty_since=None, warned=False)
+        save_idle_state()
+        clear_presence()
+    return msg
+
+def run_idle_check(now=None, running=None):
+    """Advances the idle manager once. Returns [(message, keyboard)] to broadcast."""
+    now = now or time.time()
+    running = is_container_running() if running is None else running
+    notices = []
+    with idle_lock:
+        if idle_state["paused"]:
+            if running:
+                # Someone started it another way
+                idle_state.update(paused=False, empty_since=now, warned=False)
+                save_idle_state()
+                return notices
+            key = due_warmup(now, parse_warmup_times(IDLE_WARMUP_TIMES), idle_state["last_warmup"])
+            if key:
+                idle_state["last_warmup"] = key
+                msg = start_server()
+                if msg.startswith("✅"):
+                    idle_state.update(paused=False, empty_since=now, warned=False)
+                save_idle_state()
+                notices.append((f"🌅 *Scheduled warm-up* (`{key[-5:]}`)\n{msg}", None))
+            return notices
+
+        if not running:
+            idle_state.update(empty_since=None, warned=False)
+            return notices
+
+        players = get_online_players_list()
+        if players or backup_jobs["current"] is not None:
+            idle_state.update(empty_since=None, warned=False)
+            return notices
+
+        if idle_state["empty_since"] is None:
+            idle_state["empty_since"] = now
+        idle_seconds = now - idle_state["empty_since"]
+        stop_after = IDLE_STOP_MINUTES * 60
+        if idle_seconds >= stop_after:
+            msg = pause_idle_server()
+            notices.append((
+                f"💤 *Server paused* after `{format_duration(idle_seconds)}` with no players.\n{msg}\n"
+                "Tap *Wake* to start it again.",
+                get_idle_wake_keyboard(),
+            ))
+        elif not idle_state["warned"] and idle_seconds >= stop_after - IDLE_WARNING_MINUTES * 60:
+            idle_state["warned"] = True
+            notices.append((
+                f"⏸️ *Server is empty.* It will be stopped in `{format_duration(stop_after - idle_seconds)}` "
+                "to free memory.",
+                get_idle_keep_keyboard(),
+            ))
+    return notices
+
+def check_idle():
+    for message, keyboard in run_idle_check():
+        broadcast_message(message, keyboard)
+
+# JVM heap/GC: container RAM is mostly the heap reserved at startup, so GC
+# time and old-gen occupancy are the real pressure signals. Samples come from
+# `jstat -gc` inside the container (needs a JDK image) or from a unified GC
+# log (`-Xlog:gc`) on the data mount when JVM_GC_LOG is set. Counters are
+# cumulative; the window summary works on deltas.
+jvm_lock = threading.Lock()
+jvm_samples = collections.deque(maxlen=1000)
+jvm_state = {"source": None, "pid": None, "log_offset": None, "log_counters": None,
+             "last_alert": 0, "alerting": False}
+GC_UNIT_BYTES = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+def parse_jstat_gc(output):
+    """Returns a heap/GC sample dict from `jstat -gc` output, or None."""
+    lines = [line.split() for line in strip_ansi(output or "").splitlines() if line.strip()]
+    for header, values in zip(lines, lines[1:]):
+        if "OU" not in header or len(header) != len(values):
+            continue
+        row = {}
+        for key, value in zip(header, values):
+            try:
+                row[key] = float(value)
+            except ValueError:
+                # Collectors without concurrent cycles print "-" for CGC/CGCT
+                row[key] = 0.0
+        heap_used = sum(row.get(k, 0) for k in ("S0U", "S1U", "EU", "OU")) * 1024
+        heap_max = sum(row.get(k, 0) for k in ("S0C", "S1C", "EC", "OC")) * 1024
+        return {
+            "heap_used": heap_used,
+            "heap_max": heap_max,
+            "old_pct": row["OU"] / row["OC"] * 100 if row.get("OC") else None,
+            "gc_count": int(row.get("YGC", 0) + row.get("FGC", 0) + row.get("CGC", 0)),
+            "full_count": int(row.get("FGC", 0)),
+            "gc_seconds": row.get("GCT", 0.0),
+        }
+    return None
+
+def parse_gc_log_lines(lines, counters):
+    """Adds pauses from unified GC log lines to counters; returns the last heap reading."""
+    heap = None
+    for line in lines:
+        match = GC_PAUSE_RE.search(line)
+        if not match:
+            continue
+        kind, _before, _bu, after, after_unit, size, size_unit, millis = match.groups()
+        counters["gc_count"] += 1
+        counters["gc_seconds"] += float(millis) / 1000
+        if kind.startswith("Pause Full"):
+            counters["full_count"] += 1
+        heap = (int(after) * GC_UNIT_BYTES[after_unit], int(size) * GC_UNIT_BYTES[size_unit])
+    return heap
+
+def read_gc_log_sample(path):
+    """Reads GC log lines written since the last call. Returns a sample dict or None."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    offset = jvm_state["log_offset"]
+    counters = jvm_state["log_counters"]
+    if offset is None or size < offset or counters is None:
+        # First read or the log was rotated: start from the recent tail
+        offset = max(0, size - JVM_GC_LOG_TAIL_BYTES) if offset is None else 0
+        counters = {"gc_count": 0, "full_count": 0, "gc_seconds": 0.0,
+                    "heap_used": None, "heap_max": None}
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    # Only consume complete lines; a partial last line is read next time
+    end = data.rfind(b"\n") + 1
+    heap = parse_gc_log_lines(data[:end].decode("utf-8", "replace").splitlines(), counters)
+    if heap:
+        counters["heap_used"], counters["heap_max"] = heap
+    jvm_state["log_offset"] = offset + end
+    jvm_state["log_counters"] = counters
+    if counters["heap_max"] is None:
+        return None
+    return {
+        "heap_used": counters["heap_used"],
+        "heap_max": counters["heap_max"],
+        # Heap left after the last collection stands in for old-gen occupancy
+        "old_pct": counters["heap_used"] / counters["heap_max"] * 100,
+        "gc_count": counters["gc_count"],
+        "full_count": counters["full_count"],
+        "gc_seconds": counters["gc_seconds"],
+    }
+
+def find_jvm_pid():
+    output = docker_output(["exec", CONTAINER_NAME, "jcmd", "-l"], "jcmd", timeout=10)
+    for line in output.splitlines():
+        pid, _, name = line.strip().partition(" ")
+        if pid.isdigit() and "jcmd" not in name.lower():
+            return pid
+    return None
+
+def read_jstat_sample():
+    pid = jvm_state["pid"] or find_jvm_pid()
+    if pid is None:
+        return None
+    try:
+        output = docker_output(["exec", CONTAINER_NAME, "jstat", "-gc", pid], "jstat", timeout=10)
+    except (subprocess.SubprocessError, OSError):
+        # The JVM restarted under a new pid; look it up again next time
+        jvm_state["pid"] = None
+        raise
+    jvm_state["pid"] = pid
+    return parse_jstat_gc(output)
+
+def sample_jvm(now=None):
+    """Takes one heap/GC sample into the window. Returns it, or None."""
+    if JVM_GC_LOG:
+        sample, source = read_gc_log_sample(JVM_GC_LOG), "gc log"
+    else:
+        sample, source = read_jstat_sample(), "jstat"
+    if sample is None:
+        return None
+    sample["ts"] = now or time.time()
+    with jvm_lock:
+        jvm_samples.append(sample)
+        jvm_state["source"] = source
+    return sample
+
+def get_jvm_summary(now=None, max_age=None):
+    """Heap and GC stats over the last JVM_WINDOW_MINUTES, or None without fresh data."""
+    now = now or time.time()
+    max_age = max_age or max(JVM_MONITOR_SECONDS, 1) * 3
+    with jvm_lock:
+        samples = [s for s in jvm_samples if s["ts"] >= now - JVM_WINDOW_MINUTES * 60]
+    if not samples or now - samples[-1]["ts"] > max_age:
+        return None
+    # Counters reset when the JVM restarts; only compare samples after that
+    for i in range(len(samples) - 1, 0, -1):
+        if samples[i]["gc_count"] < samples[i - 1]["gc_count"]:
+            samples = samples[i:]
+            break
+    first, last = samples[0], samples[-1]
+    wall = last["ts"] - first["ts"]
+    gc_seconds = last["gc_seconds"] - first["gc_seconds"]
+    old = [s["old_pct"] for s in samples if s["old_pct"] is not None]
+    return {
+        "heap_used": last["heap_used"],
+        "heap_max": last["heap_max"],
+        "old_pct": last["old_pct"],
+        "old_min": min(old) if old else None,
+        "gcs": last["gc_count"] - first["gc_count"],
+        "full_gcs": last["full_count"] - first["full_count"],
+        "gc_seconds": gc_seconds,
+        "gc_percent": gc_seconds / wall * 100 if wall > 0 else None,
+        "window": wall,
+        "samples": len(samples),
+    }
+
+def format_jvm_status():
+    summary = get_jvm_summary()
+    if summary is None:
+        return None
+    old = f" (old `{summary['old_pct']:.0f}%`)" if summary["old_pct"] is not None else ""
+    text = f"☕ Heap: `{format_bytes(summary['heap_used'])} / {format_bytes(summary['heap_max'])}`{old}"
+    if summary["gc_percent"] is not None:
+        text += f", GC `{summary['gc_percent']:.1f}%` of `{format_duration(summary['window'])}`"
+    return text
+
+def is_gc_thrashing(summary):
+    """GC eating the tick budget, or full GCs that leave the old gen full."""
+    if summary is None or summary["gc_percent"] is None:
+        return False
+    if summary["gc_percent"] >= JVM_GC_TIME_ALERT_PERCENT:
+        return True
+    return (summary["full_gcs"] > 0 and summary["old_min"] is not None
+            and summary["old_min"] >= JVM_OLD_GEN_ALERT_PERCENT)
+
+def check_jvm_alert(now=None):
+    """Returns an alert or recovery message when the GC state changes, else None."""
+    now = now or time.time()
+    summary = get_jvm_summary(now)
+    if summary is None or summary["window"] < JVM_WINDOW_MINUTES * 60 / 2:
+        return None
+    thrashing = is_gc_thrashing(summary)
+    if thrashing and not jvm_state["alerting"]:
+        if now - jvm_state["last_alert"] < JVM_ALERT_COOLDOWN_SECONDS:
+            return None
+        jvm_state["alerting"] = True
+        jvm_state["last_alert"] = now
+        old = f"`{summary['old_min']:.0f}%`" if summary["old_min"] is not None else "`?`"
+        return (
+            f"♻️ *GC thrashing!*\n"
+            f"`{summary['gc_percent']:.1f}%` of the last `{format_duration(summary['window'])}` spent in GC "
+            f"(`{summary['gcs']}` collections, `{summary['full_gcs']}` full)\n"
+            f"Old gen never dropped below {old}. A restart is probably due."
+        )
+    if jvm_state["alerting"] and not thrashing:
+        jvm_state["alerting"] = False
+        return f"✅ *GC pressure back to normal:* `{summary['gc_percent']:.1f}%` time in GC"
+    return None
+
+def check_jvm_health():
+    if not (JVM_GC_LOG or is_container_running()):
+        jvm_state["pid"] = None
+        return
+    sample_jvm()
+    alert = check_jvm_alert()
+    if alert:
+        broadcast_message(alert)
+
+# Resource history: fixed-size ring buffer of compact arrays (float32 values,
+# float64 timestamps) holding RESOURCE_HISTORY_HOURS of samples. NaN marks
+# a value that was unavailable (e.g. no tick data).
+RESOURCE_SERIES = (
+    ("cpu", "🧠 CPU", "%"),
+    ("mem", "💾 RAM", "%"),
+    ("players", "👥 Players", ""),
+    ("mspt", "⏱️ MSPT", " ms"),
+    ("heap", "☕ Heap", "%"),
+)
+RESOURCE_SERIES_ALIASES = {"cpu": "cpu", "ram": "mem", "mem": "mem", "memory": "mem",
+                           "players": "players", "mspt": "mspt", "tick": "mspt",
+                           "heap": "heap", "jvm": "heap"}
+resource_history_lock = threading.Lock()
+resource_history_state = {"next": 0, "count": 0}
+resource_alert_state = {}
+
+def _new_resource_history(capacity):
+    history = {"ts": array.array("d", bytes(8 * capacity))}
+    for name, _label, _unit in RESOURCE_SERIES:
+        history[name] = array.array("f", [math.nan]) * capacity
+    return history
+
+resource_history = _new_resource_history(RESOURCE_HISTORY_HOURS * 3600 // RESOURCE_SAMPLE_SECONDS)
+
+def record_resource_sample(ts, **values):
+    """Stores one sample; missing or None values are kept as NaN."""
+    with resource_history_lock:
+        capacity = len(resource_history["ts"])
+        i = resource_history_state["next"]
+        resource_history["ts"][i] = ts
+        for name, _label, _unit in RESOURCE_SERIES:
+            value = values.get(name)
+            resource_history[name][i] = math.nan if value is None else value
+        resource_history_state["next"] = (i + 1) % capacity
+        resource_history_state["count"] = min(resource_history_state["count"] + 1, capacity)
+
+def get_resource_series(name, since=0):
+    """Returns [(ts, value)] oldest first, skipping NaN values."""
+    with resource_history_lock:
+        capacity = len(resource_history["ts"])
+        count = resource_history_state["count"]
+        start = resource_history_state["next"] - count
+        points = []
+        for offset in range(count):
+            i = (start + offset) % capacity
+            ts = resource_history["ts"][i]
+            value = resource_history[name][i]
+            if ts >= since and not math.isnan(value):
+                points.append((ts, value))
+    return points
+
+def bucket_values(values, buckets, reduce=max):
+    """Reduces values into at most `buckets` groups, keeping order."""
+    if len(values) <= buckets:
+        return list(values)
+    return [reduce(values[i * len(values) // buckets:(i + 1) * len(values) // buckets]) for i in range(buckets)]
+
+def encode_png(width, height, pixels, palette):
+    """Encodes an 8-bit indexed PNG from a bytearray of palette indexes."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    # Filter type 0 (none) in front of every scanline
+    raw = b"".join(b"\x00" + bytes(pixels[y * width:(y + 1) * width]) for y in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+        + chunk(b"PLTE", b"".join(bytes(color) for color in palette))
+        + chunk(b"IDAT", zlib.compress(raw, 9))
+        + chunk(b"IEND", b"")
+    )
+
+CHART_PALETTE = ((255, 255, 255), (226, 226, 226), (198, 219, 239), (33, 113, 181), (203, 24, 29))
+
+def render_chart_png(values, width=640, height=240, threshold=None, ceiling=None):
+    """Draws values as a filled line chart (peak per pixel column)."""
+    margin = 8
+    plot_w, plot_h = width - 2 * margin, height - 2 * margin
+    pixels = bytearray(width * height)
+    columns = bucket_values(values, plot_w)
+    top = ceiling or max(max(values or [0]), threshold or 0) * 1.1 or 1.0
+    bottom = margin + plot_h - 1
+
+    def y_of(value):
+        return bottom - int(min(max(value / top, 0), 1) * (plot_h - 1))
+
+    def put(x, y, color):
+        if 0 <= x < width and 0 <= y < height:
+            pixels[y * width + x] = color
+
+    for quarter in range(5):
+        y = bottom - quarter * (plot_h - 1) // 4
+        for x in range(margin, margin + plot_w):
+            put(x, y, 1)
+
+    previous_y = None
+    for i, value in enumerate(columns):
+        # Stretch short series across the full width
+        x0 = margin + i * plot_w // len(columns)
+        x1 = margin + (i + 1) * plot_w // len(columns)
+        y = y_of(value)
+        for x in range(x0, max(x1, x0 + 1)):
+            for fill_y in range(y + 1, bottom + 1):
+                put(x, fill_y, 2)
+            low, high = (y, y) if previous_y is None else (min(y, previous_y), max(y, previous_y))
+            for line_y in range(low - 1, high + 1):
+                put(x, line_y, 3)
+            previous_y = y
+
+    if threshold:
+        y = y_of(threshold)
+        for x in range(margin, margin + plot_w):
+            if x % 8 < 5:
+                put(x, y, 4)
+    return encode_png(width, height, pixels, CHART_PALETTE)
+
+def _series_threshold(name):
+    return {"cpu": RESOURCE_CPU_ALERT_PERCENT, "mem": RESOURCE_MEM_ALERT_PERCENT,
+            "mspt": TICK_MSPT_ALERT_MS, "heap": JVM_OLD_GEN_ALERT_PERCENT}.get(name) or None
+
+def get_resource_chart(name, hours):
+    """Returns (png_bytes, caption), or (None, message) without data."""
+    label, unit = {n: (l, u) for n, l, u in RESOURCE_SERIES}[name]
+    points = get_resource_series(name, time.time() - hours * 3600)
+    if not points:
+        return None, f"📭 No {label} data for the last `{hours}h` yet."
+    values = [value for _, value in points]
+    png = render_chart_png(values, threshold=_series_threshold(name), ceiling=100 if name in ("cpu", "mem", "heap") and max(values) <= 100 else None)
+    caption = (
+        f"{label} last {hours}h: now `{values[-1]:.1f}{unit}`, "
+        f"min `{min(values):.1f}`, avg `{sum(values) / len(values):.1f}`, max `{max(values):.1f}`"
+    )
+    return png, caption
+
+def format_resource_sparklines(hours=1, width=24):
+    since = time.time() - hours * 3600
+    lines = [f"📈 *Resources* (last `{hours}h`, {format_duration(hours * 3600 / width)} per bar)"]
+    for name, label, unit in RESOURCE_SERIES:
+        values = [value for _, value in get_resource_series(name, since)]
+        if not values:
+            lines.append(f"{label}: _no data_")
+            continue
+        buckets = bucket_values(values, width, reduce=lambda chunk: sum(chunk) / len(chunk))
+        lines.append(
+            f"{label}: `{sparkline(buckets)}` now `{values[-1]:.1f}{unit}` "
+            f"(max `{max(values):.1f}`)"
+        )
+    return "\n".join(lines)
+
+def get_graph_keyboard():
+    return {"inline_keyboard": [[
+        {"text": label, "callback_data": f"graph:{name}"} for name, label, _unit in RESOURCE_SERIES
+    ]]}
+
+def check_resource_alerts(now=None):
+    """Alerts when every sample in the window is over a threshold. Returns messages."""
+    now = now or time.time()
+    window = RESOURCE_ALERT_WINDOW_MINUTES * 60
+    expected = window / RESOURCE_SAMPLE_SECONDS
+    messages = []
+    for name, label, unit in RESOURCE_SERIES:
+        threshold = {"cpu": RESOURCE_CPU_ALERT_PERCENT, "mem": RESOURCE_MEM_ALERT_PERCENT}.get(name)
+        # While heap/GC data is fresh the JVM monitor judges memory pressure instead
+        if name == "mem" and get_jvm_summary(now) is not None:
+            continue
+        if not threshold:
+            continue
+        values = [value for _, value in get_resource_series(name, now - window)]
+        # A window with gaps (restart, stopped server) is not "sustained"
+        if len(values) < expected * 0.8 or min(values) <= threshold:
+            continue
+        if now - resource_alert_state.get(name, 0) < RESOURCE_ALERT_COOLDOWN_SECONDS:
+            continue
+        resource_alert_state[name] = now
+        trend = [value for _, value in get_resource_series(name, now - 3600)]
+        messages.append(
+            f"⚠️ *High {label} Usage!*\n"
+            f"Above `{threshold}{unit}` for `{format_duration(window)}` (avg `{sum(values) / len(values):.1f}{unit}`)\n"
+            f"Last hour: `{sparkline(bucket_values(trend, 24))}`\n"
+            f"The server might lag. Consider restarting soon."
+        )
+    return messages
 
-        broadcast_message(backup_message)
-        time.sleep(interval_seconds)
+def sample_resources():
+    sample = sample_container_resources()
+    if not sample:
+        return
+    with presence_lock:
+        players = len(presence_sessions) if presence_state["synced"] else None
+    tick = get_tick_summary()
+    jvm = get_jvm_summary()
+    record_resource_sample(
+        time.time(),
+        cpu=sample["cpu_percent"],
+        mem=sample["mem_percent"],
+        players=players,
+        mspt=tick["mspt"] if tick else None,
+        heap=jvm["heap_used"] / jvm["heap_max"] * 100 if jvm and jvm["heap_max"] else None,
+    )
+    for msg in check_resource_alerts():
+        broadcast_message(msg)
 
+def run_scheduled_backup():
+    # Joins a manual backup if one is already running instead of starting a second
+    start_backup_job("schedule", broadcast=True)
+
+# Health state for auto-recovery: "healthy" -> "degraded" on a failed check,
+# "down" after HEALTH_DOWN_CHECKS failures in a row. Checks run every
+# HEALTH_DEGRADED_SECONDS while degraded and back off towards
+# AUTO_RECOVERY_CHECK_SECONDS while healthy.
+health_lock = threading.Lock()
+health_state = {"status": "healthy", "since": 0.0, "failures": 0, "successes": 0, "reason": ""}
+health_transitions = collections.deque(maxlen=50)
 
 def is_server_responsive():
-    """Checks whether the Minecraft service is running and responding to RCON."""
+    """Checks whether the Minecraft service is running and answering `list` over RCON."""
     try:
-        container_running = subprocess.check_output(
-            ["docker", "inspect", "-f", "{{.State.Running}}", CONTAINER_NAME],
-            timeout=5,
-        ).strip().decode().lower()
+        container_running = docker_output(["inspect", "-f", "{{.State.Running}}", CONTAINER_NAME], "inspect").lower()
     except (subprocess.SubprocessError, OSError) as e:
         return False, f"container inspect failed: {e}"
 
     if container_running != "true":
         return False, "container not running"
 
-    rcon_output = strip_ansi(rcon_command("list")).strip()
+    # Always a real probe: cached fail-fast results must not count toward "down".
+    # The outcome still feeds the breaker, so a success closes it early.
+    reached, rcon_output = rcon_probe("list", force=True)
+    rcon_output = strip_ansi(rcon_output).strip()
+    if not reached:
+        return False, rcon_output or "rcon-cli failed"
     if not rcon_output:
         return False, "empty RCON response"
-
-    lowered = rcon_output.lower()
-    bad_markers = ["error", "failed", "timeout", "connection refused"]
-    if any(marker in lowered for marker in bad_markers):
-        return False, rcon_output
-
     return True, "ok"
 
+def update_health(healthy, reason, now=None):
+    """Applies one check result. Returns (old_status, new_status)."""
+    now = now or time.time()
+    with health_lock:
+        old = health_state["status"]
+        if healthy:
+            health_state["failures"] = 0
+            health_state["successes"] += 1
+            new = "healthy"
+        else:
+            health_state["successes"] = 0
+            health_state["failures"] += 1
+            new = "down" if health_state["failures"] >= HEALTH_DOWN_CHECKS else "degraded"
+        health_state["reason"] = reason
+        if new != old:
+            health_state["status"] = new
+            health_state["since"] = now
+            health_transitions.append((now, old, new, reason))
+            print(f"Health: {old} -> {new} ({reason})")
+    return old, new
+
+def next_health_interval():
+    """Seconds until the next check: tight while degraded, relaxing while healthy."""
+    with health_lock:
+        status = health_state["status"]
+        successes = health_state["successes"]
+    if status == "degraded":
+        return HEALTH_DEGRADED_SECONDS
+    if status == "down":
+        return AUTO_RECOVERY_CHECK_SECONDS
+    return min(AUTO_RECOVERY_CHECK_SECONDS, HEALTH_DEGRADED_SECONDS * 2 ** min(successes, 10))
+
+def format_health_status():
+    """Status panel line while something is wrong, else None."""
+    lines = []
+    for name in ("docker", "rcon"):
+        message = breaker_open_message(name)
+        if message:
+            lines.append(f"⚡ {escape_markdown(message)}")
+    if AUTO_RECOVERY_ENABLED and health_state["status"] != "healthy":
+        lines.append(f"🩺 Health: `{health_state['status']}` ({escape_markdown(health_state['reason'])})")
+    return "\n".join(lines) or None
+
 
 def attempt_auto_recovery():
     """Attempts to restart and re-check health. Returns (ok, attempts, details)."""
@@ -1191,13 +5359,15 @@ def attempt_auto_recovery():
 
     for attempt in range(1, AUTO_RECOVERY_MAX_ATTEMPTS + 1):
         try:
-            subprocess.run(["docker", "restart", CONTAINER_NAME], check=True, timeout=60)
+            docker_run(["restart", CONTAINER_NAME], "restart", 60)
         except Exception as e:
             last_error = f"restart failed: {e}"
             if attempt < AUTO_RECOVERY_MAX_ATTEMPTS:
                 time.sleep(AUTO_RECOVERY_BACKOFF_SECONDS)
             continue
 
+        # Probe the fresh server right away instead of waiting out the breaker
+        breaker_reset("rcon")
         time.sleep(5)
         healthy, details = is_server_responsive()
         if healthy:
@@ -1210,80 +5380,515 @@ def attempt_auto_recovery():
     return False, AUTO_RECOVERY_MAX_ATTEMPTS, last_error or "unknown failure"
 
 
-def monitor_auto_recovery():
-    if not AUTO_RECOVERY_ENABLED:
-        print("Auto-recovery disabled (AUTO_RECOVERY_ENABLED=false).")
-        return
+def run_health_check(now=None):
+    """One check; restarts the server when it goes down. Returns seconds until the next check."""
+    # A server paused for idling is down on purpose
+    healthy, reason = (True, "paused") if idle_state["paused"] else is_server_responsive()
+    _old, new = update_health(healthy, reason, now)
+    if new != "down":
+        return next_health_interval()
 
-    print(
-        "Auto-recovery enabled "
-        f"(check={AUTO_RECOVERY_CHECK_SECONDS}s, attempts={AUTO_RECOVERY_MAX_ATTEMPTS}, "
-        f"backoff={AUTO_RECOVERY_BACKOFF_SECONDS}s)."
+    safe_reason = escape_markdown(reason)
+    broadcast_message(
+        "⚠️ *Auto-Recovery Triggered*\n"
+        f"Reason: `{safe_reason}`\n"
+        "Attempting automatic restart..."
     )
 
-    while True:
-        healthy, reason = is_server_responsive()
-        if not healthy:
-            safe_reason = escape_markdown(reason)
-            broadcast_message(
-                "⚠️ *Auto-Recovery Triggered*\n"
-                f"Reason: `{safe_reason}`\n"
-                "Attempting automatic restart..."
-            )
+    recovered, attempts, details = attempt_auto_recovery()
+    safe_details = escape_markdown(details)
+    if recovered:
+        update_health(True, details)
+        broadcast_message(
+            "✅ *Auto-Recovery Success*\n"
+            f"Recovered after `{attempts}` attempt(s)."
+        )
+    else:
+        broadcast_message(
+            "❌ *Auto-Recovery Failed*\n"
+            f"Attempts: `{attempts}`\n"
+            f"Details: `{safe_details}`"
+        )
+    return next_health_interval()
+
+
+# Scheduled tasks: cron expressions (local time) that run RCON commands,
+# stored in SCHEDULED_TASKS_FILE and edited with /task. Each task is armed
+# as one-shot scheduler jobs: optional countdown warnings before the run
+# time, then the run itself, which re-arms the next occurrence. Nothing
+# sleeps while waiting. Consecutive RCON commands share one rcon-cli
+# process; "!restart", "!stop" and "!backup" run bot actions in between.
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+TASK_ACTIONS = ("!restart", "!stop", "!backup")
+TASK_MAX_WARNING_MINUTES = 60
+tasks_lock = threading.Lock()
+task_store = {"next_id": 1, "tasks": []}
+task_armed = {}
+
+def parse_cron_field(field, low, high):
+    values = set()
+    for item in field.split(","):
+        base, slash, step = item.partition("/")
+        step = int(step) if slash else 1
+        if step < 1:
+            raise ValueError(f"bad step in {item!r}")
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(v) for v in base.split("-", 1))
+        else:
+            # "5/15" means every 15 starting at 5
+            start = int(base)
+            end = high if slash else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"{item!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_cron(expr):
+    """Parses "minute hour day month weekday" (or @daily etc.). Raises ValueError."""
+    expr = CRON_ALIASES.get(expr.strip().lower(), expr)
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError("expected 5 fields: minute hour day month weekday")
+    minutes, hours, days, months, weekdays = (
+        parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+    )
+    return {
+        "minutes": sorted(minutes),
+        "hours": sorted(hours),
+        "days": days,
+        "months": months,
+        "weekdays": {day % 7 for day in weekdays},
+        # Like cron: with both day fields restricted, either one matching is enough
+        "either_day": fields[2] != "*" and fields[4] != "*",
+    }
 
-            recovered, attempts, details = attempt_auto_recovery()
-            safe_details = escape_markdown(details)
-            if recovered:
-                broadcast_message(
-                    "✅ *Auto-Recovery Success*\n"
-                    f"Recovered after `{attempts}` attempt(s)."
-                )
-            else:
-                broadcast_message(
-                    "❌ *Auto-Recovery Failed*\n"
-                    f"Attempts: `{attempts}`\n"
-                    f"Details: `{safe_details}`"
-                )
+def _cron_day_matches(cron, day):
+    dom = day.day in cron["days"]
+    dow = (day.weekday() + 1) % 7 in cron["weekdays"]
+    return (dom or dow) if cron["either_day"] else (dom and dow)
+
+def cron_next(cron, after):
+    """Returns the first matching local time strictly after `after`, or None."""
+    start = datetime.datetime.fromtimestamp(after).replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    day = start.date()
+    # Four years covers schedules like "Feb 29"
+    for _ in range(366 * 4):
+        if day.month in cron["months"] and _cron_day_matches(cron, day):
+            for hour in cron["hours"]:
+                for minute in cron["minutes"]:
+                    candidate = datetime.datetime(day.year, day.month, day.day, hour, minute)
+                    if candidate >= start:
+                        return candidate.timestamp()
+        day += datetime.timedelta(days=1)
+    return None
+
+def parse_task_spec(spec):
+    """Parses "<cron> | <cmd>; <cmd> [| <warn minutes>] [| <label>]" into a task dict. Raises ValueError."""
+    fields = [field.strip() for field in spec.split("|")]
+    if len(fields) < 2 or not fields[0] or not fields[1]:
+        raise ValueError("expected `<cron> | <commands>`")
+    parse_cron(fields[0])
+    commands = [command.strip() for command in fields[1].split(";") if command.strip()]
+    for command in commands:
+        if command.startswith("!") and command not in TASK_ACTIONS:
+            raise ValueError(f"unknown action {command} (use {', '.join(TASK_ACTIONS)})")
+    warn = []
+    if len(fields) > 2 and fields[2]:
+        for item in fields[2].split(","):
+            if not item.strip().isdigit() or not 0 < int(item) <= TASK_MAX_WARNING_MINUTES:
+                raise ValueError(f"warnings are minutes between 1 and {TASK_MAX_WARNING_MINUTES}")
+            warn.append(int(item))
+    label = fields[3] if len(fields) > 3 and fields[3] else None
+    if label is None:
+        label = next(({"!restart": "Server restart", "!stop": "Server stop", "!backup": "Backup"}[c]
+                      for c in commands if c in TASK_ACTIONS), "Scheduled task")
+    return {
+        "cron": fields[0],
+        "commands": commands,
+        "warn": sorted(set(warn), reverse=True),
+        "label": label,
+        "enabled": True,
+        "last_run": None,
+        "last_result": None,
+    }
+
+def load_tasks(path=None):
+    path = path or SCHEDULED_TASKS_FILE
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {path}: {e}")
+        data = {}
+    with tasks_lock:
+        task_store["tasks"] = data.get("tasks", [])
+        task_store["next_id"] = data.get("next_id", 1 + max([t["id"] for t in task_store["tasks"]] or [0]))
+    return task_store["tasks"]
+
+def save_tasks(path=None):
+    path = path or SCHEDULED_TASKS_FILE
+    with tasks_lock:
+        data = json.dumps(task_store, indent=2)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def get_task(task_id):
+    with tasks_lock:
+        return next((task for task in task_store["tasks"] if task["id"] == task_id), None)
+
+def add_task(task):
+    with tasks_lock:
+        task["id"] = task_store["next_id"]
+        task_store["next_id"] += 1
+        task_store["tasks"].append(task)
+    save_tasks()
+    arm_task(task)
+    return task
+
+def remove_task(task_id):
+    disarm_task(task_id)
+    with tasks_lock:
+        before = len(task_store["tasks"])
+        task_store["tasks"] = [task for task in task_store["tasks"] if task["id"] != task_id]
+        removed = len(task_store["tasks"]) != before
+    if removed:
+        save_tasks()
+    return removed
+
+def set_task_enabled(task_id, enabled):
+    task = get_task(task_id)
+    if task is None:
+        return None
+    task["enabled"] = enabled
+    save_tasks()
+    arm_task(task)
+    return task
+
+def build_warning_commands(label, minutes):
+    text = f"{label} in {minutes} minute{'s' if minutes != 1 else ''}"
+    return [
+        "title @a times 10 70 20",
+        "title @a title " + json.dumps({"text": text, "color": "gold", "bold": True}),
+        "tellraw @a " + json.dumps([{"text": "[Server] ", "color": "gold"}, {"text": text, "color": "yellow"}]),
+    ]
+
+def run_task_action(action):
+    if action == "!restart":
+        return restart_server()
+    if action == "!stop":
+        return stop_server()
+    if action == "!backup":
+        _job, started = start_backup_job("task", broadcast=True)
+        return "💾 Backup started." if started else "💾 Joined the running backup."
+    return f"Error: unknown action {action}"
+
+def run_task_commands(commands):
+    """Runs commands in order, batching consecutive RCON commands. Returns [(command, output)]."""
+    results = []
+    pending = []
+    for command in commands + [None]:
+        if (command is None or command.startswith("!")) and pending:
+            results.extend(zip(pending, rcon_batch(pending)))
+            pending = []
+        if command is None:
+            break
+        if command.startswith("!"):
+            results.append((command, run_task_action(command)))
+        else:
+            pending.append(command)
+    return results
+
+def _task_output_failed(output):
+    clean = strip_ansi(output or "")
+    return clean.startswith(("Error", "⚠️ Error", "❌")) or "Unknown or incomplete command" in clean
+
+def execute_task(task_id):
+    """Runs a task now and records the outcome. Returns [(command, output)] or None."""
+    task = get_task(task_id)
+    if task is None:
+        return None
+    if idle_state["paused"] or not is_container_running():
+        task["last_result"] = "skipped: server not running"
+        results = None
+    else:
+        results = run_task_commands(task["commands"])
+        failed = [(command, output) for command, output in results if _task_output_failed(output)]
+        task["last_result"] = "ok" if not failed else f"{len(failed)} failed"
+        if failed:
+            details = "\n".join(f"`{escape_markdown(c)}`: {escape_markdown(strip_ansi(o))}" for c, o in failed[:5])
+            broadcast_message(f"⚠️ *Task #{task_id} ({escape_markdown(task['label'])}) had errors:*\n{details}")
+    task["last_run"] = time.time()
+    save_tasks()
+    return results
+
+def warn_task(task_id, minutes):
+    task = get_task(task_id)
+    if task and is_container_running():
+        rcon_batch(build_warning_commands(task["label"], minutes))
+
+def fire_task(task_id, at):
+    try:
+        execute_task(task_id)
+    finally:
+        task = get_task(task_id)
+        if task:
+            arm_task(task, now=max(time.time(), at))
+
+def disarm_task(task_id):
+    armed = task_armed.pop(task_id, None)
+    for name in (armed or {}).get("jobs", []):
+        cancel_job(name)
+
+def arm_task(task, now=None):
+    """Schedules the task's next run and its warnings. Returns the run time or None."""
+    disarm_task(task["id"])
+    if not task["enabled"]:
+        return None
+    now = now or time.time()
+    try:
+        at = cron_next(parse_cron(task["cron"]), now)
+    except ValueError as e:
+        print(f"Task #{task['id']} has a bad cron expression: {e}")
+        return None
+    if at is None:
+        return None
+    task_id = task["id"]
+    names = []
+    for minutes in task["warn"]:
+        if at - minutes * 60 > now:
+            name = f"task:{task_id}:warn{minutes}"
+            schedule_once(name, at - minutes * 60 - now, lambda m=minutes: warn_task(task_id, m), now=now)
+            names.append(name)
+    name = f"task:{task_id}:run"
+    schedule_once(name, at - now, lambda: fire_task(task_id, at), now=now)
+    names.append(name)
+    task_armed[task_id] = {"at": at, "jobs": names}
+    return at
+
+def arm_all_tasks():
+    tasks = load_tasks()
+    for task in tasks:
+        arm_task(task)
+    return len(tasks)
+
+def format_tasks(now=None):
+    now = now or time.time()
+    with tasks_lock:
+        tasks = [dict(task) for task in task_store["tasks"]]
+    if not tasks:
+        return (
+            "🗓️ No scheduled tasks.\n"
+            "Add one with `/task add <cron> | <commands> [| <warn minutes>] [| <label>]`, e.g.\n"
+            "`/task add 0 4 * * * | save-all; !restart | 5,1`"
+        )
+    lines = ["🗓️ *Scheduled Tasks:*"]
+    for task in tasks:
+        armed = task_armed.get(task["id"])
+        if not task["enabled"]:
+            state = "⏸️ off"
+        elif armed:
+            state = f"next `{time.strftime('%a %H:%M', time.localtime(armed['at']))}` (in {format_duration(armed['at'] - now)})"
+        else:
+            state = "⚠️ not scheduled"
+        lines.append(f"\n*#{task['id']}* {escape_markdown(task['label'])} - `{task['cron']}` - {state}")
+        lines.append(f"   `{escape_markdown('; '.join(task['commands']))}`")
+        if task["warn"]:
+            lines.append(f"   ⏳ warns {', '.join(str(m) for m in task['warn'])} min before")
+        if task["last_run"]:
+            lines.append(f"   Last: {format_duration(now - task['last_run'])} ago, {escape_markdown(task['last_result'])}")
+    return "\n".join(lines)
+
+def handle_task_command(chat_id, text):
+    """/task add|del|on|off|run ... (owner only, since tasks run raw RCON commands)."""
+    parts = text.split(None, 2)
+    sub = parts[1].lower() if len(parts) > 1 else ""
+    usage = (
+        "⚠️ Usage:\n"
+        "`/task add <cron> | <cmd>; <cmd> [| <warn minutes>] [| <label>]`\n"
+        "`/task del|on|off|run <id>`"
+    )
+    if sub == "add":
+        try:
+            task = add_task(parse_task_spec(parts[2] if len(parts) > 2 else ""))
+        except ValueError as e:
+            send_message(chat_id, f"❌ {escape_markdown(e)}\n\n{usage}")
+            return
+        send_message(chat_id, f"✅ Task *#{task['id']}* added.\n\n{format_tasks()}")
+        return
+
+    task_id = parts[2].lstrip("#") if len(parts) > 2 else ""
+    if sub not in ("del", "on", "off", "run") or not task_id.isdigit():
+        send_message(chat_id, usage)
+        return
+    task_id = int(task_id)
+    if get_task(task_id) is None:
+        send_message(chat_id, f"❓ No task `#{task_id}`.")
+        return
+    if sub == "del":
+        remove_task(task_id)
+        send_message(chat_id, f"🗑️ Task *#{task_id}* deleted.")
+    elif sub in ("on", "off"):
+        set_task_enabled(task_id, sub == "on")
+        send_message(chat_id, format_tasks())
+    else:
+        # Runs on a scheduler worker right away, without the countdown
+        schedule_once(f"task:{task_id}:manual", 0, lambda: execute_task(task_id))
+        send_message(chat_id, f"▶️ Running task *#{task_id}* now.")
+
+def register_jobs():
+    """Schedules every periodic monitor that is enabled."""
+    schedule_job("resources", sample_resources, RESOURCE_SAMPLE_SECONDS, first_delay=0)
+    schedule_job("presence", check_presence, PRESENCE_RECONCILE_SECONDS, first_delay=0)
+    print(f"Resource sampling every {RESOURCE_SAMPLE_SECONDS}s, presence reconcile every {PRESENCE_RECONCILE_SECONDS}s.")
+
+    if BACKUP_SCHEDULE_MINUTES > 0:
+        # The first run waits a full interval to avoid a backup on every restart
+        schedule_job("backup", run_scheduled_backup, BACKUP_SCHEDULE_MINUTES * 60, jitter=0)
+        print(f"Scheduled backups enabled every {BACKUP_SCHEDULE_MINUTES} minute(s).")
+    else:
+        print("Scheduled backups disabled (BACKUP_SCHEDULE_MINUTES <= 0).")
+
+    if AUTO_RECOVERY_ENABLED:
+        schedule_job("recovery", run_health_check, AUTO_RECOVERY_CHECK_SECONDS, jitter=0)
+        print(
+            "Auto-recovery enabled "
+            f"(check={HEALTH_DEGRADED_SECONDS}-{AUTO_RECOVERY_CHECK_SECONDS}s, down after {HEALTH_DOWN_CHECKS} "
+            f"failed checks, attempts={AUTO_RECOVERY_MAX_ATTEMPTS}, backoff={AUTO_RECOVERY_BACKOFF_SECONDS}s)."
+        )
+    else:
+        print("Auto-recovery disabled (AUTO_RECOVERY_ENABLED=false).")
+
+    if PLAYTIME_SAMPLE_MINUTES > 0:
+        schedule_job("playtime", sample_playtime_history, PLAYTIME_SAMPLE_MINUTES * 60, first_delay=0)
+        print(f"Playtime history sampling every {PLAYTIME_SAMPLE_MINUTES} minute(s).")
+    else:
+        print("Playtime history disabled (PLAYTIME_SAMPLE_MINUTES <= 0).")
+
+    if TICK_MONITOR_SECONDS > 0:
+        schedule_job("tick", sample_tick_health, max(TICK_MONITOR_SECONDS, 5))
+        print(f"Tick monitor every {max(TICK_MONITOR_SECONDS, 5)}s.")
+    else:
+        print("Tick monitor disabled (TICK_MONITOR_SECONDS <= 0).")
+
+    if JVM_MONITOR_SECONDS > 0:
+        schedule_job("jvm", check_jvm_health, max(JVM_MONITOR_SECONDS, 10))
+        print(f"JVM monitor every {max(JVM_MONITOR_SECONDS, 10)}s ({'GC log' if JVM_GC_LOG else 'jstat'}).")
+    else:
+        print("JVM monitor disabled (JVM_MONITOR_SECONDS <= 0).")
+
+    if LAG_DIGEST_ENABLED:
+        schedule_job("lag_digest", send_lag_digest, 3600, first_delay=seconds_to_next_hour(), jitter=0)
+    else:
+        print("Lag digest disabled (LAG_DIGEST_ENABLED=false).")
+
+    if GOVERNOR_ENABLED:
+        if (GOVERNOR_VIEW_COMMAND or GOVERNOR_SIMULATION_COMMAND) and TICK_MONITOR_SECONDS > 0:
+            schedule_job("governor", run_governor_check, max(TICK_MONITOR_SECONDS, 5))
+        else:
+            print("Governor needs GOVERNOR_VIEW_COMMAND/GOVERNOR_SIMULATION_COMMAND and the tick monitor.")
 
-        time.sleep(AUTO_RECOVERY_CHECK_SECONDS)
+    count = arm_all_tasks()
+    if count:
+        print(f"Armed {count} scheduled task(s) from {SCHEDULED_TASKS_FILE}.")
 
+    if IDLE_STOP_MINUTES > 0:
+        schedule_job("idle", check_idle, IDLE_CHECK_SECONDS)
+        print(f"Idle auto-pause after {IDLE_STOP_MINUTES} min empty.")
+    else:
+        print("Idle auto-pause disabled (IDLE_STOP_MINUTES <= 0).")
 
 def main():
     print("Bot Premium V9 (Chat Toggle + Resource Monitor) started...")
     
-    # Log Monitor Thread
-    t_log = threading.Thread(target=monitor_logs, daemon=True)
-    t_log.start()
-    
-    # Resource Monitor Thread
-    t_res = threading.Thread(target=monitor_resources, daemon=True)
-    t_res.start()
-
-    # Scheduled Backup Monitor Thread
-    t_backup = threading.Thread(target=monitor_scheduled_backups, daemon=True)
-    t_backup.start()
+    signal.signal(signal.SIGTERM, handle_shutdown_signal)
+    load_idle_state()
+    supervise("log", monitor_logs)
+    register_jobs()
+    start_scheduler()
+    start_metrics_server()
 
-    # Auto-Recovery Monitor Thread
-    t_recovery = threading.Thread(target=monitor_auto_recovery, daemon=True)
-    t_recovery.start()
-    
+    try:
+        poll_updates()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        if not shutdown():
+            # Pool workers are not daemon threads; exiting normally would wait for the stuck job
+            os._exit(1)
+
+def poll_updates():
     last_update_id = None
-    
-    while True:
+    while not shutdown_event.is_set():
         try:
             # Long polling: 30s timeout in payload, 40s network timeout
-            updates = send_request("getUpdates", {"offset": last_update_id, "timeout": 30}, timeout=40)
+            polling_state["idle"] = True
+            try:
+                updates = send_request("getUpdates", {"offset": last_update_id, "timeout": 30}, timeout=40)
+            finally:
+                polling_state["idle"] = False
             if updates and "result" in updates:
                 for u in updates["result"]:
                     last_update_id = u["update_id"] + 1
                     
                     if "message" in u:
-                        handle_text(u["message"])
+                        text = u["message"].get("text", "")
+                        kind = "command" if text.startswith("/") else ("document" if "document" in u["message"] else "text")
+                        with metric_timer("minecraft_bot_handler_seconds", kind=kind):
+                            handle_text(u["message"])
                     elif "callback_query" in u:
-                        handle_callback(u["callback_query"])
+                        # Label by prefix only ("manage:~1a" -> "manage") to keep cardinality bounded
+                        kind = "callback_" + u["callback_query"].get("data", "").split(":", 1)[0]
+                        with metric_timer("minecraft_bot_handler_seconds", kind=kind):
+                            handle_callback(u["callback_query"])
         except Exception as e:
             print(f"Loop error: {e}")
-            time.sleep(5)
+            shutdown_event.wait(5)
+
+# SIGTERM (docker stop) lets the current update finish; only an idle
+# long poll is interrupted right away.
+polling_state = {"idle": False}
+
+def handle_shutdown_signal(signum, _frame):
+    print(f"Received signal {signum}, shutting down...")
+    shutdown_event.set()
+    if polling_state["idle"]:
+        raise SystemExit(0)
+
+def shutdown():
+    """Cancels a running backup, stops jobs and ends the log stream.
+
+    Everything shares one SHUTDOWN_TIMEOUT_SECONDS deadline. Returns False
+    if a job or the backup was still running when it passed.
+    """
+    deadline = time.time() + SHUTDOWN_TIMEOUT_SECONDS
+    shutdown_event.set()
+    # Cancel first so the backup winds down while jobs drain
+    job = backup_jobs["current"]
+    cancelling = job is not None and cancel_backup_job()
+    if cancelling:
+        print("Shutdown: cancelling running backup...")
+    clean = stop_scheduler(timeout=max(deadline - time.time(), 0))
+    if cancelling and not job["done"].wait(max(deadline - time.time(), 0)):
+        print("Shutdown: backup did not stop in time.")
+        clean = False
+    process = log_stream["process"]
+    if process and process.poll() is None:
+        process.terminate()
+    print("Bot stopped.", flush=True)
+    return clean
 
 if __name__ == "__main__":
     main()
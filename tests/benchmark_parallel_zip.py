@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from unittest.mock import MagicMock
+
+# Ensure scripts can be imported
+if os.getcwd() not in sys.path:
+    sys.path.append(os.getcwd())
+
+# Mock dependencies before importing the script
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts.minecraft_bot import write_parallel_zip
+
+FILES = 48
+FILE_SIZE = 2 * 1024 * 1024
+
+
+def make_source(src_dir):
+    """Half random, half repetitive data, roughly like region files."""
+    os.makedirs(os.path.join(src_dir, "region"))
+    pattern = bytes(range(256)) * 16
+    for i in range(FILES):
+        with open(os.path.join(src_dir, "region", f"r.{i}.0.mca"), "wb") as f:
+            f.write(os.urandom(FILE_SIZE // 2))
+            f.write(pattern * (FILE_SIZE // 2 // len(pattern)))
+
+
+def run_benchmark():
+    cpu = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cpu})
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "world")
+        make_source(src)
+        total_mb = FILES * FILE_SIZE / 1e6
+        print(f"Source: {FILES} files, {total_mb:.0f} MB (host has {cpu} CPU(s))\n")
+
+        start = time.perf_counter()
+        with zipfile.ZipFile(os.path.join(tmp, "baseline.zip"), "w", zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+            for name in sorted(os.listdir(os.path.join(src, "region"))):
+                zf.write(os.path.join(src, "region", name), f"region/{name}")
+        baseline = time.perf_counter() - start
+        print(f"{'zipfile (1 thread)':<22} {baseline:7.2f}s  {total_mb / baseline:7.1f} MB/s")
+
+        for workers in counts:
+            stats = write_parallel_zip(src, os.path.join(tmp, f"parallel-{workers}.zip"), workers=workers, level=6)
+            rate = total_mb / stats["duration"]
+            print(f"{f'parallel x{workers}':<22} {stats['duration']:7.2f}s  {rate:7.1f} MB/s  ({rate / workers:.1f} MB/s per worker)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
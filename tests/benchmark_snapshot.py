@@ -0,0 +1,94 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+# Ensure scripts can be imported
+if os.getcwd() not in sys.path:
+    sys.path.append(os.getcwd())
+
+# Mock dependencies before importing the script
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts.minecraft_bot import create_snapshot
+
+REGIONS = 24
+CHUNKS_PER_REGION = 256
+TOUCHED_REGIONS = 4
+TOUCHED_CHUNKS = 8
+
+
+def build_region(chunks):
+    """Builds an Anvil region file from {slot: (timestamp, payload_bytes)}."""
+    header = bytearray(8192)
+    body = bytearray()
+    sector = 2
+    for slot, (timestamp, payload) in sorted(chunks.items()):
+        count = (len(payload) + 4095) // 4096
+        header[slot * 4:slot * 4 + 4] = sector.to_bytes(3, "big") + bytes([count])
+        header[4096 + slot * 4:4096 + slot * 4 + 4] = timestamp.to_bytes(4, "big")
+        body += payload.ljust(count * 4096, b"\0")
+        sector += count
+    return bytes(header + body)
+
+
+def random_chunk():
+    return os.urandom(random.randint(2000, 9000))
+
+
+def make_world(world_dir):
+    regions = {}
+    os.makedirs(os.path.join(world_dir, "region"))
+    for r in range(REGIONS):
+        chunks = {i: (1000, random_chunk()) for i in range(CHUNKS_PER_REGION)}
+        regions[r] = chunks
+        with open(os.path.join(world_dir, "region", f"r.{r}.0.mca"), "wb") as f:
+            f.write(build_region(chunks))
+    with open(os.path.join(world_dir, "level.dat"), "wb") as f:
+        f.write(os.urandom(4096))
+    return regions
+
+
+def touch_world(world_dir, regions):
+    """Simulates a play session: a few chunks in a few regions get re-saved."""
+    for r in random.sample(sorted(regions), TOUCHED_REGIONS):
+        chunks = regions[r]
+        for slot in random.sample(sorted(chunks), TOUCHED_CHUNKS):
+            chunks[slot] = (chunks[slot][0] + 1, chunks[slot][1][:-64] + os.urandom(64))
+        with open(os.path.join(world_dir, "region", f"r.{r}.0.mca"), "wb") as f:
+            f.write(build_region(chunks))
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f}s")
+    return elapsed, result
+
+
+def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp:
+        world = os.path.join(tmp, "world")
+        store = os.path.join(tmp, "store")
+        regions = make_world(world)
+        size_mb = sum(os.path.getsize(os.path.join(world, "region", n)) for n in os.listdir(os.path.join(world, "region"))) / 1e6
+        print(f"Synthetic world: {REGIONS} region files, {size_mb:.1f} MB")
+        print(f"Touched per run: {TOUCHED_REGIONS} regions x {TOUCHED_CHUNKS} chunks\n")
+
+        full_copy, _ = timed("Full copy (copytree)", lambda: shutil.copytree(world, os.path.join(tmp, "copy")))
+        timed("First snapshot", lambda: create_snapshot(world, store))
+
+        touch_world(world, regions)
+        incremental, manifest = timed("Incremental snapshot", lambda: create_snapshot(world, store))
+        print(f"\nNew chunks stored: {manifest['new_chunks']} ({manifest['new_bytes'] / 1e6:.2f} MB)")
+        if incremental > 0:
+            print(f"Speedup vs full copy: {full_copy / incremental:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,217 @@
+import errno
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+def make_world(root):
+    (root / "region").mkdir(parents=True)
+    (root / "region" / "r.0.0.mca").write_bytes(os.urandom(300 * 1024))
+    (root / "level.dat").write_bytes(b"level-data")
+    (root / "session.lock").write_bytes(b"lock")
+
+
+def test_snapshot_dedupes_and_restores(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "BACKUP_CHUNK_SIZE", 64 * 1024)
+    world = tmp_path / "world"
+    store = str(tmp_path / "store")
+    make_world(world)
+
+    first = bot.create_snapshot(str(world), store)
+    assert first["file_count"] == 2
+    assert first["new_chunks"] == 6
+
+    # Append to one file: only the tail chunk is new
+    with open(world / "region" / "r.0.0.mca", "ab") as f:
+        f.write(b"x" * 10)
+    second = bot.create_snapshot(str(world), store)
+    assert second["new_chunks"] == 1
+    assert bot.list_snapshots(store) == [first["id"], second["id"]]
+
+    target = tmp_path / "restore"
+    assert bot.restore_snapshot(second["id"], str(target), store) == 2
+    assert (target / "region" / "r.0.0.mca").read_bytes() == (world / "region" / "r.0.0.mca").read_bytes()
+    assert (target / "level.dat").read_bytes() == b"level-data"
+    assert not (target / "session.lock").exists()
+
+
+def test_unchanged_files_are_not_reread(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    store = str(tmp_path / "store")
+    make_world(world)
+    bot.create_snapshot(str(world), store)
+
+    monkeypatch.setattr(bot, "store_chunk", MagicMock(side_effect=AssertionError("re-read")))
+    manifest = bot.create_snapshot(str(world), store)
+
+    assert manifest["new_chunks"] == 0
+    assert manifest["file_count"] == 2
+
+
+def test_retention_and_gc_remove_unreferenced_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "BACKUP_CHUNK_SIZE", 64 * 1024)
+    world = tmp_path / "world"
+    store = str(tmp_path / "store")
+    make_world(world)
+    bot.create_snapshot(str(world), store)
+
+    (world / "region" / "r.0.0.mca").write_bytes(os.urandom(100 * 1024))
+    latest = bot.create_snapshot(str(world), store)
+
+    monkeypatch.setattr(bot, "BACKUP_ENGINE", "builtin")
+    monkeypatch.setattr(bot, "BACKUP_STORE_DIR", store)
+    monkeypatch.setattr(bot, "BACKUP_RETENTION_COUNT", 1)
+
+    assert bot.apply_backup_retention() == 1
+    assert bot.list_snapshots(store) == [latest["id"]]
+    assert bot.gc_chunks(store) == (0, 0)
+
+    target = tmp_path / "restore"
+    bot.restore_snapshot(latest["id"], str(target), store)
+    assert (target / "region" / "r.0.0.mca").read_bytes() == (world / "region" / "r.0.0.mca").read_bytes()
+
+
+def test_run_backup_blocking_uses_builtin_engine(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    make_world(world)
+    monkeypatch.setattr(bot, "BACKUP_ENGINE", "builtin")
+    monkeypatch.setattr(bot, "WORLD_DIR", str(world))
+    monkeypatch.setattr(bot, "BACKUP_STORE_DIR", str(tmp_path / "store"))
+
+    ok, msg = bot.run_backup_blocking()
+
+    assert ok is True
+    assert "Snapshot" in msg
+
+
+def build_region(chunks):
+    """Builds an Anvil region file from {slot: (timestamp, payload_bytes)}."""
+    header = bytearray(8192)
+    body = bytearray()
+    sector = 2
+    for slot, (timestamp, payload) in sorted(chunks.items()):
+        count = (len(payload) + 4095) // 4096
+        header[slot * 4:slot * 4 + 4] = sector.to_bytes(3, "big") + bytes([count])
+        header[4096 + slot * 4:4096 + slot * 4 + 4] = timestamp.to_bytes(4, "big")
+        body += payload.ljust(count * 4096, b"\0")
+        sector += count
+    return bytes(header + body)
+
+
+def test_region_snapshot_reads_only_changed_chunks(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    (world / "region").mkdir(parents=True)
+    store = str(tmp_path / "store")
+    chunks = {i: (1000, os.urandom(5000)) for i in range(8)}
+    region_file = world / "region" / "r.0.0.mca"
+    region_file.write_bytes(build_region(chunks))
+
+    first = bot.create_snapshot(str(world), store)
+    assert "region" in first["files"]["region/r.0.0.mca"]
+    assert first["new_chunks"] == 10  # 8 chunks + header + slot table
+
+    # Rewrite one chunk with a new timestamp, keep the others byte-identical
+    chunks[3] = (2000, os.urandom(5000))
+    region_file.write_bytes(build_region(chunks))
+    os.utime(region_file, ns=(1, 1))
+
+    stored = []
+    real_store = bot.store_chunk
+    monkeypatch.setattr(bot, "store_chunk", lambda d, data: stored.append(len(data)) or real_store(d, data))
+    second = bot.create_snapshot(str(world), store)
+
+    # Header + slot table + the one changed chunk (2 sectors)
+    assert sorted(stored) == [8192, 8192, 32768]
+    assert second["new_chunks"] == 3
+
+    target = tmp_path / "restore"
+    bot.restore_snapshot(second["id"], str(target), store)
+    assert (target / "region" / "r.0.0.mca").read_bytes() == region_file.read_bytes()
+    assert bot.gc_chunks(store) == (0, 0)
+
+
+def test_consistent_snapshot_coordinates_saves(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    make_world(world)
+    store = str(tmp_path / "store")
+    calls = []
+
+    monkeypatch.setattr(bot, "BACKUP_SAVE_COORDINATION", True)
+    monkeypatch.setattr(bot, "is_container_running", lambda: True)
+    monkeypatch.setattr(bot, "rcon_batch", lambda cmds: calls.append(list(cmds)) or ["Automatic saving is now disabled", "Saved the game"])
+    monkeypatch.setattr(bot, "rcon_command", lambda cmd: calls.append(cmd) or "Automatic saving is now enabled")
+
+    manifest, info = bot.run_consistent_snapshot(str(world), store)
+
+    assert calls == [["save-off", "save-all flush"], "save-on"]
+    assert info["save_confirmed"] is True
+    assert manifest["file_count"] == 2
+    assert manifest["source"] == str(world)
+    assert not (tmp_path / ".backup-staging").exists()
+
+
+def test_consistent_snapshot_stages_only_changed_files(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    make_world(world)
+    store = str(tmp_path / "store")
+    monkeypatch.setattr(bot, "is_container_running", lambda: False)
+    bot.run_consistent_snapshot(str(world), store)
+
+    (world / "level.dat").write_bytes(b"level-data-v2")
+    manifest, info = bot.run_consistent_snapshot(str(world), store)
+
+    assert sum(info["methods"].values()) == 1
+    assert manifest["file_count"] == 2
+
+    target = tmp_path / "restore"
+    bot.restore_snapshot(manifest["id"], str(target), store)
+    assert (target / "level.dat").read_bytes() == b"level-data-v2"
+    assert (target / "region" / "r.0.0.mca").read_bytes() == (world / "region" / "r.0.0.mca").read_bytes()
+
+
+def test_flush_world_saves_waits_for_log_line(monkeypatch):
+    monkeypatch.setattr(bot, "rcon_batch", lambda cmds: ["Automatic saving is now disabled", "Saving the game"])
+
+    def saved_later():
+        bot.time.sleep(0.05)
+        bot.notify_log_waiters("[12:00:00] [Server thread/INFO]: Saved the game")
+
+    bot.threading.Thread(target=saved_later).start()
+    assert bot.flush_world_saves(timeout=2) is True
+    assert bot.log_waiters == []
+
+
+def test_stage_dir_must_not_overlap_world_or_backups(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    make_world(world)
+    monkeypatch.setattr(bot, "BACKUP_DIR", str(tmp_path / "backups"))
+    monkeypatch.setattr(bot, "BACKUP_STORE_DIR", str(tmp_path / "backups" / "store"))
+
+    for stage in (tmp_path, world, world / "stage", tmp_path / "backups", tmp_path / "backups" / "store" / "x"):
+        with pytest.raises(ValueError, match="Refusing"):
+            bot.stage_world(str(world), str(stage), {})
+    assert (world / "level.dat").exists()
+
+    bot.stage_world(str(world), str(tmp_path / "backups" / ".staging"), {})
+
+
+def test_stage_world_fails_on_copy_errors(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    make_world(world)
+
+    def disk_full(src, dst, allow_copy=True):
+        if src.endswith("level.dat"):
+            raise FileNotFoundError(src)
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(bot, "clone_file", disk_full)
+    with pytest.raises(OSError, match="No space"):
+        bot.stage_world(str(world), str(tmp_path / "stage"), {})
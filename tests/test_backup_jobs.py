@@ -0,0 +1,119 @@
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+def quiet_job_env(monkeypatch):
+    monkeypatch.setattr(bot, "edit_message", MagicMock())
+    monkeypatch.setattr(bot, "broadcast_message", MagicMock())
+    monkeypatch.setattr(bot, "apply_backup_retention", lambda: 0)
+    monkeypatch.setattr(bot, "BACKUP_VERIFY_ENABLED", False)
+    monkeypatch.setattr(bot, "backup_jobs", {"current": None, "next_id": 1})
+    monkeypatch.setattr(bot, "backup_job_history", bot.collections.deque(maxlen=20))
+
+
+def test_duplicate_requests_coalesce_into_one_job(monkeypatch):
+    quiet_job_env(monkeypatch)
+    release = threading.Event()
+    calls = []
+
+    def fake_backup():
+        calls.append(1)
+        release.wait(5)
+        return True, "✅ done"
+
+    monkeypatch.setattr(bot, "run_backup_blocking", fake_backup)
+
+    job, started = bot.start_backup_job("manual", watcher=(1, 10))
+    again, started_again = bot.start_backup_job("schedule", watcher=(2, 20), broadcast=True)
+    assert started and not started_again
+    assert again is job
+    assert job["watchers"] == [(1, 10), (2, 20)]
+
+    release.set()
+    assert job["done"].wait(5)
+    assert calls == [1]
+    assert job["result"] == (True, "✅ done")
+    assert bot.backup_jobs["current"] is None
+    assert bot.backup_job_history[0]["status"] == "ok"
+    assert bot.edit_message.call_count >= 2
+    bot.broadcast_message.assert_called_once()
+
+
+def test_cancel_stops_job_at_next_progress_checkpoint(monkeypatch):
+    quiet_job_env(monkeypatch)
+    entered = threading.Event()
+
+    def fake_backup():
+        bot.backup_phase("hashing", 1000, 1000)
+        entered.set()
+        for _ in range(500):
+            bot.backup_progress(1, 1)
+            time.sleep(0.01)
+        return True, "✅ done"
+
+    monkeypatch.setattr(bot, "run_backup_blocking", fake_backup)
+
+    job, _ = bot.start_backup_job("manual")
+    assert entered.wait(5)
+    assert bot.cancel_backup_job()
+    assert job["done"].wait(5)
+    assert job["result"][0] is False
+    assert bot.backup_job_history[0]["status"] == "cancelled"
+    assert not bot.cancel_backup_job()
+
+
+def test_progress_hooks_ignore_callers_outside_the_job(monkeypatch):
+    quiet_job_env(monkeypatch)
+    # No job running: hooks are no-ops so the engines stay usable directly
+    bot.backup_phase("hashing", 10, 10)
+    bot.backup_progress(1, 1)
+    assert not bot.backup_cancel_requested()
+
+
+def test_format_backup_progress_reports_eta(monkeypatch):
+    quiet_job_env(monkeypatch)
+    job = {
+        "id": 3, "trigger": "manual", "engine": "builtin", "started": 100.0,
+        "phase": "hashing", "phase_started": 100.0, "files_done": 5, "files_total": 10,
+        "bytes_done": 500, "bytes_total": 1000, "cancel": threading.Event(),
+    }
+    text = bot.format_backup_progress(job, now=110.0)
+    assert "`5/10`" in text
+    assert "(50%)" in text
+    assert "ETA `10s`" in text
+
+
+def test_script_engine_kills_process_on_cancel(monkeypatch, tmp_path):
+    quiet_job_env(monkeypatch)
+    script = tmp_path / "backup.sh"
+    pid_file = tmp_path / "pid"
+    script.write_text(f"#!/bin/sh\necho $$ > {pid_file}\nexec sleep 60\n")
+    script.chmod(0o755)
+    monkeypatch.setattr(bot, "BACKUP_ENGINE", "script")
+    monkeypatch.setattr(bot, "BACKUP_SCRIPT", str(script))
+    monkeypatch.setattr(bot, "BACKUP_SAVE_COORDINATION", False)
+
+    job, _ = bot.start_backup_job("manual")
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text().strip():
+            break
+        time.sleep(0.05)
+    bot.cancel_backup_job()
+    assert job["done"].wait(10)
+    assert job["result"][0] is False
+
+    pid = int(pid_file.read_text())
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            state = f.read().split(")")[-1].split()[0]
+    except FileNotFoundError:
+        state = "gone"
+    assert state in ("gone", "Z", "X")
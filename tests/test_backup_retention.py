@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+HOUR = 3600
+
+
+def policy(**overrides):
+    base = {"latest": 0, "hourly": 0, "daily": 0, "weekly": 0, "monthly": 0, "max_bytes": 0}
+    base.update(overrides)
+    return base
+
+
+def hourly_entries(count, start, size=10):
+    """Newest-first entries, one per hour."""
+    return [(f"b{i}.zip", f"/b/b{i}.zip", start - i * HOUR, size) for i in range(count)]
+
+
+def test_gfs_keeps_newest_per_bucket():
+    now = time.mktime((2026, 10, 19, 23, 30, 0, 0, 0, -1))
+    entries = hourly_entries(24 * 10, now)
+
+    keep, delete = bot.plan_backup_retention(entries, policy(hourly=3, daily=5))
+    kept = {e[0]: reasons for e, reasons in keep}
+
+    # The newest backup fills both the current hour and the current day bucket
+    assert kept["b0.zip"] == ["hourly", "daily"]
+    assert "b1.zip" in kept and "b2.zip" in kept
+    assert len(keep) == 3 + 4
+    assert len(keep) + len(delete) == len(entries)
+
+
+def test_size_cap_drops_oldest_kept_first():
+    now = time.time()
+    entries = hourly_entries(5, now, size=100)
+
+    keep, delete = bot.plan_backup_retention(entries, policy(latest=5, max_bytes=250))
+
+    assert [e[0] for e, _ in keep] == ["b0.zip", "b1.zip"]
+    assert [e[0] for e in delete] == ["b2.zip", "b3.zip", "b4.zip"]
+
+
+def test_size_cap_always_keeps_newest():
+    entries = hourly_entries(2, time.time(), size=1000)
+
+    keep, _ = bot.plan_backup_retention(entries, policy(latest=2, max_bytes=10))
+
+    assert [e[0] for e, _ in keep] == ["b0.zip"]
+
+
+def test_scan_backup_entries_skips_partial_and_dirs(tmp_path):
+    (tmp_path / "a.zip").write_bytes(b"aa")
+    (tmp_path / "b.zip.part").write_bytes(b"b")
+    (tmp_path / "store").mkdir()
+    os.utime(tmp_path / "a.zip", (1000, 1000))
+
+    assert bot.scan_backup_entries(str(tmp_path)) == [("a.zip", str(tmp_path / "a.zip"), 1000, 2)]
+
+
+def test_retention_report_is_dry_run(tmp_path, monkeypatch):
+    for i in range(3):
+        path = tmp_path / f"w{i}.zip"
+        path.write_bytes(b"x")
+        os.utime(path, (1000 + i, 1000 + i))
+    monkeypatch.setattr(bot, "BACKUP_DIR", str(tmp_path))
+    monkeypatch.setattr(bot, "BACKUP_ENGINE", "script")
+    monkeypatch.setattr(bot, "BACKUP_RETENTION_COUNT", 1)
+
+    report = bot.get_retention_report()
+
+    assert "Keep `1` file(s)" in report
+    assert "Delete `2` file(s)" in report
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_size_cap_alone_keeps_everything_that_fits(monkeypatch):
+    entries = hourly_entries(5, time.time(), size=100)
+
+    keep, delete = bot.plan_backup_retention(entries, policy(max_bytes=350))
+
+    assert [e[0] for e, _ in keep] == ["b0.zip", "b1.zip", "b2.zip"]
+    assert [e[0] for e in delete] == ["b3.zip", "b4.zip"]
+
+    # The built-in engine ignores the cap, so a cap-only policy deletes nothing
+    monkeypatch.setattr(bot, "BACKUP_ENGINE", "builtin")
+    monkeypatch.setattr(bot, "BACKUP_RETENTION_MAX_GB", 1)
+    monkeypatch.setattr(bot, "_retention_targets", MagicMock(side_effect=AssertionError("no scan")))
+    assert bot.apply_backup_retention() == 0
+    assert "Nothing will be deleted" in bot.get_retention_report()
@@ -0,0 +1,143 @@
+import hashlib
+import http.server
+import json
+import os
+import sys
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+class FakeBotApi(http.server.BaseHTTPRequestHandler):
+    """Minimal sendDocument endpoint that records the parts it receives."""
+
+    received = []
+    fail_once = set()
+    reject_chats = set()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        boundary = self.headers["Content-Type"].split("boundary=", 1)[1].encode()
+        fields = {}
+        for part in body.split(b"--" + boundary)[1:-1]:
+            header, _, value = part[2:-2].partition(b"\r\n\r\n")
+            disposition = header.split(b"\r\n")[0].decode()
+            name = disposition.split('name="', 1)[1].split('"', 1)[0]
+            if 'filename="' in disposition:
+                fields["filename"] = disposition.split('filename="', 1)[1].split('"', 1)[0]
+            fields[name] = value
+
+        chat_id = fields["chat_id"].decode()
+        key = (chat_id, fields["filename"])
+        if chat_id in self.reject_chats:
+            reply = {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        elif key in self.fail_once:
+            self.fail_once.discard(key)
+            reply = {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                     "parameters": {"retry_after": 1}}
+        else:
+            self.received.append((chat_id, fields["filename"], fields["document"]))
+            reply = {"ok": True, "result": {"message_id": len(self.received)}}
+
+        data = json.dumps(reply).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    FakeBotApi.received = []
+    FakeBotApi.fail_once = set()
+    FakeBotApi.reject_chats = set()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(bot, "BASE_URL", f"http://127.0.0.1:{server.server_port}/botTEST/")
+    monkeypatch.setattr(bot.time, "sleep", lambda seconds: None)
+    yield FakeBotApi
+    server.shutdown()
+    server.server_close()
+
+
+def test_plan_upload_parts_splits_on_limit():
+    assert bot.plan_upload_parts(10, 10) == [(0, 10)]
+    assert bot.plan_upload_parts(25, 10) == [(0, 10), (10, 10), (20, 5)]
+    assert bot.upload_part_name("w.zip", 1, 3) == "w.zip.002"
+    assert bot.upload_part_name("w.zip", 0, 1) == "w.zip"
+
+
+def test_upload_splits_and_reaches_every_chat(fake_api, tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "BACKUP_UPLOAD_PART_BYTES", 4096)
+    data = os.urandom(4096 * 2 + 100)
+    path = tmp_path / "world-1.zip"
+    path.write_bytes(data)
+    fake_api.fail_once.add(("111", "world-1.zip.002"))
+
+    parts, results = bot.upload_backup_file(str(path), [111, 222])
+
+    assert len(parts) == 3
+    assert results == {111: (3, None), 222: (3, None)}
+    for chat_id in ("111", "222"):
+        pieces = sorted((name, blob) for cid, name, blob in fake_api.received if cid == chat_id)
+        assert [name for name, _ in pieces] == ["world-1.zip.001", "world-1.zip.002", "world-1.zip.003"]
+        joined = b"".join(blob for _, blob in pieces)
+        assert hashlib.sha256(joined).digest() == hashlib.sha256(data).digest()
+    # Fully delivered uploads leave no resume state behind
+    assert not os.path.exists(bot._upload_state_path(str(path)))
+
+
+def test_failed_upload_resumes_from_delivered_parts(fake_api, tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "BACKUP_UPLOAD_PART_BYTES", 1024)
+    monkeypatch.setattr(bot, "BACKUP_UPLOAD_RETRIES", 1)
+    path = tmp_path / "world-2.zip"
+    path.write_bytes(os.urandom(3000))
+
+    fake_api.reject_chats.add("222")
+    parts, results = bot.upload_backup_file(str(path), [111, 222])
+    assert results[111] == (3, None)
+    assert results[222][0] == 0 and results[222][1] == "Internal Server Error"
+    assert "/upload" in bot.format_upload_summary("world-2.zip", parts, results)
+
+    fake_api.reject_chats.clear()
+    fake_api.received = []
+    _, results = bot.upload_backup_file(str(path), [111, 222])
+
+    assert results == {111: (3, None), 222: (3, None)}
+    # Chat 111 already had everything; only 222 receives parts on the retry
+    assert {cid for cid, _, _ in fake_api.received} == {"222"}
+
+
+def test_upload_to_one_chat_keeps_other_chats_resume_state(fake_api, tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "BACKUP_UPLOAD_PART_BYTES", 1024)
+    monkeypatch.setattr(bot, "BACKUP_UPLOAD_RETRIES", 0)
+    path = tmp_path / "world-3.zip"
+    path.write_bytes(os.urandom(3000))
+    fake_api.fail_once.add(("222", "world-3.zip.002"))
+    fake_api.fail_once.add(("333", "world-3.zip.001"))
+
+    bot.upload_backup_file(str(path), [111, 222, 333])
+    # /upload from chat 111 alone must not forget what 222 and 333 still need
+    _, results = bot.upload_backup_file(str(path), [111])
+    assert results == {111: (3, None)}
+    assert os.path.exists(bot._upload_state_path(str(path)))
+
+    fake_api.received = []
+    _, results = bot.upload_backup_file(str(path), [222, 333])
+    assert results == {222: (3, None), 333: (3, None)}
+    assert sorted((cid, name) for cid, name, _ in fake_api.received) == [
+        ("222", "world-3.zip.002"), ("222", "world-3.zip.003"),
+        ("333", "world-3.zip.001"), ("333", "world-3.zip.002"), ("333", "world-3.zip.003"),
+    ]
+    assert not os.path.exists(bot._upload_state_path(str(path)))
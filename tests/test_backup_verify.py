@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def fork_workers(monkeypatch):
+    # Workers started fresh would not see the sys.modules stand-ins above
+    monkeypatch.setattr(bot, "PROCESS_POOL_START_METHOD", "fork")
+
+
+def build_region(slots, extra_sectors=0):
+    """Region file with one sector per listed slot, in slot order."""
+    header = bytearray(8192)
+    for n, slot in enumerate(slots):
+        header[slot * 4:slot * 4 + 4] = (2 + n).to_bytes(3, "big") + b"\x01"
+    return bytes(header) + os.urandom(4096 * (len(slots) + extra_sectors))
+
+
+def make_world(root):
+    (root / "region").mkdir(parents=True)
+    (root / "region" / "r.0.0.mca").write_bytes(build_region([0, 5, 9]))
+    (root / "region" / "r.0.1.mca").write_bytes(build_region([1, 2]))
+    (root / "level.dat").write_bytes(os.urandom(200 * 1024))
+
+
+def test_check_region_header_flags_bad_locations():
+    assert bot.check_region_header(build_region([0, 1]), 4 * 4096) is None
+    assert bot.check_region_header(b"", 0) is None
+    assert "past the end" in bot.check_region_header(build_region([0, 1]), 3 * 4096)
+
+    overlapping = bytearray(build_region([0, 1]))
+    overlapping[4:8] = (2).to_bytes(3, "big") + b"\x01"
+    assert "overlap" in bot.check_region_header(bytes(overlapping), 4 * 4096)
+
+
+def test_zip_verification_passes_then_catches_corruption(tmp_path):
+    world = tmp_path / "world"
+    make_world(world)
+    archive = tmp_path / "world.zip"
+    bot.write_parallel_zip(str(world), str(archive), workers=2, level=6, piece_size=64 * 1024)
+
+    result = bot.verify_zip_archive(str(archive), workers=2, region_sample=2)
+    assert result["checked"] == 3
+    assert result["regions"] == 2
+    assert result["problems"] == []
+
+    # Flip bytes inside the deflated level.dat data
+    data = bytearray(archive.read_bytes())
+    start = data.index(b"level.dat") + 100
+    for i in range(start, start + 64):
+        data[i] ^= 0xFF
+    archive.write_bytes(bytes(data))
+
+    result = bot.verify_zip_archive(str(archive), workers=1, region_sample=0)
+    assert [name for name, _ in result["problems"]] == ["level.dat"]
+
+
+def test_snapshot_verification_rehashes_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "BACKUP_CHUNK_SIZE", 64 * 1024)
+    world = tmp_path / "world"
+    store = str(tmp_path / "store")
+    make_world(world)
+    manifest = bot.create_snapshot(str(world), store)
+
+    result = bot.verify_snapshot(manifest["id"], store, workers=1, region_sample=5)
+    assert result["problems"] == []
+    assert result["regions"] == 2
+
+    digest = manifest["files"]["level.dat"]["chunks"][0]
+    chunk_path = bot._chunk_path(os.path.join(store, "chunks"), digest)
+    with open(chunk_path, "wb") as f:
+        f.write(bot.zlib.compress(b"tampered"))
+
+    result = bot.verify_snapshot(manifest["id"], store, workers=1, region_sample=0)
+    assert result["problems"] == [(digest, "content hash mismatch")]
+
+
+def test_snapshot_verification_only_rehashes_new_chunks_plus_sample(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "BACKUP_CHUNK_SIZE", 64 * 1024)
+    world = tmp_path / "world"
+    store = str(tmp_path / "store")
+    make_world(world)
+    first = bot.create_snapshot(str(world), store)
+    (world / "level.dat").write_bytes(os.urandom(100 * 1024))
+    second = bot.create_snapshot(str(world), store)
+    assert second["id"] > first["id"]
+
+    # Corrupt a chunk the second snapshot reuses from the first
+    old_digest = first["files"]["region/r.0.0.mca"]["region"]["header"]
+    with open(bot._chunk_path(os.path.join(store, "chunks"), old_digest), "wb") as f:
+        f.write(bot.zlib.compress(b"tampered"))
+
+    result = bot.verify_snapshot(second["id"], store, workers=1, region_sample=0, chunk_sample=0)
+    assert result["checked"] == len(second["files"]["level.dat"]["chunks"])
+    assert result["problems"] == []
+
+    result = bot.verify_snapshot(second["id"], store, workers=1, region_sample=0, chunk_sample=1000)
+    assert result["sampled"] > 0
+    assert result["problems"] == [(old_digest, "content hash mismatch")]
+
+
+def test_verify_latest_backup_records_result_next_to_archive(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    make_world(world)
+    backups = tmp_path / "backups"
+    backups.mkdir()
+    archive = backups / "world-1.zip"
+    bot.write_parallel_zip(str(world), str(archive), workers=1)
+    monkeypatch.setattr(bot, "BACKUP_ENGINE", "archive")
+    monkeypatch.setattr(bot, "BACKUP_DIR", str(backups))
+    monkeypatch.setattr(bot, "BACKUP_VERIFY_WORKERS", 1)
+
+    ok, message = bot.verify_latest_backup()
+
+    assert ok is True
+    assert message.startswith("🔎 Verified `3` member(s)")
+    record = json.loads((backups / ".world-1.zip.verify.json").read_text())
+    assert record["ok"] is True
+    assert record["checked"] == 3
+    # The sidecar is hidden, so it never shows up as a backup itself
+    assert [e[0] for e in bot.scan_backup_entries(str(backups))] == ["world-1.zip"]
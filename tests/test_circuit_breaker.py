@@ -0,0 +1,164 @@
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(bot, "health_state", {
+        "status": "healthy", "since": 0.0, "failures": 0, "successes": 0, "reason": "",
+    })
+    monkeypatch.setattr(bot, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(bot, "BREAKER_RESET_SECONDS", 10)
+    monkeypatch.setattr(bot, "BREAKER_MAX_RESET_SECONDS", 30)
+    monkeypatch.setattr(bot, "breakers", {"rcon": bot._new_breaker(), "docker": bot._new_breaker()})
+
+
+def test_breaker_opens_probes_and_backs_off():
+    for _ in range(2):
+        bot.breaker_failure("rcon", "timeout", now=100.0)
+    assert bot.breaker_allow("rcon", now=100.0)
+    bot.breaker_failure("rcon", "timeout", now=100.0)
+    assert bot.breakers["rcon"]["state"] == "open"
+    assert not bot.breaker_allow("rcon", now=105.0)
+    assert bot.breaker_open_message("rcon", now=105.0) == "RCON unreachable (retry in 5s)"
+
+    # One probe after the delay; others keep failing fast meanwhile
+    assert bot.breaker_allow("rcon", now=110.0)
+    assert not bot.breaker_allow("rcon", now=110.0)
+    bot.breaker_failure("rcon", "timeout", now=110.0)
+    assert bot.breakers["rcon"]["state"] == "open"
+    assert bot.breakers["rcon"]["reset_after"] == 20
+    assert not bot.breaker_allow("rcon", now=125.0)
+
+    assert bot.breaker_allow("rcon", now=130.0)
+    bot.breaker_success("rcon", now=130.0)
+    assert bot.breakers["rcon"]["state"] == "closed"
+    assert bot.breakers["rcon"]["reset_after"] == 10
+    assert bot.breaker_open_message("rcon") is None
+    assert [t[3] for t in bot.breaker_transitions][-4:] == ["half_open", "open", "half_open", "closed"]
+
+
+def test_open_rcon_breaker_fails_fast_without_docker_exec(monkeypatch):
+    calls = []
+
+    def hung_rcon(*_a, **_k):
+        calls.append(1)
+        raise subprocess.TimeoutExpired(cmd="rcon-cli", timeout=5)
+
+    monkeypatch.setattr(bot.subprocess, "run", hung_rcon)
+    for _ in range(3):
+        assert "Timeout" in bot.rcon_command("list")
+    assert "RCON unreachable" in bot.rcon_command("list")
+    assert bot.rcon_batch(["tps", "mspt"])[1].startswith("⚠️ Error: RCON unreachable")
+    assert len(calls) == 3
+
+
+def test_rcon_exit_code_without_output_counts_as_failure(monkeypatch):
+    down = MagicMock(returncode=1, stdout="", stderr="dial tcp: connection refused")
+    monkeypatch.setattr(bot.subprocess, "run", lambda *_a, **_k: down)
+    assert bot.rcon_probe("list") == (False, "")
+    assert bot.breakers["rcon"]["failures"] == 1
+
+    # Command errors still come back from a reachable server
+    answered = MagicMock(returncode=1, stdout="Unknown command", stderr="")
+    monkeypatch.setattr(bot.subprocess, "run", lambda *_a, **_k: answered)
+    assert bot.rcon_probe("foo") == (True, "Unknown command")
+    assert bot.breakers["rcon"]["failures"] == 0
+
+
+def test_docker_breaker_ignores_command_errors(monkeypatch):
+    def missing(*_a, **_k):
+        raise subprocess.CalledProcessError(1, "docker")
+
+    monkeypatch.setattr(bot.subprocess, "check_output", missing)
+    for _ in range(5):
+        with pytest.raises(subprocess.CalledProcessError):
+            bot.docker_output(["inspect", "x"], "inspect")
+    assert bot.breakers["docker"]["state"] == "closed"
+
+    def hung(*_a, **_k):
+        raise subprocess.TimeoutExpired(cmd="docker", timeout=5)
+
+    monkeypatch.setattr(bot.subprocess, "check_output", hung)
+    for _ in range(3):
+        with pytest.raises(subprocess.TimeoutExpired):
+            bot.docker_output(["inspect", "x"], "inspect")
+    # Existing callers catch SubprocessError, which covers the fail-fast error
+    with pytest.raises(subprocess.SubprocessError):
+        bot.docker_output(["inspect", "x"], "inspect")
+    assert not bot.is_container_running()
+
+
+def test_unexpected_docker_errors_resolve_a_half_open_probe(monkeypatch):
+    # Open long enough ago that the next call is the half-open probe
+    bot.breakers["docker"].update(state="open", opened_at=0.0)
+
+    def broken(*_a, **_k):
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(bot.subprocess, "check_output", broken)
+    with pytest.raises(ValueError):
+        bot.docker_output(["inspect", "x"], "inspect")
+    assert bot.breakers["docker"]["state"] == "open"
+    assert bot.breakers["docker"]["reset_after"] == 20
+
+    # Undecodable output is not a daemon failure
+    monkeypatch.setattr(bot.subprocess, "check_output", lambda *_a, **_k: b"\xff running ")
+    bot.breaker_reset("docker")
+    assert bot.docker_output(["inspect", "x"], "inspect") == "\ufffd running"
+
+
+def test_health_check_probes_even_while_the_rcon_breaker_is_open(monkeypatch):
+    for _ in range(3):
+        bot.breaker_failure("rcon", "timeout")
+    assert bot.breakers["rcon"]["state"] == "open"
+    runs = []
+    monkeypatch.setattr(bot.subprocess, "check_output", lambda *_a, **_k: b"true\n")
+    monkeypatch.setattr(bot.subprocess, "run", lambda *_a, **_k: runs.append(1) or MagicMock(
+        returncode=0, stdout="There are 0 of a max of 20 players online:", stderr=""))
+
+    assert bot.is_server_responsive() == (True, "ok")
+    assert runs == [1]
+    assert bot.breakers["rcon"]["state"] == "closed"
+
+
+def test_health_goes_degraded_then_down_and_adapts_interval(monkeypatch):
+    monkeypatch.setattr(bot, "HEALTH_DOWN_CHECKS", 3)
+    monkeypatch.setattr(bot, "HEALTH_DEGRADED_SECONDS", 10)
+    monkeypatch.setattr(bot, "AUTO_RECOVERY_CHECK_SECONDS", 60)
+
+    assert bot.update_health(True, "ok") == ("healthy", "healthy")
+    assert bot.next_health_interval() == 20
+    assert bot.update_health(False, "timeout") == ("healthy", "degraded")
+    assert bot.next_health_interval() == 10
+    assert bot.update_health(False, "timeout") == ("degraded", "degraded")
+    assert bot.update_health(False, "timeout") == ("degraded", "down")
+    assert bot.update_health(True, "ok") == ("down", "healthy")
+    for _ in range(5):
+        bot.update_health(True, "ok")
+    assert bot.next_health_interval() == 60
+
+
+def test_health_check_restarts_only_once_down(monkeypatch):
+    monkeypatch.setattr(bot, "HEALTH_DOWN_CHECKS", 2)
+    monkeypatch.setattr(bot, "idle_state", {**bot.idle_state, "paused": False})
+    monkeypatch.setattr(bot, "is_server_responsive", lambda: (False, "RCON unreachable (retry in 5s)"))
+    monkeypatch.setattr(bot, "broadcast_message", MagicMock())
+    recovery = MagicMock(return_value=(True, 1, "server recovered"))
+    monkeypatch.setattr(bot, "attempt_auto_recovery", recovery)
+
+    bot.run_health_check()
+    recovery.assert_not_called()
+    bot.run_health_check()
+    recovery.assert_called_once()
+    assert bot.health_state["status"] == "healthy"
+    assert "Auto-Recovery Success" in bot.broadcast_message.call_args[0][0]
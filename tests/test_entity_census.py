@@ -0,0 +1,95 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def fresh_census(monkeypatch):
+    monkeypatch.setattr(bot, "census_state", {"last": None, "previous": None})
+    monkeypatch.setattr(bot, "CENSUS_ENTITY_TYPES", ["chicken", "item", "zombie"])
+
+
+def fake_batch(counts):
+    """rcon_batch stand-in answering from {(type, dimension or player): count}."""
+    calls = []
+
+    def run(commands, timeout=15):
+        calls.append(commands)
+        outputs = []
+        for command in commands:
+            entity_type = command.split("type=minecraft:", 1)[1].split(",", 1)[0]
+            if command.startswith("execute in"):
+                where = command.split("minecraft:", 1)[1].split(" ", 1)[0]
+            else:
+                where = command.split(" ")[2]
+            count = counts.get((entity_type, where), 0)
+            outputs.append(f"Test passed, count: {count}" if count else "Test failed")
+        return outputs
+
+    return run, calls
+
+
+def test_parse_census_count():
+    assert bot.parse_census_count("Test passed, count: 2000") == 2000
+    assert bot.parse_census_count("Test failed") == 0
+    assert bot.parse_census_count("Unknown entity: minecraft:nope") is None
+
+
+def test_census_is_one_batch_and_ranks_offenders(monkeypatch):
+    run, calls = fake_batch({
+        ("chicken", "overworld"): 2000,
+        ("item", "overworld"): 300,
+        ("item", "the_nether"): 50,
+    })
+    monkeypatch.setattr(bot, "rcon_batch", run)
+
+    census, previous = bot.get_entity_census()
+
+    assert len(calls) == 1 and len(calls[0]) == 9
+    assert previous is None
+    text = bot.format_entity_census(census)
+    assert text.index("`chicken` *2000*") < text.index("`item` *350*")
+    assert "🌍300 🔥50" in text
+    assert "zombie" not in text
+
+
+def test_census_cache_and_deltas(monkeypatch):
+    counts = {("chicken", "overworld"): 100}
+    run, calls = fake_batch(counts)
+    monkeypatch.setattr(bot, "rcon_batch", run)
+    monkeypatch.setattr(bot, "CENSUS_CACHE_SECONDS", 60)
+
+    bot.get_entity_census()
+    bot.get_entity_census()
+    assert len(calls) == 1
+
+    counts[("chicken", "overworld")] = 180
+    census, previous = bot.get_entity_census(force=True)
+    assert len(calls) == 2
+    assert "*180* (+80)" in bot.format_entity_census(census, previous)
+
+
+def test_census_by_player_queries_top_types(monkeypatch):
+    run, calls = fake_batch({
+        ("chicken", "overworld"): 2000,
+        ("chicken", "Farmer"): 1990,
+    })
+    monkeypatch.setattr(bot, "rcon_batch", run)
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: ["Farmer", "Miner"])
+
+    census, _ = bot.get_entity_census(by_player=True)
+
+    # Only types that exist are broken down per player
+    assert calls[1] == [
+        f"execute as Farmer at @s if entity @e[type=minecraft:chicken,distance=..{bot.CENSUS_PLAYER_RADIUS}]",
+        f"execute as Miner at @s if entity @e[type=minecraft:chicken,distance=..{bot.CENSUS_PLAYER_RADIUS}]",
+    ]
+    assert census["players"] == {"Farmer": {"chicken": 1990}}
+    assert "`Farmer`: chicken 1990" in bot.format_entity_census(census)
@@ -0,0 +1,78 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def governor_env(monkeypatch):
+    monkeypatch.setattr(bot, "governor_state", {"view": None, "simulation": None, "last_change": 0})
+    monkeypatch.setattr(bot, "governor_history", bot.collections.deque(maxlen=20))
+    monkeypatch.setattr(bot, "tick_samples", bot.collections.deque(maxlen=50))
+    monkeypatch.setattr(bot, "GOVERNOR_VIEW_COMMAND", "viewdistance {value}")
+    monkeypatch.setattr(bot, "GOVERNOR_SIMULATION_COMMAND", "simulationdistance {value}")
+    monkeypatch.setattr(bot, "GOVERNOR_VIEW_MIN", 6)
+    monkeypatch.setattr(bot, "GOVERNOR_VIEW_MAX", 12)
+    monkeypatch.setattr(bot, "GOVERNOR_SIMULATION_MIN", 4)
+    monkeypatch.setattr(bot, "GOVERNOR_SIMULATION_MAX", 8)
+    monkeypatch.setattr(bot, "GOVERNOR_STEP", 2)
+    monkeypatch.setattr(bot, "GOVERNOR_MSPT_HIGH", 45)
+    monkeypatch.setattr(bot, "GOVERNOR_MSPT_LOW", 30)
+    monkeypatch.setattr(bot, "GOVERNOR_SAMPLES", 3)
+    monkeypatch.setattr(bot, "GOVERNOR_COOLDOWN_SECONDS", 300)
+    monkeypatch.setattr(bot, "TICK_MONITOR_SECONDS", 30)
+
+
+def test_plan_cuts_simulation_first_and_restores_view_first():
+    assert bot.plan_governor_step(60, 10, 12, 8) == (12, 6, "MSPT high")
+    assert bot.plan_governor_step(60, 10, 12, 4) == (10, 4, "MSPT high")
+    assert bot.plan_governor_step(60, 10, 6, 4) is None
+    assert bot.plan_governor_step(20, 10, 6, 4) == (8, 4, "MSPT recovered")
+    assert bot.plan_governor_step(20, 10, 12, 4) == (12, 6, "MSPT recovered")
+
+
+def test_plan_holds_inside_hysteresis_band_and_when_empty():
+    assert bot.plan_governor_step(40, 10, 8, 6) is None
+    # Lag with nobody online is not worth cutting distances for
+    assert bot.plan_governor_step(60, 0, 12, 8) is None
+    assert bot.plan_governor_step(10, 0, 10, 8)[2] == "server empty"
+
+
+def test_governor_step_applies_commands_with_cooldown(monkeypatch):
+    sent = []
+    monkeypatch.setattr(bot, "rcon_command", lambda cmd: sent.append(cmd) or "Done")
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: ["A", "B"])
+    monkeypatch.setattr(bot, "read_property", lambda key: {"view-distance": "10", "simulation-distance": "8"}[key])
+
+    now = 100000
+    for i in range(3):
+        bot.record_tick_sample(15.0, 70.0, now=now - i)
+
+    message = bot.run_governor_step(now=now)
+    assert sent == ["simulationdistance 6"]
+    assert "simulation-distance `8` → `6`" in message
+    assert bot.governor_state["simulation"] == 6
+
+    # Inside the cooldown nothing changes even though MSPT is still high
+    assert bot.run_governor_step(now=now + 10) is None
+    assert sent == ["simulationdistance 6"]
+
+
+def test_governor_reports_command_errors(monkeypatch):
+    monkeypatch.setattr(bot, "rcon_command", lambda cmd: "Unknown or incomplete command")
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: ["A"])
+    monkeypatch.setattr(bot, "read_property", lambda key: "8")
+
+    now = 100000
+    for i in range(3):
+        bot.record_tick_sample(15.0, 70.0, now=now - i)
+
+    message = bot.run_governor_step(now=now)
+    assert "failed" in message
+    assert bot.governor_state["simulation"] is None
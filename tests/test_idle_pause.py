@@ -0,0 +1,97 @@
+import sys
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def idle_env(monkeypatch, tmp_path):
+    monkeypatch.setattr(bot, "idle_state", {"empty_since": None, "warned": False, "paused": False, "last_warmup": None})
+    monkeypatch.setattr(bot, "IDLE_STATE_FILE", str(tmp_path / "idle_state.json"))
+    monkeypatch.setattr(bot, "backup_jobs", {"current": None, "next_id": 1})
+    monkeypatch.setattr(bot, "IDLE_STOP_MINUTES", 30)
+    monkeypatch.setattr(bot, "IDLE_WARNING_MINUTES", 5)
+    monkeypatch.setattr(bot, "IDLE_WARMUP_TIMES", "")
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: [])
+    calls = []
+    monkeypatch.setattr(bot, "rcon_command", lambda cmd: calls.append(("rcon", cmd)) or "Saved the game")
+    monkeypatch.setattr(bot, "stop_server", lambda: calls.append(("stop",)) or "🛑 Server stopped.")
+    monkeypatch.setattr(bot, "start_server", lambda: calls.append(("start",)) or "✅ Server starting...")
+    return calls
+
+
+def test_warns_then_stops_after_save(idle_env):
+    now = 100000
+    assert bot.run_idle_check(now=now, running=True) == []
+
+    notices = bot.run_idle_check(now=now + 25 * 60, running=True)
+    assert "stopped in `5m" in notices[0][0]
+    assert bot.run_idle_check(now=now + 26 * 60, running=True) == []
+
+    notices = bot.run_idle_check(now=now + 30 * 60, running=True)
+    assert "paused" in notices[0][0]
+    assert notices[0][1]["inline_keyboard"][0][0]["callback_data"] == "idle_wake"
+    # The forced save always comes before the stop
+    assert idle_env == [("rcon", ["save-all", "flush"]), ("stop",)]
+    assert bot.idle_state["paused"] is True
+
+
+def test_players_or_backup_reset_the_idle_clock(monkeypatch, idle_env):
+    now = 100000
+    bot.run_idle_check(now=now, running=True)
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: ["Steve"])
+    bot.run_idle_check(now=now + 20 * 60, running=True)
+    assert bot.idle_state["empty_since"] is None
+
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: [])
+    monkeypatch.setattr(bot, "backup_jobs", {"current": {"id": 1}, "next_id": 2})
+    bot.run_idle_check(now=now + 21 * 60, running=True)
+    assert bot.run_idle_check(now=now + 90 * 60, running=True) == []
+    assert idle_env == []
+
+
+def test_manual_start_clears_pause(idle_env):
+    bot.idle_state["paused"] = True
+    bot.run_idle_check(now=100000, running=True)
+    assert bot.idle_state["paused"] is False
+    assert bot.idle_state["empty_since"] == 100000
+
+
+def test_scheduled_warmup_starts_paused_server_once(monkeypatch, idle_env):
+    local = time.localtime(200000)
+    monkeypatch.setattr(bot, "IDLE_WARMUP_TIMES", f"{local.tm_hour:02d}:{local.tm_min:02d}, bad, 25:00")
+    bot.idle_state["paused"] = True
+    start = time.mktime(local[:5] + (0, 0, 0, -1))
+
+    notices = bot.run_idle_check(now=start + 10, running=False)
+    assert "warm-up" in notices[0][0]
+    assert idle_env == [("start",)]
+
+    bot.idle_state["paused"] = True
+    assert bot.run_idle_check(now=start + 20, running=False) == []
+
+
+def test_pause_survives_a_bot_restart(monkeypatch, idle_env):
+    now = 100000
+    bot.run_idle_check(now=now, running=True)
+    bot.run_idle_check(now=now + 30 * 60, running=True)
+
+    monkeypatch.setattr(bot, "idle_state", {"empty_since": None, "warned": False, "paused": False, "last_warmup": None})
+    bot.load_idle_state()
+    assert bot.idle_state["paused"] is True
+
+    bot.wake_server()
+    bot.idle_state["paused"] = True
+    bot.load_idle_state()
+    assert bot.idle_state["paused"] is False
+
+
+def test_parse_warmup_times():
+    assert bot.parse_warmup_times("18:30, 7:05,nope,24:00,18:30") == [(7, 5), (18, 30)]
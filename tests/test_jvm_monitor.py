@@ -0,0 +1,123 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+JSTAT_G1 = """\
+    S0C         S1C         S0U         S1U          EC           EU           OC           OU          MC         MU       CCSC      CCSU     YGC     YGCT     FGC    FGCT     CGC    CGCT       GCT
+        0.0      8192.0         0.0      8192.0     204800.0     102400.0     311296.0     280166.4   98304.0   95000.0  12288.0  11000.0    120     3.500     2     1.200    10     0.300     5.000
+"""
+
+GC_LOG = """\
+[2024-05-01T10:00:00.000+0000][info][gc] GC(40) Pause Young (Normal) (G1 Evacuation Pause) 3000M->1200M(4096M) 25.500ms
+[2024-05-01T10:00:05.000+0000][info][gc] GC(41) Concurrent Mark Cycle 80.100ms
+[2024-05-01T10:00:09.000+0000][info][gc] GC(42) Pause Full (G1 Compaction Pause) 3900M->3700M(4G) 1500.000ms
+"""
+
+
+@pytest.fixture(autouse=True)
+def fresh_jvm_state(monkeypatch):
+    monkeypatch.setattr(bot, "jvm_samples", bot.collections.deque(maxlen=1000))
+    monkeypatch.setattr(bot, "jvm_state", {
+        "source": None, "pid": None, "log_offset": None, "log_counters": None,
+        "last_alert": 0, "alerting": False,
+    })
+    monkeypatch.setattr(bot, "JVM_MONITOR_SECONDS", 60)
+    monkeypatch.setattr(bot, "JVM_WINDOW_MINUTES", 10)
+
+
+def test_parse_jstat_gc_sums_generations():
+    sample = bot.parse_jstat_gc(JSTAT_G1)
+    assert sample["heap_used"] == (8192.0 + 102400.0 + 280166.4) * 1024
+    assert sample["heap_max"] == (8192.0 + 204800.0 + 311296.0) * 1024
+    assert round(sample["old_pct"]) == 90
+    assert sample["gc_count"] == 132
+    assert sample["full_count"] == 2
+    assert sample["gc_seconds"] == 5.0
+    assert bot.parse_jstat_gc("OCI runtime exec failed: jstat not found") is None
+
+
+def test_gc_log_is_read_incrementally(tmp_path, monkeypatch):
+    log = tmp_path / "gc.log"
+    log.write_text(GC_LOG + "[2024-05-01T10:00:10.000+0000][info][gc] GC(43) Pause Yo")
+    monkeypatch.setattr(bot, "JVM_GC_LOG", str(log))
+
+    sample = bot.sample_jvm(now=1000.0)
+    assert sample["gc_count"] == 2
+    assert sample["full_count"] == 1
+    assert sample["gc_seconds"] == pytest.approx(1.5255)
+    assert sample["heap_max"] == 4 * 1024 ** 3
+    assert round(sample["old_pct"]) == 90
+
+    # The partial line is finished later and counted exactly once
+    with open(log, "a") as f:
+        f.write("ung (Normal) (G1 Evacuation Pause) 3800M->3600M(4096M) 40.000ms\n")
+    sample = bot.sample_jvm(now=1060.0)
+    assert sample["gc_count"] == 3
+    assert sample["heap_used"] == 3600 * 1024 ** 2
+
+    # Rotation starts the counters over, and the summary only uses later samples
+    log.write_text(GC_LOG.splitlines()[0] + "\n")
+    sample = bot.sample_jvm(now=1120.0)
+    assert sample["gc_count"] == 1
+    summary = bot.get_jvm_summary(now=1120.0)
+    assert summary["samples"] == 1
+    assert summary["gcs"] == 0
+
+
+def add_samples(start, count, step, gc_per_step, old_pct, full_every=0):
+    for i in range(count):
+        bot.jvm_samples.append({
+            "ts": start + i * step, "heap_used": 3.5e9, "heap_max": 4e9, "old_pct": old_pct,
+            "gc_count": i * 10, "full_count": i // full_every if full_every else 0,
+            "gc_seconds": i * gc_per_step,
+        })
+
+
+def test_gc_time_share_triggers_alert_and_recovery(monkeypatch):
+    # 12 s of GC per 60 s sample = 20% of wall time
+    add_samples(10000.0, 11, 60, 12.0, old_pct=50.0)
+    alert = bot.check_jvm_alert(now=10600.0)
+    assert "GC thrashing" in alert
+    assert "`20.0%`" in alert
+    assert bot.check_jvm_alert(now=10600.0) is None
+
+    add_samples(10660.0, 11, 60, 0.1, old_pct=50.0)
+    assert "back to normal" in bot.check_jvm_alert(now=11260.0)
+
+
+def test_full_gcs_that_leave_old_gen_full_count_as_thrash():
+    add_samples(10000.0, 11, 60, 0.5, old_pct=92.0, full_every=3)
+    assert "Old gen never dropped below `92%`" in bot.check_jvm_alert(now=10600.0)
+
+
+def test_healthy_heap_is_quiet_and_formats_status(monkeypatch):
+    add_samples(10000.0, 11, 60, 0.5, old_pct=60.0)
+    assert bot.check_jvm_alert(now=10600.0) is None
+    monkeypatch.setattr(bot.time, "time", lambda: 10600.0)
+    assert bot.format_jvm_status().startswith("☕ Heap: `")
+    assert "GC `0.8%` of `10m`" in bot.format_jvm_status()
+
+
+def test_container_memory_alert_yields_to_jvm_data(monkeypatch):
+    monkeypatch.setattr(bot, "resource_history", bot._new_resource_history(100))
+    monkeypatch.setattr(bot, "resource_history_state", {"next": 0, "count": 0})
+    monkeypatch.setattr(bot, "resource_alert_state", {})
+    monkeypatch.setattr(bot, "RESOURCE_SAMPLE_SECONDS", 10)
+    for i in range(31):
+        bot.record_resource_sample(99700.0 + i * 10, mem=97.0)
+
+    bot.jvm_state["source"] = "jstat"
+    add_samples(99400.0, 11, 60, 0.5, old_pct=60.0)
+    assert bot.check_resource_alerts(100000.0) == []
+
+    # JVM sampling stopped 5 minutes ago (jstat gone, JVM restarted...): the RAM alert is back
+    bot.jvm_samples.clear()
+    add_samples(99100.0, 11, 60, 0.5, old_pct=60.0)
+    assert len(bot.check_resource_alerts(100000.0)) == 1
@@ -0,0 +1,81 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+SPIKE_LINE = (
+    "[12:34:56] [Server thread/WARN]: Can't keep up! Is the server overloaded? "
+    "Running 2345ms or 46 ticks behind"
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(bot, "lag_spikes", bot.collections.deque(maxlen=100))
+    monkeypatch.setattr(bot, "lag_state", {"last_alert": 0})
+    monkeypatch.setattr(bot, "presence_sessions", {})
+    monkeypatch.setattr(bot, "join_events", bot.collections.deque(maxlen=100))
+    monkeypatch.setattr(bot, "presence_state", {"synced": True, "max_players": 20})
+
+
+def test_parse_lag_spike_line():
+    assert bot.parse_lag_spike_line(SPIKE_LINE) == (2345, 46)
+    assert bot.parse_lag_spike_line("[12:00:00] [Server thread/INFO]: Steve joined the game") is None
+
+
+def test_spike_records_players_and_recent_joins():
+    for name, ts in (("Veteran", 1000), ("Newbie", 9900), ("Visitor", 9800)):
+        bot.record_player_join(name, now=ts)
+        bot.record_join_event(name, now=ts)
+    bot.record_player_leave("Visitor", now=9950)
+    # A reconcile (or bot restart) starts a session now without a join line
+    bot.reconcile_presence(["Veteran", "Newbie", "Lurker"], now=9990)
+
+    bot.record_lag_spike(2345, 46, now=10000)
+
+    spike = bot.lag_spikes[-1]
+    assert spike["players"] == 3
+    assert spike["joins"] == ["Newbie", "Visitor"]
+
+
+def test_sustained_spikes_alert_once_per_cooldown(monkeypatch):
+    monkeypatch.setattr(bot, "LAG_ALERT_SPIKES", 3)
+    now = 100000
+    for i in range(2):
+        bot.record_lag_spike(1000, 20, now=now + i)
+        assert bot.check_lag_spike_alert(now=now + i) is None
+
+    bot.record_lag_spike(1500, 30, now=now + 2)
+    alert = bot.check_lag_spike_alert(now=now + 2)
+    assert "`3`" in alert and "`3.5s` behind" in alert
+
+    bot.record_lag_spike(1500, 30, now=now + 3)
+    assert bot.check_lag_spike_alert(now=now + 3) is None
+
+
+def test_digest_timeline_and_join_correlation():
+    start = 50000
+    bot.record_player_join("Builder", now=start + 3000)
+    bot.record_join_event("Builder", now=start + 3000)
+    bot.record_lag_spike(500, 10, now=start + 100)
+    bot.record_lag_spike(4000, 80, now=start + 3100)
+    bot.record_lag_spike(3000, 60, now=start + 3200)
+
+    digest = bot.format_lag_digest(start, start + 3600)
+
+    assert "Spikes: `3`" in digest
+    assert "Worst: `4000ms`" in digest
+    assert "`Builder` - 2 spike(s)" in digest
+    assert "`▅▁▁▁▁█`" in digest
+    assert bot.format_lag_digest(start + 3600, start + 7200) is None
+
+
+def test_sparkline_scales_to_max():
+    assert bot.sparkline([0, 4, 8]) == "▁▅█"
+    assert bot.sparkline([0, 0]) == "▁▁"
@@ -0,0 +1,76 @@
+import sys
+import threading
+import urllib.request
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(bot, "metric_values", {})
+    monkeypatch.setattr(bot, "monitor_threads", {})
+
+
+def test_histogram_renders_cumulative_buckets():
+    bot.metric_observe("minecraft_bot_rcon_seconds", 0.003)
+    bot.metric_observe("minecraft_bot_rcon_seconds", 0.2)
+    bot.metric_observe("minecraft_bot_rcon_seconds", 100)
+
+    text = bot.render_metrics()
+
+    assert "# TYPE minecraft_bot_rcon_seconds histogram" in text
+    assert 'minecraft_bot_rcon_seconds_bucket{le="0.005"} 1' in text
+    assert 'minecraft_bot_rcon_seconds_bucket{le="0.25"} 2' in text
+    assert 'minecraft_bot_rcon_seconds_bucket{le="60"} 2' in text
+    assert 'minecraft_bot_rcon_seconds_bucket{le="+Inf"} 3' in text
+    assert "minecraft_bot_rcon_seconds_count 3" in text
+
+
+def test_counters_and_labels_are_escaped():
+    bot.metric_inc("minecraft_bot_telegram_rate_limited_total", method="sendMessage")
+    bot.metric_inc("minecraft_bot_telegram_rate_limited_total", method="sendMessage")
+    bot.metric_inc("minecraft_bot_telegram_errors_total", method='we"ird')
+
+    text = bot.render_metrics()
+
+    assert 'minecraft_bot_telegram_rate_limited_total{method="sendMessage"} 2' in text
+    assert 'minecraft_bot_telegram_errors_total{method="we\\"ird"} 1' in text
+
+
+def test_rcon_timeout_is_counted(monkeypatch):
+    def fake_run(*_a, **_k):
+        raise bot.subprocess.TimeoutExpired(cmd="rcon-cli", timeout=5)
+
+    monkeypatch.setattr(bot.subprocess, "run", fake_run)
+
+    assert "Timeout" in bot.rcon_command("list")
+    assert bot.metric_values[("minecraft_bot_rcon_timeouts_total", ())] == 1
+    assert bot.metric_values[("minecraft_bot_rcon_seconds", ())][2] == 1
+
+
+def test_metrics_endpoint_serves_thread_liveness():
+    stop = threading.Event()
+    bot.start_monitor("log", stop.wait)
+    server = bot.http.server.ThreadingHTTPServer(("127.0.0.1", 0), bot.MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            body = resp.read().decode()
+            assert resp.headers["Content-Type"].startswith("text/plain")
+        assert 'minecraft_bot_thread_alive{thread="log"} 1' in body
+    finally:
+        stop.set()
+        server.shutdown()
+        server.server_close()
+
+
+def test_metrics_server_disabled_without_port():
+    assert bot.start_metrics_server(port=0) is None
@@ -13,6 +13,9 @@ from scripts.minecraft_bot import (
     parse_join_line,
     parse_death_line,
     parse_blocked_whitelist_line,
+    parse_leave_line,
+    parse_player_list_output,
+    format_duration,
     format_playtime_message,
     get_online_players_msg,
     parse_allowed_chat_ids,
@@ -86,6 +89,57 @@ def test_parse_blocked_whitelist_line_invalid():
     line = "[12:00:04] [Server thread/INFO]: Disconnecting Herobrine (Timed out)"
     assert parse_blocked_whitelist_line(line) is None
 
+def test_parse_leave_line_valid():
+    assert parse_leave_line("[12:00:05] [Server thread/INFO]: Alex left the game") == "Alex"
+    assert parse_leave_line("[12:00:05] [Server thread/INFO]: Alex lost connection: Kicked by an operator") == "Alex"
+
+def test_parse_leave_line_ignores_chat():
+    assert parse_leave_line("[12:00:05] [Server thread/INFO]: <Steve> Alex left the game") is None
+
+def test_parse_player_list_output():
+    assert parse_player_list_output("There are 2 of a max of 20 players online: Steve, Alex") == ["Steve", "Alex"]
+    assert parse_player_list_output("There are 0 of a max of 20 players online:") == []
+    assert parse_player_list_output("⚠️ Error: RCON Timeout (Server Busy)") is None
+
+def test_format_duration():
+    assert format_duration(42) == "42s"
+    assert format_duration(600) == "10m"
+    assert format_duration(3900) == "1h 05m"
+
+def test_presence_tracks_sessions_and_reconciles(monkeypatch):
+    from scripts import minecraft_bot as bot
+
+    bot.clear_presence()
+    bot.reconcile_presence(["Steve"], max_players=20, now=100)
+    bot.record_player_join("Alex", now=150)
+
+    assert bot.get_online_players_list() == ["Steve", "Alex"]
+    assert bot.get_player_session_seconds("Alex", now=200) == 50
+    assert bot.record_player_leave("Steve", now=400) == 300
+    assert bot.record_player_leave("Steve", now=400) is None
+
+    # Reconcile keeps known session starts and drops players that are gone
+    bot.reconcile_presence(["Alex", "Herobrine"], now=500)
+    assert bot.get_player_session_seconds("Alex", now=500) == 350
+    assert bot.get_player_session_seconds("Herobrine", now=500) == 0
+    bot.clear_presence()
+
+def test_get_online_players_list_served_from_memory(monkeypatch):
+    from scripts import minecraft_bot as bot
+
+    calls = []
+    def fake_rcon(cmd):
+        calls.append(cmd)
+        return "There are 1 of a max of 20 players online: Steve"
+
+    monkeypatch.setattr(bot, "rcon_command", fake_rcon)
+    bot.clear_presence()
+
+    assert bot.get_online_players_list() == ["Steve"]
+    assert bot.get_online_players_list() == ["Steve"]
+    assert calls == ["list"]
+    bot.clear_presence()
+
 def test_escape_markdown_escapes_special_characters():
     raw = r"A_*[]()`\\B"
     assert escape_markdown(raw) == r"A\_\*\[\]\(\)\`\\\\B"
@@ -103,6 +157,81 @@ def test_get_online_players_msg_escapes_inline_keyboard_text(monkeypatch):
     assert "Online Players" in msg
     assert kb["inline_keyboard"][0][0]["text"] == r"👤 Bad\_\*\[\]\(\)\`,\\Name"
 
+def test_get_online_players_msg_pages_and_uses_short_tokens(monkeypatch):
+    from scripts import minecraft_bot as bot
+
+    players = [f"Player{i:03d}" for i in range(250)]
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: players)
+
+    msg, kb = bot.get_online_players_msg(page=12)
+    rows = kb["inline_keyboard"]
+    buttons = [b for row in rows[:-2] for b in row]
+
+    assert "Online Players (250)" in msg
+    assert len(buttons) == 10
+    assert rows[-2][1]["text"] == "13/13"
+    assert rows[-2][2]["callback_data"] == "online:0"
+    for button in buttons:
+        assert len(button["callback_data"].encode()) <= 64
+        token = button["callback_data"].split(":", 1)[1]
+        assert bot.resolve_player_token(token) == button["text"].split(" ", 1)[1]
+
+def test_player_tokens_are_stable_and_legacy_names_pass_through():
+    from scripts import minecraft_bot as bot
+
+    token = bot.get_player_token("Steve")
+    assert bot.get_player_token("Steve") == token
+    assert token.startswith("~")
+    assert bot.resolve_player_token("Steve") == "Steve"
+    assert bot.resolve_player_token("~zzzzzz") is None
+
+def test_evicted_player_tokens_are_never_reused(monkeypatch):
+    from scripts import minecraft_bot as bot
+
+    monkeypatch.setattr(bot, "PLAYER_TOKEN_LIMIT", 2)
+    monkeypatch.setattr(bot, "player_tokens", {})
+    monkeypatch.setattr(bot, "token_players", {})
+    monkeypatch.setattr(bot, "player_token_state", {"next": 0, "epoch": "a1"})
+
+    steve = bot.get_player_token("Steve")
+    bot.get_player_token("Alex")
+    herobrine = bot.get_player_token("Herobrine")
+
+    # A stale Steve button must not act on whoever got the next id
+    assert bot.resolve_player_token(steve) is None
+    assert herobrine != steve
+    assert bot.resolve_player_token(herobrine) == "Herobrine"
+    assert bot.get_player_token("Steve") not in (steve, herobrine)
+
+def test_player_tokens_from_a_previous_process_expire(monkeypatch):
+    from scripts import minecraft_bot as bot
+
+    monkeypatch.setattr(bot, "player_tokens", {})
+    monkeypatch.setattr(bot, "token_players", {})
+    monkeypatch.setattr(bot, "player_token_state", {"next": 0, "epoch": "a1"})
+    old = bot.get_player_token("Steve")
+
+    # Bot restart: new epoch, numbering starts over
+    monkeypatch.setattr(bot, "player_tokens", {})
+    monkeypatch.setattr(bot, "token_players", {})
+    monkeypatch.setattr(bot, "player_token_state", {"next": 0, "epoch": "b2"})
+    bot.get_player_token("Herobrine")
+
+    assert old == "~a1.0"
+    assert bot.resolve_player_token(old) is None
+
+def test_handle_callback_reports_expired_player_token(monkeypatch):
+    from scripts import minecraft_bot as bot
+
+    answers = []
+    monkeypatch.setattr(bot, "ALLOWED_CHAT_IDS", [123])
+    monkeypatch.setattr(bot, "answer_callback", lambda _id, text: answers.append(text))
+    monkeypatch.setattr(bot, "rcon_command", MagicMock(side_effect=AssertionError("no RCON")))
+
+    bot.handle_callback({"id": "1", "data": "kick:~zzzzzz", "message": {"chat": {"id": 123}, "message_id": 5}})
+
+    assert answers == ["⌛ Button expired, refresh the list."]
+
 def test_parse_allowed_chat_ids_ignores_invalid_values():
     raw = "123, abc, , -100456, 42x, 7"
     assert parse_allowed_chat_ids(raw) == [123, -100456, 7]
@@ -35,3 +35,46 @@ def test_monitor_logs_uses_configured_compose_file(monkeypatch):
         "--tail=0",
         bot.CONTAINER_NAME,
     ]
+
+
+def test_monitor_logs_drops_presence_when_stream_ends(monkeypatch):
+    fake_process = MagicMock()
+    fake_process.stdout.readline.side_effect = [
+        "[12:00:00] [Server thread/INFO]: Alex joined the game\n",
+        "",
+    ]
+    seen = []
+
+    def next_stream(*args, **kwargs):
+        if seen:
+            # Second pass: the index from the ended stream must be gone
+            seen.append((dict(bot.presence_sessions), bot.presence_state["synced"]))
+            raise KeyboardInterrupt()
+        seen.append(None)
+        return fake_process
+
+    monkeypatch.setattr(bot, "presence_sessions", {})
+    monkeypatch.setattr(bot, "presence_state", {"synced": False, "max_players": 20})
+    monkeypatch.setattr(bot, "join_events", bot.collections.deque(maxlen=100))
+    monkeypatch.setattr(bot, "sync_presence_from_rcon", lambda: bot.reconcile_presence(["Steve"]))
+    monkeypatch.setattr(bot, "broadcast_message", MagicMock())
+    monkeypatch.setattr(subprocess, "check_output", MagicMock(return_value=b"true"))
+    monkeypatch.setattr(subprocess, "Popen", next_stream)
+
+    with pytest.raises(KeyboardInterrupt):
+        bot.monitor_logs()
+
+    assert seen[1] == ({}, False)
+
+
+def test_monitor_logs_drops_presence_when_container_stops(monkeypatch):
+    monkeypatch.setattr(bot, "presence_sessions", {"Steve": 100})
+    monkeypatch.setattr(bot, "presence_state", {"synced": True, "max_players": 20})
+    monkeypatch.setattr(subprocess, "check_output", MagicMock(return_value=b"false"))
+    monkeypatch.setattr(bot.shutdown_event, "wait", MagicMock(side_effect=KeyboardInterrupt()))
+
+    with pytest.raises(KeyboardInterrupt):
+        bot.monitor_logs()
+
+    assert bot.presence_sessions == {}
+    assert bot.presence_state["synced"] is False
@@ -0,0 +1,124 @@
+import os
+import sys
+import zipfile
+import zlib
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def fork_workers(monkeypatch):
+    # Workers started fresh would not see the sys.modules stand-ins above
+    monkeypatch.setattr(bot, "PROCESS_POOL_START_METHOD", "fork")
+
+
+def test_crc32_combine_matches_zlib():
+    a = os.urandom(1000)
+    b = os.urandom(3333)
+    assert bot.crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)) == zlib.crc32(a + b)
+    assert bot.crc32_combine(zlib.crc32(a), zlib.crc32(b""), 0) == zlib.crc32(a)
+
+
+def test_write_parallel_zip_is_readable_by_zipfile(tmp_path):
+    src = tmp_path / "world"
+    (src / "region").mkdir(parents=True)
+    files = {
+        "region/r.0.0.mca": os.urandom(50000) + b"\0" * 50000,
+        "level.dat": b"level",
+        "empty.txt": b"",
+        "données/ünïcode.json": b'{"ok": true}' * 100,
+    }
+    for rel, data in files.items():
+        path = src / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    out = tmp_path / "world.zip"
+    # Tiny pieces force multi-piece members and CRC combining
+    stats = bot.write_parallel_zip(str(src), str(out), workers=2, level=6, piece_size=8192)
+
+    assert stats["files"] == 4
+    assert stats["raw_bytes"] == sum(len(d) for d in files.values())
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert sorted(zf.namelist()) == sorted(files)
+        for rel, data in files.items():
+            assert zf.read(rel) == data
+    assert not (tmp_path / "world.zip.part").exists()
+
+
+def test_run_archive_backup_writes_into_backup_dir(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    world.mkdir()
+    (world / "level.dat").write_bytes(b"level")
+    monkeypatch.setattr(bot, "is_container_running", lambda: False)
+    monkeypatch.setattr(bot, "BACKUP_ARCHIVE_WORKERS", 1)
+
+    ok, msg = bot.run_archive_backup(str(world), str(tmp_path / "backups"))
+
+    assert ok is True
+    archives = os.listdir(tmp_path / "backups")
+    assert len(archives) == 1 and archives[0].endswith(".zip")
+    assert "Workers: `1`" in msg
+
+
+def archive_env(tmp_path, monkeypatch):
+    world = tmp_path / "world"
+    (world / "region").mkdir(parents=True)
+    (world / "level.dat").write_bytes(b"level")
+    (world / "region" / "r.0.0.mca").write_bytes(b"region")
+    events = []
+    monkeypatch.setattr(bot, "BACKUP_DIR", str(tmp_path / "backups"))
+    monkeypatch.setattr(bot, "is_container_running", lambda: True)
+    monkeypatch.setattr(bot, "flush_world_saves", lambda: events.append("save-off") or True)
+    monkeypatch.setattr(bot, "resume_world_saves", lambda: events.append("save-on"))
+    monkeypatch.setattr(bot, "write_parallel_zip", lambda src, out: events.append(src) or {
+        "duration": 1.0, "raw_bytes": 5, "archive_bytes": 5, "files": 1, "workers": 1,
+    })
+    return world, events
+
+
+def test_archive_compresses_a_cloned_stage_after_saving_resumes(tmp_path, monkeypatch):
+    world, events = archive_env(tmp_path, monkeypatch)
+
+    def fake_reflink(src, dst, allow_copy=True):
+        assert allow_copy is False
+        bot.shutil.copy2(src, dst)
+        return "reflink"
+
+    monkeypatch.setattr(bot, "clone_file", fake_reflink)
+
+    ok, msg = bot.run_archive_backup(str(world), str(tmp_path / "backups"))
+
+    stage = bot._default_stage_dir(str(world))
+    assert ok is True
+    # Saving is back on before compression starts
+    assert events == ["save-off", "save-on", stage]
+    assert not os.path.exists(stage)
+    assert "live world" not in msg
+
+
+def test_archive_falls_back_to_the_live_world_without_reflinks(tmp_path, monkeypatch):
+    world, events = archive_env(tmp_path, monkeypatch)
+
+    def no_reflink(src, dst, allow_copy=True):
+        raise bot.CloneUnavailableError(f"cannot reflink {src}")
+
+    monkeypatch.setattr(bot, "clone_file", no_reflink)
+    monkeypatch.setattr(bot, "BACKUP_SAVE_WINDOW_WARN_SECONDS", 0)
+
+    ok, msg = bot.run_archive_backup(str(world), str(tmp_path / "backups"))
+
+    assert ok is True
+    # No full copy: the zip reads the world dir between save-off and save-on
+    assert events[-3:] == ["save-off", str(world), "save-on"]
+    assert not os.path.exists(bot._default_stage_dir(str(world)))
+    assert "compressed the live world" in msg
+    assert "paused longer than `0s`" in msg
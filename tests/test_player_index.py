@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+def setup_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "PROPERTIES_FILE", str(tmp_path / "server.properties"))
+    (tmp_path / "usercache.json").write_text(json.dumps([
+        {"uuid": "u1", "name": "Steve"},
+        {"uuid": "u2", "name": "Stella"},
+        {"uuid": "u3", "name": "Alex"},
+    ]))
+    (tmp_path / "whitelist.json").write_text(json.dumps([
+        {"uuid": "u1", "name": "Steve"},
+        {"uuid": "u3", "name": "Alex"},
+    ]))
+    (tmp_path / "ops.json").write_text(json.dumps([{"uuid": "u1", "name": "Steve", "level": 4}]))
+    (tmp_path / "banned-players.json").write_text(json.dumps([{"uuid": "u2", "name": "Stella"}]))
+
+
+def test_lookups_by_uuid_name_and_prefix(tmp_path, monkeypatch):
+    setup_data_dir(tmp_path, monkeypatch)
+
+    assert bot.lookup_player_name("u2") == "Stella"
+    assert bot.lookup_player_uuid("steve") == "u1"
+    assert bot.lookup_player_uuid("Nobody") is None
+    assert bot.search_player_names("ST") == ["Stella", "Steve"]
+    assert bot.search_player_names("x") == []
+
+
+def test_player_flags(tmp_path, monkeypatch):
+    setup_data_dir(tmp_path, monkeypatch)
+
+    assert bot.get_player_flags("Steve") == {"ops": True, "banned": False, "whitelist": True}
+    assert bot.get_player_flags("Stella") == {"ops": False, "banned": True, "whitelist": False}
+    assert bot.get_player_flags("Unknown") == {"ops": False, "banned": False, "whitelist": False}
+
+
+def test_refresh_only_reloads_changed_files(tmp_path, monkeypatch):
+    setup_data_dir(tmp_path, monkeypatch)
+    bot.refresh_player_index()
+
+    assert bot.refresh_player_index() is False
+
+    ops = tmp_path / "ops.json"
+    ops.write_text(json.dumps([{"uuid": "u3", "name": "Alex", "level": 4}]))
+    os.utime(ops, ns=(1, 1))
+
+    assert bot.refresh_player_index() is True
+    assert bot.get_player_flags("Alex")["ops"] is True
+    assert bot.get_player_flags("Steve")["ops"] is False
+
+
+def test_get_whitelist_reads_json_without_rcon(tmp_path, monkeypatch):
+    setup_data_dir(tmp_path, monkeypatch)
+    monkeypatch.setattr(bot, "rcon_command", MagicMock(side_effect=AssertionError("no RCON")))
+
+    assert bot.get_whitelist() == "📜 *Whitelisted Players (2):*\n`Alex`, `Steve`"
+
+
+def test_get_whitelist_falls_back_to_rcon(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "PROPERTIES_FILE", str(tmp_path / "server.properties"))
+    monkeypatch.setattr(bot, "rcon_command", lambda *_a: "There are 1 whitelisted player(s): Steve")
+
+    assert bot.get_whitelist() == "📜 *Whitelisted Players (1):*\n`Steve`"
+
+
+def test_player_search_marks_online_players(tmp_path, monkeypatch):
+    setup_data_dir(tmp_path, monkeypatch)
+    monkeypatch.setattr(bot, "get_online_players_list", lambda: ["Steve", "Alex"])
+
+    msg, kb = bot.get_player_search_msg("st")
+    texts = [b["text"] for row in kb["inline_keyboard"][:-1] for b in row]
+
+    assert "(2)" in msg
+    assert texts == ["🟢 👤 Steve", "👤 Stella"]
+    assert bot.get_player_search_msg("zz")[1] is None
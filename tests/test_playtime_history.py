@@ -0,0 +1,105 @@
+import json
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+DAY = 86400
+
+
+def write_stats(stats_dir, uuid, ticks):
+    payload = {"stats": {"minecraft:custom": {"minecraft:play_time": ticks}}}
+    (stats_dir / f"{uuid}.json").write_text(json.dumps(payload))
+
+
+def test_first_sample_only_sets_baseline(tmp_path):
+    db = str(tmp_path / "history.db")
+
+    assert bot.record_playtime_sample({"u1": 72000}, now=10 * DAY, db_path=db) == 0
+    assert bot.query_playtime_since(0, db_path=db) == []
+
+
+def test_deltas_accumulate_and_rank(tmp_path):
+    db = str(tmp_path / "history.db")
+    start = 10 * DAY
+
+    bot.record_playtime_sample({"u1": 1000, "u2": 1000}, now=start, db_path=db)
+    bot.record_playtime_sample({"u1": 1600, "u2": 1100}, now=start + 600, db_path=db)
+    bot.record_playtime_sample({"u1": 1700, "u2": 2100}, now=start + 1200, db_path=db)
+
+    assert bot.query_playtime_since(start, db_path=db) == [("u2", 1100), ("u1", 700)]
+    assert bot.query_playtime_since(start + DAY, db_path=db) == []
+
+
+def test_query_includes_partially_covered_first_hour(tmp_path):
+    db = str(tmp_path / "history.db")
+    start = 10 * DAY
+
+    bot.record_playtime_sample({"u1": 1000}, now=start, db_path=db)
+    bot.record_playtime_sample({"u1": 1500}, now=start + 3000, db_path=db)
+
+    # A window starting mid-hour still sees that hour's bucket
+    assert bot.query_playtime_since(start + 1800, db_path=db) == [("u1", 500)]
+    assert bot.query_playtime_since(start + 3600, db_path=db) == []
+
+
+def test_counter_reset_counts_from_zero(tmp_path):
+    db = str(tmp_path / "history.db")
+
+    bot.record_playtime_sample({"u1": 5000}, now=10 * DAY, db_path=db)
+    bot.record_playtime_sample({"u1": 300}, now=10 * DAY + 60, db_path=db)
+
+    assert bot.query_playtime_since(0, db_path=db) == [("u1", 300)]
+
+
+def test_compaction_folds_old_hours_into_days(tmp_path, monkeypatch):
+    db = str(tmp_path / "history.db")
+    monkeypatch.setattr(bot, "PLAYTIME_HOURLY_RETENTION_DAYS", 2)
+    day_start = 10 * DAY
+
+    bot.record_playtime_sample({"u1": 0}, now=day_start, db_path=db)
+    bot.record_playtime_sample({"u1": 100}, now=day_start + 3600, db_path=db)
+    bot.record_playtime_sample({"u1": 250}, now=day_start + 7200, db_path=db)
+
+    assert bot.compact_playtime_history(now=day_start + 5 * DAY, db_path=db) == 1
+
+    conn = bot._open_playtime_db(db)
+    try:
+        rows = conn.execute("SELECT bucket, uuid, ticks FROM playtime_deltas").fetchall()
+    finally:
+        conn.close()
+    assert rows == [(day_start, "u1", 250)]
+
+
+def test_read_stats_play_ticks_skips_unchanged_files(tmp_path, monkeypatch):
+    write_stats(tmp_path, "u1", 400)
+    (tmp_path / "notes.txt").write_text("ignored")
+    bot.playtime_file_cache.clear()
+
+    assert bot.read_stats_play_ticks(str(tmp_path)) == {"u1": 400}
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+
+    assert bot.read_stats_play_ticks(str(tmp_path)) == {"u1": 400}
+    assert opened == []
+
+
+def test_get_playtime_period_top_maps_names(tmp_path, monkeypatch):
+    db = str(tmp_path / "history.db")
+    (tmp_path / "usercache.json").write_text(json.dumps([{"uuid": "u1", "name": "Steve"}]))
+    monkeypatch.setattr(bot, "PROPERTIES_FILE", str(tmp_path / "server.properties"))
+    monkeypatch.setattr(bot, "PLAYTIME_HISTORY_DB", db)
+
+    now = bot.time.time()
+    bot.record_playtime_sample({"u1": 0}, now=now - 60, db_path=db)
+    bot.record_playtime_sample({"u1": 72000}, now=now, db_path=db)
+
+    msg = bot.get_playtime_period_top("week")
+    assert "This Week" in msg
+    assert "1. 👤 *Steve:* `1.0 hours`" in msg
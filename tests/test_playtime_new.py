@@ -1,8 +1,9 @@
 import unittest
-from unittest.mock import MagicMock, patch, mock_open
+from unittest.mock import MagicMock, patch
 import json
 import os
 import sys
+import tempfile
 
 # Mock dependencies that are not installed or have side effects on import
 # We do this BEFORE importing minecraft_bot to prevent ModuleNotFoundError or execution
@@ -16,51 +17,45 @@ if os.getcwd() not in sys.path:
 from scripts.minecraft_bot import get_playtime_top, format_playtime_message
 
 class TestPlaytime(unittest.TestCase):
-    @patch('scripts.minecraft_bot.os.path.exists')
-    @patch('scripts.minecraft_bot.os.listdir')
-    @patch('scripts.minecraft_bot.open')
-    @patch('scripts.minecraft_bot.os.path.dirname')
-    def test_get_playtime_top(self, mock_dirname, mock_file_open, mock_listdir, mock_exists):
-        # Setup mocks
-        mock_dirname.return_value = "/data"
-        mock_exists.return_value = True
-        mock_listdir.return_value = ["uuid1.json", "uuid2.json", "other.txt"]
-
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        os.makedirs(os.path.join(self.data_dir, "world", "stats"))
+        self.props_patch = patch('scripts.minecraft_bot.PROPERTIES_FILE',
+                                 os.path.join(self.data_dir, "server.properties"))
+        self.props_patch.start()
+
+    def tearDown(self):
+        self.props_patch.stop()
+        self.tmp.cleanup()
+
+    def write_json(self, rel_path, data):
+        with open(os.path.join(self.data_dir, rel_path), "w") as f:
+            json.dump(data, f)
+
+    def test_get_playtime_top(self):
         # User cache content
-        user_cache_data = [
+        self.write_json("usercache.json", [
             {"uuid": "uuid1", "name": "Player1"},
             {"uuid": "uuid2", "name": "Player2"}
-        ]
+        ])
 
         # Stats content
-        stats_uuid1 = {
+        self.write_json("world/stats/uuid1.json", {
             "stats": {
                 "minecraft:custom": {
                     "minecraft:play_time": 72000 # 1 hour
                 }
             }
-        }
-        stats_uuid2 = {
+        })
+        self.write_json("world/stats/uuid2.json", {
             "stats": {
                 "minecraft:custom": {
                     "minecraft:play_time": 144000 # 2 hours
                 }
             }
-        }
-
-        def side_effect(filename, mode='r'):
-            content = "{}"
-            if "usercache.json" in filename:
-                content = json.dumps(user_cache_data)
-            elif "uuid1.json" in filename:
-                content = json.dumps(stats_uuid1)
-            elif "uuid2.json" in filename:
-                content = json.dumps(stats_uuid2)
-
-            m = mock_open(read_data=content).return_value
-            return m
-
-        mock_file_open.side_effect = side_effect
+        })
+        self.write_json("world/stats/other.txt", {})
 
         # Run function
         result = get_playtime_top()
@@ -71,22 +66,9 @@ class TestPlaytime(unittest.TestCase):
         self.assertIn("1. 👤 *Player2:* `2.0 hours`", result)
         self.assertIn("2. 👤 *Player1:* `1.0 hours`", result)
 
-    @patch('scripts.minecraft_bot.os.path.exists')
-    @patch('scripts.minecraft_bot.os.listdir')
-    @patch('scripts.minecraft_bot.open')
-    @patch('scripts.minecraft_bot.os.path.dirname')
-    def test_get_playtime_top_empty(self, mock_dirname, mock_file_open, mock_listdir, mock_exists):
-        # Setup mocks for empty result
-        mock_dirname.return_value = "/data"
-        mock_exists.return_value = True
-        mock_listdir.return_value = [] # No files
-
-        def side_effect(filename, mode='r'):
-            if "usercache.json" in filename:
-                return mock_open(read_data="[]").return_value
-            return mock_open(read_data="{}").return_value
-
-        mock_file_open.side_effect = side_effect
+    def test_get_playtime_top_empty(self):
+        # No stats files
+        self.write_json("usercache.json", [])
 
         # Run function
         result = get_playtime_top()
@@ -0,0 +1,93 @@
+import struct
+import sys
+import zlib
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+@pytest.fixture(autouse=True)
+def small_history(monkeypatch):
+    monkeypatch.setattr(bot, "resource_history", bot._new_resource_history(6))
+    monkeypatch.setattr(bot, "resource_history_state", {"next": 0, "count": 0})
+    monkeypatch.setattr(bot, "resource_alert_state", {})
+
+
+def test_ring_buffer_wraps_and_skips_missing_values():
+    for i in range(9):
+        bot.record_resource_sample(1000.0 + i, cpu=float(i), mem=50.0, players=None if i % 2 else 3)
+
+    assert bot.get_resource_series("cpu") == [(1000.0 + i, float(i)) for i in range(3, 9)]
+    assert [ts for ts, _ in bot.get_resource_series("players")] == [1004.0, 1006.0, 1008.0]
+    assert bot.get_resource_series("mspt") == []
+    assert [v for _, v in bot.get_resource_series("cpu", since=1007.0)] == [7.0, 8.0]
+
+
+def test_memory_alert_needs_the_whole_window_over_threshold(monkeypatch):
+    monkeypatch.setattr(bot, "resource_history", bot._new_resource_history(100))
+    monkeypatch.setattr(bot, "RESOURCE_SAMPLE_SECONDS", 10)
+    monkeypatch.setattr(bot, "RESOURCE_ALERT_WINDOW_MINUTES", 5)
+    monkeypatch.setattr(bot, "RESOURCE_MEM_ALERT_PERCENT", 90)
+    now = 100000.0
+
+    # One dip below the threshold inside the window keeps it quiet
+    for i in range(30):
+        bot.record_resource_sample(now - 290 + i * 10, mem=80.0 if i == 12 else 95.0)
+    assert bot.check_resource_alerts(now) == []
+
+    for i in range(30):
+        bot.record_resource_sample(now + 10 + i * 10, mem=95.0)
+    messages = bot.check_resource_alerts(now + 300)
+    assert len(messages) == 1
+    assert "High 💾 RAM Usage" in messages[0]
+    # Cooldown suppresses the repeat
+    assert bot.check_resource_alerts(now + 310) == []
+
+
+def test_sparse_window_does_not_count_as_sustained(monkeypatch):
+    monkeypatch.setattr(bot, "resource_history", bot._new_resource_history(100))
+    monkeypatch.setattr(bot, "RESOURCE_SAMPLE_SECONDS", 10)
+    monkeypatch.setattr(bot, "RESOURCE_MEM_ALERT_PERCENT", 90)
+    bot.record_resource_sample(99990.0, mem=99.0)
+    assert bot.check_resource_alerts(100000.0) == []
+
+
+def read_png(data):
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, chunks = 8, {}
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        (crc,) = struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(kind + body) & 0xFFFFFFFF
+        chunks[kind] = chunks.get(kind, b"") + body
+        pos += 12 + length
+    return chunks
+
+
+def test_chart_is_a_valid_indexed_png():
+    png = bot.render_chart_png([10, 50, 90, 40], width=64, height=32, threshold=80, ceiling=100)
+    chunks = read_png(png)
+
+    width, height, depth, color_type = struct.unpack(">IIBB", chunks[b"IHDR"][:10])
+    assert (width, height, depth, color_type) == (64, 32, 8, 3)
+    assert len(chunks[b"PLTE"]) == 3 * len(bot.CHART_PALETTE)
+    raw = zlib.decompress(chunks[b"IDAT"])
+    assert len(raw) == height * (width + 1)
+    rows = [raw[y * 65 + 1:(y + 1) * 65] for y in range(height)]
+    # The data line and the threshold line are both drawn
+    assert any(3 in row for row in rows)
+    assert any(4 in row for row in rows)
+    assert b"IEND" in chunks
+
+
+def test_graph_chart_reports_missing_data():
+    png, caption = bot.get_resource_chart("mspt", 6)
+    assert png is None
+    assert "No ⏱️ MSPT data" in caption
@@ -0,0 +1,108 @@
+import http.server
+import json
+import socketserver
+import sys
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+def write_cgroup(path, usage_usec, memory=600 * 1024 * 1024, limit="1073741824"):
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "memory.current").write_text(f"{memory}\n")
+    (path / "memory.max").write_text(f"{limit}\n")
+    (path / "memory.stat").write_text("anon 400000000\ninactive_file 104857600\nactive_file 1000\n")
+    (path / "cpu.stat").write_text(f"usage_usec {usage_usec}\nuser_usec 1\nsystem_usec 2\n")
+    (path / "io.stat").write_text("8:0 rbytes=1000 wbytes=2000 rios=1 wios=2\n259:0 rbytes=24 wbytes=48 rios=0 wios=0\n")
+
+
+@pytest.fixture(autouse=True)
+def fresh_sampler(monkeypatch):
+    monkeypatch.setattr(bot, "cgroup_state", {"path": None, "checked": 0})
+    monkeypatch.setattr(bot, "resource_last", {"ts": None, "cpu_usec": None, "source": None})
+
+
+def test_find_container_cgroup_uses_known_layouts(tmp_path):
+    scope = tmp_path / "system.slice" / "docker-abc123.scope"
+    write_cgroup(scope, 0)
+    assert bot.find_container_cgroup("abc123", "999999999", root=str(tmp_path)) == str(scope)
+    assert bot.find_container_cgroup("other", "999999999", root=str(tmp_path)) is None
+
+
+def test_cgroup_sample_and_cpu_delta(tmp_path, monkeypatch):
+    cgroup = tmp_path / "cg"
+    write_cgroup(cgroup, usage_usec=5_000_000)
+    monkeypatch.setattr(bot, "cgroup_state", {"path": str(cgroup), "checked": 0})
+
+    first = bot.sample_container_resources(now=100.0)
+    assert first["source"] == "cgroup"
+    assert first["cpu_percent"] is None
+    assert first["mem_bytes"] == 500 * 1024 * 1024
+    assert first["mem_percent"] == pytest.approx(500 / 1024 * 100)
+    assert (first["io_read"], first["io_write"]) == (1024, 2048)
+
+    # 1.5 CPU-seconds over 2 wall seconds = 75% of one core
+    write_cgroup(cgroup, usage_usec=6_500_000)
+    second = bot.sample_container_resources(now=102.0)
+    assert second["cpu_percent"] == pytest.approx(75.0)
+
+
+def test_unlimited_memory_uses_host_total(tmp_path, monkeypatch):
+    cgroup = tmp_path / "cg"
+    write_cgroup(cgroup, 0, limit="max")
+    monkeypatch.setattr(bot, "_read_host_memory", lambda: 8 * 1024 ** 3)
+
+    assert bot.read_cgroup_sample(str(cgroup))["mem_limit"] == 8 * 1024 ** 3
+
+
+class FakeDockerApi(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        assert "one-shot=true" in self.path
+        body = json.dumps({
+            "memory_stats": {"usage": 300, "limit": 1000, "stats": {"inactive_file": 100}},
+            "cpu_stats": {"cpu_usage": {"total_usage": 4_000_000_000}},
+            "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": 7}, {"op": "write", "value": 9}]},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return "unix"
+
+    def log_message(self, *args):
+        pass
+
+
+def test_falls_back_to_docker_api_when_cgroup_unreadable(tmp_path, monkeypatch):
+    sock_path = str(tmp_path / "docker.sock")
+    server = socketserver.UnixStreamServer(sock_path, FakeDockerApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(bot, "DOCKER_SOCKET", sock_path)
+    monkeypatch.setattr(bot, "resolve_container_cgroup", lambda now: None)
+    try:
+        sample = bot.sample_container_resources(now=50.0)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sample["source"] == "docker-api"
+    assert sample["mem_bytes"] == 200
+    assert sample["mem_percent"] == 20.0
+    assert sample["cpu_usec"] == 4_000_000
+    assert (sample["io_read"], sample["io_write"]) == (7, 9)
+
+
+def test_get_server_stats_offline_when_nothing_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "resolve_container_cgroup", lambda now: None)
+    monkeypatch.setattr(bot, "DOCKER_SOCKET", str(tmp_path / "missing.sock"))
+    assert bot.get_server_stats() == "OFFLINE"
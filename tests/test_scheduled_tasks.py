@@ -0,0 +1,149 @@
+import datetime
+import json
+import sys
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+class InlinePool:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def local_ts(*args):
+    return datetime.datetime(*args).timestamp()
+
+
+@pytest.fixture(autouse=True)
+def fresh_tasks(monkeypatch, tmp_path):
+    monkeypatch.setattr(bot, "SCHEDULED_TASKS_FILE", str(tmp_path / "tasks.json"))
+    monkeypatch.setattr(bot, "task_store", {"next_id": 1, "tasks": []})
+    monkeypatch.setattr(bot, "task_armed", {})
+    monkeypatch.setattr(bot, "scheduler_heap", [])
+    monkeypatch.setattr(bot, "scheduled_jobs", {})
+    monkeypatch.setattr(bot, "scheduler_state", {"seq": 0, "pool": InlinePool(), "thread": None})
+    monkeypatch.setattr(bot, "shutdown_event", threading.Event())
+    monkeypatch.setattr(bot, "idle_state", {**bot.idle_state, "paused": False})
+    monkeypatch.setattr(bot, "broadcast_message", MagicMock())
+
+
+def test_cron_next_handles_steps_ranges_and_day_fields():
+    # 2024-06-07 is a Friday
+    friday = local_ts(2024, 6, 7, 10, 7, 30)
+    assert bot.cron_next(bot.parse_cron("*/15 * * * *"), friday) == local_ts(2024, 6, 7, 10, 15)
+    assert bot.cron_next(bot.parse_cron("@daily"), friday) == local_ts(2024, 6, 8, 0, 0)
+    assert bot.cron_next(bot.parse_cron("0 9 * * 1-5"), friday) == local_ts(2024, 6, 10, 9, 0)
+    # Sunday may be written as 0 or 7
+    assert bot.cron_next(bot.parse_cron("30 4 * * 7"), friday) == local_ts(2024, 6, 9, 4, 30)
+    # Both day fields restricted: either one matches, like cron
+    assert bot.cron_next(bot.parse_cron("0 0 13 * 5"), local_ts(2024, 6, 7, 1, 0)) == local_ts(2024, 6, 13, 0, 0)
+    # Strictly after: a task that just ran is not due again in the same minute
+    assert bot.cron_next(bot.parse_cron("0 4 * * *"), local_ts(2024, 6, 7, 4, 0)) == local_ts(2024, 6, 8, 4, 0)
+    assert bot.cron_next(bot.parse_cron("0 0 29 2 *"), friday) == local_ts(2028, 2, 29, 0, 0)
+
+    for bad in ("* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *", "a * * * *"):
+        with pytest.raises(ValueError):
+            bot.parse_cron(bad)
+
+
+def test_parse_task_spec():
+    task = bot.parse_task_spec("0 4 * * * | save-all; !restart | 1,5")
+    assert task["commands"] == ["save-all", "!restart"]
+    assert task["warn"] == [5, 1]
+    assert task["label"] == "Server restart"
+    assert bot.parse_task_spec("@hourly | weather clear | | Weather reset")["label"] == "Weather reset"
+
+    with pytest.raises(ValueError, match="unknown action"):
+        bot.parse_task_spec("@daily | !reboot")
+    with pytest.raises(ValueError):
+        bot.parse_task_spec("@daily | say hi | 0")
+    with pytest.raises(ValueError):
+        bot.parse_task_spec("0 4 * *")
+
+
+def test_tasks_persist_and_reload(monkeypatch):
+    bot.add_task(bot.parse_task_spec("@daily | save-all"))
+    bot.add_task(bot.parse_task_spec("@hourly | weather clear"))
+    assert bot.remove_task(1)
+
+    data = json.loads(open(bot.SCHEDULED_TASKS_FILE).read())
+    assert [t["id"] for t in data["tasks"]] == [2]
+    assert data["next_id"] == 3
+
+    monkeypatch.setattr(bot, "task_store", {"next_id": 1, "tasks": []})
+    assert bot.arm_all_tasks() == 1
+    assert bot.task_store["next_id"] == 3
+    assert set(bot.scheduled_jobs) == {"task:2:run"}
+
+
+def test_countdown_warnings_then_batched_run_then_rearm(monkeypatch):
+    batches = []
+    monkeypatch.setattr(bot, "rcon_batch", lambda cmds: batches.append(list(cmds)) or ["ok"] * len(cmds))
+    monkeypatch.setattr(bot, "is_container_running", lambda: True)
+    restart = MagicMock(return_value="🔄 Server restarting...")
+    monkeypatch.setattr(bot, "restart_server", restart)
+
+    now = local_ts(2024, 6, 7, 3, 50)
+    task = bot.parse_task_spec("0 4 * * * | save-all; say bye; !restart; say back | 5,1,30")
+    task["id"] = 1
+    bot.task_store["tasks"].append(task)
+    at = bot.arm_task(task, now=now)
+    assert at == local_ts(2024, 6, 7, 4, 0)
+    # The 30 minute warning is already past and is left out
+    assert {name: job["next_run"] for name, job in bot.scheduled_jobs.items()} == {
+        "task:1:warn5": pytest.approx(at - 300, abs=1),
+        "task:1:warn1": pytest.approx(at - 60, abs=1),
+        "task:1:run": pytest.approx(at, abs=1),
+    }
+
+    bot.dispatch_due_jobs(now=at - 299)
+    assert batches[0][1].startswith("title @a title ")
+    assert "Server restart in 5 minutes" in batches[0][1]
+
+    monkeypatch.setattr(bot.time, "time", lambda: at + 1)
+    bot.dispatch_due_jobs(now=at + 1)
+    assert batches[-2:] == [["save-all", "say bye"], ["say back"]]
+    restart.assert_called_once()
+    assert task["last_result"] == "ok"
+    # Re-armed for the next day
+    assert bot.task_armed[1]["at"] == local_ts(2024, 6, 8, 4, 0)
+
+
+def test_task_is_skipped_while_server_is_down(monkeypatch):
+    monkeypatch.setattr(bot, "is_container_running", lambda: False)
+    monkeypatch.setattr(bot, "rcon_batch", MagicMock(side_effect=AssertionError("no RCON")))
+    bot.add_task(bot.parse_task_spec("@daily | save-all"))
+    assert bot.execute_task(1) is None
+    assert bot.get_task(1)["last_result"] == "skipped: server not running"
+
+
+def test_task_errors_are_reported(monkeypatch):
+    monkeypatch.setattr(bot, "is_container_running", lambda: True)
+    monkeypatch.setattr(bot, "rcon_batch", lambda cmds: ["Unknown or incomplete command, see below for error"])
+    bot.add_task(bot.parse_task_spec("@daily | wether clear"))
+    bot.execute_task(1)
+    assert bot.get_task(1)["last_result"] == "1 failed"
+    assert "Task #1" in bot.broadcast_message.call_args[0][0]
+
+
+def test_task_command_add_and_toggle(monkeypatch):
+    monkeypatch.setattr(bot, "send_message", MagicMock())
+    bot.handle_task_command(1, "/task add */10 * * * * | save-all")
+    assert "Task *#1* added" in bot.send_message.call_args[0][1]
+    assert "task:1:run" in bot.scheduled_jobs
+
+    bot.handle_task_command(1, "/task off #1")
+    assert not bot.get_task(1)["enabled"]
+    assert "task:1:run" not in bot.scheduled_jobs
+    assert "⏸️ off" in bot.format_tasks()
+
+    bot.handle_task_command(1, "/task add 99 * * * * | save-all")
+    assert "outside 0-59" in bot.send_message.call_args[0][1]
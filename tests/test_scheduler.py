@@ -0,0 +1,172 @@
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+class InlinePool:
+    """Runs submitted jobs right away so dispatch is deterministic."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@pytest.fixture(autouse=True)
+def fresh_scheduler(monkeypatch):
+    monkeypatch.setattr(bot, "scheduler_heap", [])
+    monkeypatch.setattr(bot, "scheduled_jobs", {})
+    monkeypatch.setattr(bot, "scheduler_state", {"seq": 0, "pool": InlinePool(), "thread": None})
+    monkeypatch.setattr(bot, "shutdown_event", threading.Event())
+    monkeypatch.setattr(bot, "monitor_threads", {})
+    monkeypatch.setattr(bot, "metric_values", {})
+
+
+def test_periodic_jobs_run_at_a_fixed_rate():
+    runs = []
+    job = bot.schedule_job("sample", lambda: runs.append(1), 10, first_delay=0, jitter=0)
+    due = job["next_run"]
+
+    wait = bot.dispatch_due_jobs(now=due + 2)
+    assert runs == [1]
+    # Measured from the due time, not from when the run finished
+    assert job["next_run"] == due + 10
+    assert wait == pytest.approx(8)
+    assert job["runs"] == 1 and job["last_seconds"] is not None
+
+    assert bot.dispatch_due_jobs(now=due + 5) == pytest.approx(5)
+    assert runs == [1]
+
+
+def test_returned_delay_overrides_the_interval():
+    job = bot.schedule_job("health", lambda: 3, 60, first_delay=0, jitter=0)
+    before = time.time()
+    bot.dispatch_due_jobs(now=job["next_run"])
+    assert before + 3 <= job["next_run"] <= time.time() + 3
+    # The fixed-rate entry queued at dispatch went stale
+    assert len([entry for entry in bot.scheduler_heap if entry[1] == job["seq"]]) == 1
+
+
+def test_running_job_is_skipped_not_overlapped():
+    job = bot.schedule_job("slow", lambda: None, 5, first_delay=0, jitter=0)
+    job["running"] = True
+    bot.dispatch_due_jobs(now=job["next_run"])
+    assert job["skipped"] == 1
+    assert job["runs"] == 0
+    assert bot.metric_values[("minecraft_bot_job_skipped_total", (("job", "slow"),))] == 1
+
+
+def test_one_shot_and_failures_are_recorded():
+    def boom():
+        raise RuntimeError("disk full")
+
+    job = bot.schedule_once("once", 0, boom)
+    bot.dispatch_due_jobs(now=job["next_run"])
+    assert "once" not in bot.scheduled_jobs
+    assert job["failures"] == 1
+    assert job["last_error"] == "disk full"
+
+    periodic = bot.schedule_job("flaky", boom, 30, first_delay=0, jitter=0)
+    bot.dispatch_due_jobs(now=periodic["next_run"])
+    text = bot.format_job_stats()
+    assert "`flaky`" in text
+    assert "`1` failed, last: `disk full`" in text
+
+
+def test_cancelled_job_never_runs():
+    runs = []
+    job = bot.schedule_job("gone", lambda: runs.append(1), 5, first_delay=0, jitter=0)
+    assert bot.cancel_job("gone")
+    bot.dispatch_due_jobs(now=job["next_run"] + 1)
+    assert runs == []
+
+
+def test_supervisor_restarts_crashed_loop():
+    calls = []
+    done = threading.Event()
+
+    def flaky_loop():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("stream broke")
+        bot.shutdown_event.set()
+        done.set()
+
+    thread = bot.supervise("log", flaky_loop, restart_delay=0.01, max_delay=0.05)
+    assert done.wait(5)
+    thread.join(5)
+    assert len(calls) == 3
+    assert bot.metric_values[("minecraft_bot_job_restarts_total", (("job", "log"),))] == 2
+
+
+def test_scheduler_thread_runs_jobs_and_stops_after_draining():
+    started = threading.Event()
+    finished = []
+
+    def slow():
+        started.set()
+        time.sleep(0.2)
+        finished.append(1)
+
+    bot.start_scheduler(workers=2)
+    bot.schedule_job("slow", slow, 60, first_delay=0, jitter=0)
+    assert started.wait(5)
+    assert bot.stop_scheduler(timeout=5)
+    assert finished == [1]
+    bot.scheduler_state["thread"].join(5)
+    assert not bot.scheduler_state["thread"].is_alive()
+
+
+def test_sigterm_only_interrupts_an_idle_poll(monkeypatch):
+    monkeypatch.setattr(bot, "polling_state", {"idle": False})
+    bot.handle_shutdown_signal(15, None)
+    assert bot.shutdown_event.is_set()
+
+    bot.polling_state["idle"] = True
+    with pytest.raises(SystemExit):
+        bot.handle_shutdown_signal(15, None)
+
+
+def test_one_shot_flag_is_set_before_the_job_is_queued(monkeypatch):
+    seen = []
+    real_push = bot._push_job
+    monkeypatch.setattr(bot, "_push_job", lambda job, *a, **k: seen.append(job["one_shot"]) or real_push(job, *a, **k))
+    bot.schedule_once("once", 5, lambda: None)
+    assert seen == [True]
+
+
+def test_shutdown_shares_one_deadline_and_cancels_backup_first(monkeypatch):
+    order = []
+    backup = {"done": threading.Event()}
+    monkeypatch.setattr(bot, "SHUTDOWN_TIMEOUT_SECONDS", 0.3)
+    monkeypatch.setattr(bot, "backup_jobs", {**bot.backup_jobs, "current": backup})
+    monkeypatch.setattr(bot, "cancel_backup_job", lambda: order.append("cancel") or True)
+    monkeypatch.setattr(bot, "log_stream", {"process": None})
+
+    def slow_stop(timeout):
+        order.append("stop")
+        time.sleep(timeout)
+        return True
+
+    monkeypatch.setattr(bot, "stop_scheduler", slow_stop)
+    started = time.time()
+    # The backup never finishes, so the scheduler used up the whole budget
+    assert bot.shutdown() is False
+    assert order == ["cancel", "stop"]
+    assert time.time() - started < 0.6
+
+
+def test_stop_scheduler_with_no_time_left_reports_busy_jobs(monkeypatch):
+    monkeypatch.setattr(bot, "scheduler_state", {"seq": 0, "pool": MagicMock(), "thread": None})
+    job = bot.schedule_job("stuck", lambda: None, 60)
+    assert bot.stop_scheduler(timeout=0) is True
+
+    job["running"] = True
+    assert bot.stop_scheduler(timeout=0) is False
@@ -0,0 +1,85 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+VANILLA_QUERY = (
+    "The game is running normally\n"
+    "Target tick rate: 20.0 per second.\n"
+    "Average time per tick: 62.5ms (Target: 50.0ms)\n"
+    "Percentiles: P50: 60.1ms P95: 70.2ms P99: 75.0ms, sample: 100"
+)
+PAPER_TPS = "§6TPS from last 1m, 5m, 15m: §a*20.0, §a19.5, §a19.87"
+PAPER_MSPT = (
+    "§6Server tick times §e(§7avg§e/§7min§e/§7max§e)§6 from last 5s§7,§6 10s§7,§6 1m§e:\n"
+    "§6◴ §a12.3§7/§a8.1§7/§a30.4§7, §a11.0§7/§a7.9§7/§a31.0§7, §a10.2§7/§a7.5§7/§a45.0"
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_tick_state(monkeypatch):
+    monkeypatch.setattr(bot, "tick_samples", bot.collections.deque(maxlen=200))
+    monkeypatch.setattr(bot, "tick_state", {"source": None, "last_alert": 0, "alerting": False})
+
+
+def test_parse_vanilla_tick_query_caps_tps_at_target():
+    assert bot.parse_vanilla_tick_query(VANILLA_QUERY) == (16.0, 62.5)
+    fast = VANILLA_QUERY.replace("62.5ms", "2.0ms")
+    assert bot.parse_vanilla_tick_query(fast) == (20.0, 2.0)
+    assert bot.parse_vanilla_tick_query("Unknown or incomplete command") is None
+
+
+def test_parse_paper_output_strips_color_codes():
+    assert bot.parse_paper_tick_output(PAPER_TPS, PAPER_MSPT) == (20.0, 12.3)
+    assert bot.parse_paper_tick_output("Unknown command", PAPER_MSPT) is None
+
+
+def test_query_tick_health_falls_back_to_paper_and_remembers(monkeypatch):
+    rcon = MagicMock(return_value="Unknown or incomplete command, see below for error")
+    monkeypatch.setattr(bot, "rcon_command", rcon)
+    monkeypatch.setattr(bot, "rcon_batch", lambda commands: [PAPER_TPS, PAPER_MSPT])
+
+    assert bot.query_tick_health() == (20.0, 12.3)
+    assert bot.tick_state["source"] == "paper"
+
+    bot.query_tick_health()
+    # Detection is cached: vanilla is not probed again
+    assert rcon.call_count == 1
+
+
+def test_alert_after_sustained_lag_then_recovery(monkeypatch):
+    monkeypatch.setattr(bot, "TICK_ALERT_SAMPLES", 3)
+    monkeypatch.setattr(bot, "TICK_MSPT_ALERT_MS", 50)
+
+    for i, mspt in enumerate([60, 70]):
+        bot.record_tick_sample(15.0, mspt, now=10000 + i * 30)
+        assert bot.check_tick_alert(now=10000 + i * 30) is None
+
+    bot.record_tick_sample(14.0, 71.0, now=10060)
+    alert = bot.check_tick_alert(now=10060)
+    assert "lagging" in alert and "`71.0` ms" in alert
+
+    # Still lagging: no repeat while the alert is active
+    bot.record_tick_sample(14.0, 80.0, now=10090)
+    assert bot.check_tick_alert(now=10090) is None
+
+    for i in range(3):
+        bot.record_tick_sample(20.0, 10.0, now=10120 + i * 30)
+    assert "recovered" in bot.check_tick_alert(now=10180)
+
+
+def test_tick_summary_percentiles(monkeypatch):
+    now = bot.time.time()
+    for i in range(1, 101):
+        bot.record_tick_sample(20.0, float(i), now=now)
+    summary = bot.get_tick_summary()
+    assert summary["p50"] == 50.0
+    assert summary["p95"] == 95.0
+    assert summary["p99"] == 99.0
+    assert "TPS" in bot.format_tick_status()
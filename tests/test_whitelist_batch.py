@@ -0,0 +1,117 @@
+import json
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies that are not installed or have side effects on import
+sys.modules["requests"] = MagicMock()
+sys.modules["dotenv"] = MagicMock()
+
+from scripts import minecraft_bot as bot
+
+
+def test_parse_player_names_splits_and_dedupes():
+    assert bot.parse_player_names("Steve, Alex  steve\nHerobrine;Notch") == ["Steve", "Alex", "Herobrine", "Notch"]
+
+
+def test_parse_player_names_csv_keeps_first_column():
+    content = "username,discord\nSteve,steve#1\n\"Alex\",alex#2\n"
+    assert bot.parse_player_names(content, csv_mode=True) == ["Steve", "Alex"]
+
+
+def test_offline_player_uuid_matches_java():
+    assert bot.offline_player_uuid("Notch") == "b50ad385-829d-3141-a216-7e7d7539ba7f"
+
+
+def test_rcon_batch_splits_prompt_output(monkeypatch):
+    captured = {}
+
+    def fake_run(cmd, input, capture_output, text, timeout):
+        captured["cmd"] = cmd
+        captured["input"] = input
+        return MagicMock(returncode=0, stdout="> Added Steve to the whitelist\n> Player is already whitelisted\n> Reloaded the whitelist\n> ", stderr="")
+
+    monkeypatch.setattr(bot.subprocess, "run", fake_run)
+
+    outputs = bot.rcon_batch(["whitelist add Steve", "whitelist add Alex", "whitelist reload"])
+
+    assert captured["cmd"] == ["docker", "exec", "-i", bot.CONTAINER_NAME, "rcon-cli"]
+    assert captured["input"] == "whitelist add Steve\nwhitelist add Alex\nwhitelist reload\n"
+    assert outputs == ["Added Steve to the whitelist", "Player is already whitelisted", "Reloaded the whitelist"]
+
+
+def test_apply_whitelist_batch_uses_single_spawn_and_reload(monkeypatch):
+    batches = []
+
+    def fake_batch(commands):
+        batches.append(commands)
+        return ["Added Steve to the whitelist", "Player is already whitelisted", "Reloaded the whitelist"]
+
+    monkeypatch.setattr(bot, "is_container_running", lambda: True)
+    monkeypatch.setattr(bot, "rcon_batch", fake_batch)
+
+    results = bot.apply_whitelist_batch("add", ["Steve", "Alex", "bad name!"])
+
+    assert batches == [["whitelist add Steve", "whitelist add Alex", "whitelist reload"]]
+    assert results == [
+        ("Steve", "ok", "Added Steve to the whitelist"),
+        ("Alex", "skipped", "Player is already whitelisted"),
+        ("bad name!", "error", "invalid name"),
+    ]
+
+
+def test_apply_whitelist_batch_writes_file_when_offline(tmp_path, monkeypatch):
+    (tmp_path / "server.properties").write_text("online-mode=false\n")
+    (tmp_path / "whitelist.json").write_text(json.dumps([{"uuid": "u1", "name": "Steve"}]))
+    monkeypatch.setattr(bot, "PROPERTIES_FILE", str(tmp_path / "server.properties"))
+    monkeypatch.setattr(bot, "WHITELIST_OFFLINE_WRITE", True)
+    monkeypatch.setattr(bot, "is_container_running", lambda: False)
+
+    results = bot.apply_whitelist_batch("add", ["Steve", "Notch"])
+
+    assert results == [("Steve", "skipped", "already whitelisted"), ("Notch", "ok", "added")]
+    entries = json.loads((tmp_path / "whitelist.json").read_text())
+    assert {"uuid": "b50ad385-829d-3141-a216-7e7d7539ba7f", "name": "Notch"} in entries
+
+    results = bot.apply_whitelist_batch("remove", ["steve", "Ghost"])
+    assert results == [("steve", "ok", "removed"), ("Ghost", "skipped", "not whitelisted")]
+    assert [e["name"] for e in json.loads((tmp_path / "whitelist.json").read_text())] == ["Notch"]
+
+
+def test_apply_whitelist_batch_reports_offline_without_write(monkeypatch):
+    monkeypatch.setattr(bot, "WHITELIST_OFFLINE_WRITE", False)
+    monkeypatch.setattr(bot, "is_container_running", lambda: False)
+
+    assert bot.apply_whitelist_batch("add", ["Steve"]) == [("Steve", "error", "server offline")]
+
+
+def test_quick_add_button_reports_the_real_outcome(monkeypatch):
+    answers = []
+    monkeypatch.setattr(bot, "ALLOWED_CHAT_IDS", [123])
+    monkeypatch.setattr(bot, "WHITELIST_OFFLINE_WRITE", False)
+    monkeypatch.setattr(bot, "is_container_running", lambda: False)
+    monkeypatch.setattr(bot, "answer_callback", lambda _id, text: answers.append(text))
+    monkeypatch.setattr(bot, "edit_message", MagicMock())
+
+    bot.handle_callback({"id": "1", "data": "quick_add:Steve", "message": {"chat": {"id": 123}, "message_id": 5}})
+
+    assert answers == ["❌ Could not add Steve: server offline"]
+    assert "Could not add" in bot.edit_message.call_args[0][2]
+
+
+def test_rcon_batch_never_reports_missing_responses_as_success(monkeypatch):
+    def fake_run(stdout):
+        return lambda *_a, **_k: MagicMock(returncode=0, stdout=stdout, stderr="")
+
+    # One prompt-delimited answer for three commands: the rest are unknown
+    monkeypatch.setattr(bot.subprocess, "run", fake_run("> Added Steve to the whitelist\n"))
+    outputs = bot.rcon_batch(["whitelist add Steve", "whitelist add Alex", "whitelist reload"])
+    assert outputs[0] == "Added Steve to the whitelist"
+    assert outputs[1:] == [bot.RCON_BATCH_NO_RESPONSE] * 2
+
+    # No prompts at all: nothing can be attributed to a command
+    monkeypatch.setattr(bot.subprocess, "run", fake_run("Added Steve to the whitelist\nAdded Alex to the whitelist\n"))
+    monkeypatch.setattr(bot, "is_container_running", lambda: True)
+    results = bot.apply_whitelist_batch("add", ["Steve", "Alex"])
+    assert [status for _, status, _ in results] == ["error", "error"]
+
+    assert bot._task_output_failed(bot.RCON_BATCH_NO_RESPONSE)